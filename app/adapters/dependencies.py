@@ -2,6 +2,7 @@ import logging
 import os
 from functools import lru_cache
 from pathlib import Path
+from typing import Any
 
 import yaml
 from pydantic import BaseModel
@@ -17,7 +18,9 @@ class ProviderConfig(BaseModel):
     class_name: str
     api_module_path: str
     repository_module_path: str
-    config: dict[str, str]
+    config: dict[str, Any]  # configuration to instantiate the API client
+    repository_config: dict[str, Any] = {}  # configuration to instantiate the repository
+    refresh_interval: float = 300  # seconds between two updates of the events
 
 
 class ProvidersConfig(BaseModel):
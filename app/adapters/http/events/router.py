@@ -1,22 +1,29 @@
-import importlib
+import asyncio
 import logging
+import math
 from datetime import datetime, timezone
-from typing import Annotated
+from typing import Annotated, Any, AsyncIterator, Optional
 
+import orjson
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
 from starlette import status
+from starlette.responses import Response, StreamingResponse
 
-from app.adapters.dependencies import (
-    ProviderConfig,
-    ProvidersConfig,
-    get_providers_config,
-)
+from app.adapters.dependencies import get_settings
+from app.adapters.registry import ProviderRegistry, get_provider_registry
 from app.application.dtos.events import EventErrorDTO, ResponseEventDTO
+from app.application.mappers.events import (
+    map_dto_to_provider_cursors,
+    map_provider_cursors_to_dto,
+    merge_provider_responses_dto,
+)
 from app.application.use_cases.request_events import RequestEventsUseCase
-from app.infrastructure.database import RedisBase, create_redis_client
+from app.config import Settings
+from app.infrastructure.cache import ResponseCache, get_response_cache
 from app.infrastructure.repository.entities import FilterQuery
 
-event_router = APIRouter()
+event_router = APIRouter(default_response_class=ORJSONResponse)
 log = logging.getLogger(__name__)
 
 unix_start_date = datetime(1970, 1, 1)
@@ -27,6 +34,13 @@ unix_start_date = datetime(1970, 1, 1)
     name="Lists the available events on a time range",
     response_model=ResponseEventDTO,
     responses={
+        status.HTTP_200_OK: {
+            "content": {
+                "application/x-ndjson": {
+                    "example": '{"id": "string", "title": "string", "start_date": "string", ...}\n',
+                },
+            },
+        },
         status.HTTP_400_BAD_REQUEST: {
             "model": ResponseEventDTO,
             "content": {
@@ -54,27 +68,158 @@ async def get_events(
         datetime,
         Query(description="Return only events that finishes before this date", example="2021-07-21T17:32:28Z"),
     ] = datetime.now(),
-    providers_config: ProvidersConfig = Depends(get_providers_config),
-    redis: RedisBase = Depends(create_redis_client),
-) -> ResponseEventDTO:
-    starts_at = starts_at.replace(tzinfo=timezone.utc) if starts_at.tzinfo is None else starts_at
-    ends_at = ends_at.replace(tzinfo=timezone.utc) if ends_at.tzinfo is None else ends_at
+    limit: Annotated[
+        Optional[int],
+        Query(description="Return at most this number of events per provider, all of them if not set", ge=1),
+    ] = None,
+    cursor: Annotated[
+        Optional[str],
+        Query(description="Return the events after this cursor, `data.next_cursor` of the previous page"),
+    ] = None,
+    stream: Annotated[
+        bool,
+        Query(description="Stream the events as they are read, one JSON event per line (NDJSON)"),
+    ] = False,
+    registry: ProviderRegistry = Depends(get_provider_registry),
+    settings: Settings = Depends(get_settings),
+    response_cache: ResponseCache = Depends(get_response_cache),
+) -> ResponseEventDTO | Response:
+    starts_at = _to_utc(starts_at)
+    ends_at = _to_utc(ends_at)
     if starts_at > ends_at:
         return ResponseEventDTO(
             data=None,
             error=EventErrorDTO(code=str(status.HTTP_400_BAD_REQUEST), message="starts_at must be less than ends_at"),
         )
-    event_responses = [
-        await _init_use_case(provider, redis).execute(FilterQuery(starts_at=starts_at, ends_at=ends_at))
-        for provider in providers_config.external_providers
+    try:
+        provider_cursors = map_dto_to_provider_cursors(cursor) if cursor else {}
+    except ValueError:
+        return ResponseEventDTO(
+            data=None,
+            error=EventErrorDTO(code=str(status.HTTP_400_BAD_REQUEST), message="cursor is not valid"),
+        )
+    # The window queried and cached, the response is filtered to the window requested
+    query_starts_at, query_ends_at = starts_at, ends_at
+    if settings.response_cache_window_bucket and not stream and limit is None and cursor is None:
+        query_starts_at, query_ends_at = _bucket_window(starts_at, ends_at, settings.response_cache_window_bucket)
+    widened = (query_starts_at, query_ends_at) != (starts_at, ends_at)
+    cache_key = (query_starts_at.timestamp(), query_ends_at.timestamp(), limit, cursor)
+    generation: Optional[tuple[Optional[bytes], ...]] = None
+    if not stream:
+        generation = await _get_generation(registry)
+        if generation is not None and (content := response_cache.get(generation, cache_key)) is not None:
+            if widened:
+                content = orjson.dumps(_filter_window(orjson.loads(content), starts_at, ends_at))
+            return Response(content, media_type="application/json", headers={"X-Cache": "HIT"})
+    # With a cursor only the providers with more pages are requested
+    providers = [
+        provider
+        for provider in registry.providers
+        if not provider_cursors or provider.config.class_name in provider_cursors
     ]
-    return event_responses[0] if event_responses else ResponseEventDTO()  # Modify to adapt to multiple providers
+    filter_queries = {
+        provider.config.class_name: FilterQuery(
+            starts_at=query_starts_at,
+            ends_at=query_ends_at,
+            limit=limit,
+            cursor=provider_cursors.get(provider.config.class_name),
+        )
+        for provider in providers
+    }
+    use_cases = {provider.config.class_name: provider.request_use_case for provider in providers}
+    if stream:
+        return StreamingResponse(_stream_events(use_cases, filter_queries), media_type="application/x-ndjson")
+    event_responses = await asyncio.gather(
+        *(use_case.execute(filter_queries[provider]) for provider, use_case in use_cases.items()),
+    )
+    response = merge_provider_responses_dto(dict(zip(use_cases, event_responses)))
+    content = _to_json(response)
+    # Responses with errors are not cached, the providers are requested again
+    if generation is not None and response.error is None and not response.provider_errors:
+        response_cache.set(generation, cache_key, content)
+    if widened:
+        content = orjson.dumps(_filter_window(response.model_dump(), starts_at, ends_at))
+    return Response(content, media_type="application/json", headers={"X-Cache": "MISS"})
 
 
-def _init_use_case(provider: ProviderConfig, redis: RedisBase) -> RequestEventsUseCase:
-    try:
-        repository_module = importlib.import_module(provider.repository_module_path)
-        return RequestEventsUseCase(getattr(repository_module, provider.class_name)(redis))
-    except Exception as e:
-        log.error(f"Invalid configuration: {e}", exc_info=True)
-        raise ValueError(f"Class not found  {provider.class_name} in module {provider.repository_module_path}")
+async def _get_generation(registry: ProviderRegistry) -> Optional[tuple[Optional[bytes], ...]]:
+    """
+    The responses are valid while the events of all the providers do not change
+    :return: generation of the events of each provider, None if any of them can not be read
+    """
+    results = await asyncio.gather(
+        *(provider.request_use_case.get_generation() for provider in registry.providers),
+        return_exceptions=True,
+    )
+    generations = []
+    for provider, result in zip(registry.providers, results):
+        if isinstance(result, BaseException):
+            # The providers are requested without the cache, their errors are reported in the response
+            log.warning(f"Generation of the events of {provider.config.class_name} not read: {result}")
+            return None
+        generations.append(result)
+    return tuple(generations)
+
+
+def _to_json(response: ResponseEventDTO) -> bytes:
+    # Already a valid response, serialized without the validation of the response model
+    return orjson.dumps(response.model_dump())
+
+
+def _to_utc(date: datetime) -> datetime:
+    # Dates without timezone are in UTC
+    return date.replace(tzinfo=timezone.utc) if date.tzinfo is None else date.astimezone(timezone.utc)
+
+
+def _bucket_window(starts_at: datetime, ends_at: datetime, bucket: int) -> tuple[datetime, datetime]:
+    """
+    Widen the window to whole buckets, close windows share the same response
+    :return: window of whole buckets that contains the window requested
+    """
+    bucket_starts_at = math.floor(starts_at.timestamp() / bucket) * bucket
+    bucket_ends_at = math.ceil(ends_at.timestamp() / bucket) * bucket
+    return (
+        datetime.fromtimestamp(bucket_starts_at, tz=timezone.utc),
+        datetime.fromtimestamp(bucket_ends_at, tz=timezone.utc),
+    )
+
+
+def _filter_window(response: dict[str, Any], starts_at: datetime, ends_at: datetime) -> dict[str, Any]:
+    """
+    Keep only the events fully inside the window, as the repositories do
+    :param response: response of a window that contains this one, as dumped or loaded from JSON
+    """
+    if response["data"] is None:
+        return response
+    start_timestamp, end_timestamp = starts_at.timestamp(), ends_at.timestamp()
+    response["data"]["events"] = [
+        event
+        for event in response["data"]["events"]
+        if start_timestamp <= datetime.fromisoformat(f"{event['start_date']}T{event['start_time']}").timestamp()
+        and datetime.fromisoformat(f"{event['end_date']}T{event['end_time']}").timestamp() <= end_timestamp
+    ]
+    return response
+
+
+async def _stream_events(
+    use_cases: dict[str, RequestEventsUseCase],
+    filter_queries: dict[str, FilterQuery],
+) -> AsyncIterator[bytes]:
+    next_cursors: dict[str, str] = {}
+    for provider, use_case in use_cases.items():
+        async for response in use_case.stream(filter_queries[provider]):
+            if response.data is None:
+                if response.error:
+                    error_response = ResponseEventDTO(provider_errors={provider: response.error})
+                    yield orjson.dumps(error_response.model_dump(), option=orjson.OPT_APPEND_NEWLINE)
+                break
+            events = response.data.model_dump()["events"]
+            yield b"".join(orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE) for event in events)
+            if response.data.next_cursor:
+                next_cursors[provider] = response.data.next_cursor
+    # The last line has the cursor of the next page if the limit was reached for any provider
+    if next_cursors:
+        yield orjson.dumps(
+            {"next_cursor": map_provider_cursors_to_dto(next_cursors)},
+            option=orjson.OPT_APPEND_NEWLINE,
+        )
@@ -1,20 +1,61 @@
-from datetime import datetime
+import json
+import logging
+import timeit
+from datetime import date, datetime, timedelta, timezone
 
 import pytest
+from fastapi.encoders import jsonable_encoder
 from starlette import status
 from starlette.testclient import TestClient
 
 from app import main
-from app.adapters.http.events.router import get_events
-from app.application.dtos.events import EventDTO, EventsDTO, ResponseEventDTO
+from app.adapters.http.events.router import _to_json, get_events
+from app.adapters.registry import create_provider_registry
+from app.application.dtos.events import (
+    EventDTO,
+    EventErrorDTO,
+    EventsDTO,
+    ResponseEventDTO,
+)
+from app.application.mappers.events import (
+    map_cursor_to_dto,
+    map_provider_cursors_to_dto,
+)
 from app.application.use_cases.request_events import RequestEventsUseCase
-from app.infrastructure.repository.entities import FilterQuery
+from app.infrastructure.cache import ResponseCache
+from app.infrastructure.repository.entities import DatabaseError, EventCursor, FilterQuery
+
+log = logging.getLogger(__name__)
+
+
+@pytest.fixture(autouse=True)
+def events_generation(mocker):
+    # Generation of the events of the mocked repositories
+    return mocker.patch.object(RequestEventsUseCase, "get_generation", mocker.AsyncMock(return_value=b"1"))
+
+
+@pytest.fixture
+def response_cache():
+    return ResponseCache(max_size=10, ttl=60)
+
+
+event_dto = EventDTO(
+    id="1",
+    title="Event 1",
+    start_date="2021-06-30",
+    start_time="21:00:00",
+    end_date="2021-06-30",
+    end_time="22:00:00",
+    min_price=15.0,
+    max_price=30.0,
+)
 
 
 @pytest.mark.integration
 async def test_get_events_error_starts_after_end():
-    client = TestClient(main.app)
-    response = client.get("/search", params={"starts_at": "2022-01-02T00:00:00", "ends_at": "2022-01-01T00:00:00"})
+    # The providers are registered in the lifespan of the application
+    with TestClient(main.app) as client:
+        response = client.get("/search", params={"starts_at": "2022-01-02T00:00:00", "ends_at": "2022-01-01T00:00:00"})
     assert response.status_code == status.HTTP_200_OK
     event = ResponseEventDTO.model_validate(response.json())
     assert event.data is None
@@ -22,36 +63,378 @@ async def test_get_events_error_starts_after_end():
     assert event.error.message == "starts_at must be less than ends_at"
 
 
-async def test_get_events_happy_path(mock_providers_config, mocker):
+async def test_get_events_happy_path(mock_providers_config, mock_settings, response_cache, mocker):
     mocker.patch("importlib.import_module", return_value=mocker.Mock())
-    response_mock = mocker.Mock(spec_set=EventDTO)
-    execute_mock = mocker.AsyncMock(return_value=ResponseEventDTO(data=EventsDTO(events=[response_mock])))
+    execute_mock = mocker.AsyncMock(return_value=ResponseEventDTO(data=EventsDTO(events=[event_dto])))
     mocker.patch.object(RequestEventsUseCase, "execute", execute_mock)
 
     starts_at = datetime(2021, 1, 1, tzinfo=datetime.now().astimezone().tzinfo)
     ends_at = datetime(2022, 1, 2, tzinfo=datetime.now().astimezone().tzinfo)
-    result = await get_events(
+    response = await get_events(
         starts_at=starts_at,
         ends_at=ends_at,
-        redis=mocker.AsyncMock(),
-        providers_config=mock_providers_config,
+        registry=create_provider_registry(mocker.AsyncMock(), mocker.Mock(), mock_providers_config, mock_settings),
+        settings=mock_settings,
+        response_cache=response_cache,
     )
+    result = ResponseEventDTO.model_validate_json(response.body)
 
+    assert response.headers["X-Cache"] == "MISS"
     assert result.error is None
     assert len(result.data.events) == 1
-    assert result.data.events == [response_mock]
+    assert result.data.events == [event_dto]
     execute_mock.assert_awaited_with(FilterQuery(starts_at=starts_at, ends_at=ends_at))
 
 
-async def test_update_events_no_providers_config(mock_providers_config, mocker):
+async def test_get_events_page(mock_providers_config, mock_settings, response_cache, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    execute_mock = mocker.AsyncMock(return_value=ResponseEventDTO(data=EventsDTO(events=[])))
+    mocker.patch.object(RequestEventsUseCase, "execute", execute_mock)
+    cursor = EventCursor(start=1625083200.0, event_id="291")
+
+    starts_at = datetime(2021, 1, 1, tzinfo=timezone.utc)
+    ends_at = datetime(2022, 1, 2, tzinfo=timezone.utc)
+    await get_events(
+        starts_at=starts_at,
+        ends_at=ends_at,
+        limit=10,
+        cursor=map_provider_cursors_to_dto({"TestClass": map_cursor_to_dto(cursor)}),
+        registry=create_provider_registry(mocker.AsyncMock(), mocker.Mock(), mock_providers_config, mock_settings),
+        settings=mock_settings,
+        response_cache=response_cache,
+    )
+
+    execute_mock.assert_awaited_with(FilterQuery(starts_at=starts_at, ends_at=ends_at, limit=10, cursor=cursor))
+
+
+async def test_get_events_multiple_providers(mock_providers_config, mock_settings, response_cache, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    [provider] = mock_providers_config.external_providers
+    providers_config = mock_providers_config.model_copy(
+        update={
+            "external_providers": [
+                provider,
+                provider.model_copy(update={"class_name": "OtherClass"}),
+                provider.model_copy(update={"class_name": "FailingClass"}),
+            ],
+        },
+    )
+    other_event = event_dto.model_copy(update={"id": "2", "start_date": date(2021, 6, 1)})
+    execute_mock = mocker.AsyncMock(
+        side_effect=[
+            ResponseEventDTO(data=EventsDTO(events=[event_dto])),
+            ResponseEventDTO(data=EventsDTO(events=[other_event, event_dto])),
+            ResponseEventDTO(error=EventErrorDTO(code="500", message="Error retrieving events")),
+        ],
+    )
+    mocker.patch.object(RequestEventsUseCase, "execute", execute_mock)
+
+    response = await get_events(
+        starts_at=datetime(2021, 1, 1),
+        ends_at=datetime(2022, 1, 2),
+        registry=create_provider_registry(mocker.AsyncMock(), mocker.Mock(), providers_config, mock_settings),
+        settings=mock_settings,
+        response_cache=response_cache,
+    )
+    result = ResponseEventDTO.model_validate_json(response.body)
+
+    assert result.error is None
+    assert result.data.events == [other_event, event_dto]
+    assert result.provider_errors == {"FailingClass": EventErrorDTO(code="500", message="Error retrieving events")}
+    assert execute_mock.await_count == 3
+
+
+async def test_get_events_error_invalid_cursor(mock_providers_config, mock_settings, response_cache, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+
+    result = await get_events(
+        starts_at=datetime(2021, 1, 1),
+        ends_at=datetime(2022, 1, 2),
+        cursor="invalid",
+        registry=create_provider_registry(mocker.AsyncMock(), mocker.Mock(), mock_providers_config, mock_settings),
+        settings=mock_settings,
+        response_cache=response_cache,
+    )
+
+    assert result.data is None
+    assert result.error.code == str(status.HTTP_400_BAD_REQUEST)
+    assert result.error.message == "cursor is not valid"
+
+
+async def test_update_events_no_providers_config(mock_providers_config, mock_settings, response_cache, mocker):
     mocker.patch("importlib.import_module", side_effect=AttributeError("Error class 'TestClass' not found"))
 
     with pytest.raises(ValueError) as exc_info:
         await get_events(
             starts_at=datetime(2021, 1, 1),
             ends_at=datetime(2022, 1, 2),
-            redis=mocker.Mock(),
-            providers_config=mock_providers_config,
+            registry=create_provider_registry(mocker.AsyncMock(), mocker.Mock(), mock_providers_config, mock_settings),
+            settings=mock_settings,
+            response_cache=response_cache,
         )
 
     assert str(exc_info.value) == "Class not found  TestClass in module repository_module"
+
+
+async def test_get_events_stream(mock_providers_config, mock_settings, response_cache, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    event = event_dto
+
+    async def stream(_, filter_query):
+        yield ResponseEventDTO(data=EventsDTO(events=[event, event]))
+        yield ResponseEventDTO(error=EventErrorDTO(code="500", message="Error retrieving events"))
+
+    mocker.patch.object(RequestEventsUseCase, "stream", stream)
+
+    response = await get_events(
+        starts_at=datetime(2021, 1, 1),
+        ends_at=datetime(2022, 1, 2),
+        stream=True,
+        registry=create_provider_registry(mocker.AsyncMock(), mocker.Mock(), mock_providers_config, mock_settings),
+        settings=mock_settings,
+        response_cache=response_cache,
+    )
+    body = b"".join([chunk async for chunk in response.body_iterator])
+
+    assert response.media_type == "application/x-ndjson"
+    assert body.decode().splitlines() == [
+        event.model_dump_json(),
+        event.model_dump_json(),
+        '{"data":null,"error":null,"provider_errors":{"TestClass":{"code":"500","message":"Error retrieving events"}}}',
+    ]
+
+
+async def test_get_events_stream_next_cursor(mock_providers_config, mock_settings, response_cache, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    event = event_dto
+    cursor = map_cursor_to_dto(EventCursor(start=1625011200.0, event_id=event.id))
+
+    async def stream(_, filter_query):
+        yield ResponseEventDTO(data=EventsDTO(events=[event]))
+        yield ResponseEventDTO(data=EventsDTO(events=[event], next_cursor=cursor))
+
+    mocker.patch.object(RequestEventsUseCase, "stream", stream)
+
+    response = await get_events(
+        starts_at=datetime(2021, 1, 1),
+        ends_at=datetime(2022, 1, 2),
+        limit=2,
+        stream=True,
+        registry=create_provider_registry(mocker.AsyncMock(), mocker.Mock(), mock_providers_config, mock_settings),
+        settings=mock_settings,
+        response_cache=response_cache,
+    )
+    body = b"".join([chunk async for chunk in response.body_iterator])
+
+    assert body.decode().splitlines() == [
+        event.model_dump_json(),
+        event.model_dump_json(),
+        json.dumps({"next_cursor": map_provider_cursors_to_dto({"TestClass": cursor})}, separators=(",", ":")),
+    ]
+
+
+async def test_get_events_from_response_cache(mock_providers_config, mock_settings, response_cache, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    execute_mock = mocker.AsyncMock(return_value=ResponseEventDTO(data=EventsDTO(events=[event_dto])))
+    mocker.patch.object(RequestEventsUseCase, "execute", execute_mock)
+    generation_mock = mocker.AsyncMock(return_value=b"1")
+    mocker.patch.object(RequestEventsUseCase, "get_generation", generation_mock)
+
+    responses = [
+        await get_events(
+            starts_at=starts_at,
+            ends_at=datetime(2022, 1, 2, tzinfo=timezone.utc),
+            registry=create_provider_registry(mocker.Mock(), mocker.Mock(), mock_providers_config, mock_settings),
+            settings=mock_settings,
+            response_cache=response_cache,
+        )
+        # Same window in UTC
+        for starts_at in [datetime(2021, 1, 1), datetime(2021, 1, 1, 2, tzinfo=timezone(timedelta(hours=2)))]
+    ]
+
+    assert [response.headers["X-Cache"] for response in responses] == ["MISS", "HIT"]
+    assert responses[0].body == responses[1].body
+    execute_mock.assert_awaited_once()
+    assert generation_mock.await_count == 2
+    assert (response_cache.hits, response_cache.misses) == (1, 1)
+
+
+async def test_get_events_response_cache_new_generation(mock_providers_config, mock_settings, response_cache, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    execute_mock = mocker.AsyncMock(return_value=ResponseEventDTO(data=EventsDTO(events=[event_dto])))
+    mocker.patch.object(RequestEventsUseCase, "execute", execute_mock)
+    generation_mock = mocker.patch.object(RequestEventsUseCase, "get_generation")
+
+    for generation in [b"1", b"2"]:
+        generation_mock.return_value = generation
+        response = await get_events(
+            starts_at=datetime(2021, 1, 1),
+            ends_at=datetime(2022, 1, 2),
+            registry=create_provider_registry(mocker.Mock(), mocker.Mock(), mock_providers_config, mock_settings),
+            settings=mock_settings,
+            response_cache=response_cache,
+        )
+        assert response.headers["X-Cache"] == "MISS"
+
+    assert execute_mock.await_count == 2
+
+
+async def test_get_events_errors_not_cached(mock_providers_config, mock_settings, response_cache, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    error = EventErrorDTO(code="500", message="Error retrieving events")
+    execute_mock = mocker.AsyncMock(return_value=ResponseEventDTO(error=error))
+    mocker.patch.object(RequestEventsUseCase, "execute", execute_mock)
+
+    for _ in range(2):
+        await get_events(
+            starts_at=datetime(2021, 1, 1),
+            ends_at=datetime(2022, 1, 2),
+            registry=create_provider_registry(mocker.AsyncMock(), mocker.Mock(), mock_providers_config, mock_settings),
+            settings=mock_settings,
+            response_cache=response_cache,
+        )
+
+    assert execute_mock.await_count == 2
+
+
+def local_event(event_id, start, end):
+    # Events in the local times of the repositories
+    start, end = datetime.fromtimestamp(start.timestamp()), datetime.fromtimestamp(end.timestamp())
+    return event_dto.model_copy(
+        update={
+            "id": event_id,
+            "start_date": start.date(),
+            "start_time": start.time(),
+            "end_date": end.date(),
+            "end_time": end.time(),
+        },
+    )
+
+
+async def test_get_events_window_bucket(mock_providers_config, mock_settings, response_cache, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    events = [
+        local_event(
+            "1", datetime(2021, 1, 1, 10, 5, tzinfo=timezone.utc), datetime(2021, 1, 1, 10, 30, tzinfo=timezone.utc)
+        ),
+        local_event(
+            "2", datetime(2021, 1, 1, 10, 20, tzinfo=timezone.utc), datetime(2021, 1, 1, 11, tzinfo=timezone.utc)
+        ),
+        local_event(
+            "3", datetime(2021, 1, 1, 12, tzinfo=timezone.utc), datetime(2021, 1, 1, 12, 50, tzinfo=timezone.utc)
+        ),
+    ]
+    execute_mock = mocker.AsyncMock(return_value=ResponseEventDTO(data=EventsDTO(events=events)))
+    mocker.patch.object(RequestEventsUseCase, "execute", execute_mock)
+    registry = create_provider_registry(mocker.AsyncMock(), mocker.Mock(), mock_providers_config, mock_settings)
+    settings = mock_settings.model_copy(update={"response_cache_window_bucket": 3600})
+
+    responses = [
+        await get_events(
+            starts_at=starts_at,
+            ends_at=ends_at,
+            registry=registry,
+            settings=settings,
+            response_cache=response_cache,
+        )
+        for starts_at, ends_at in [
+            (datetime(2021, 1, 1, 10, 15), datetime(2021, 1, 1, 12, 45)),
+            (datetime(2021, 1, 1, 10), datetime(2021, 1, 1, 13)),
+        ]
+    ]
+
+    # The whole hours are queried and cached, each response has the events of its window
+    execute_mock.assert_awaited_once_with(
+        FilterQuery(
+            starts_at=datetime(2021, 1, 1, 10, tzinfo=timezone.utc),
+            ends_at=datetime(2021, 1, 1, 13, tzinfo=timezone.utc),
+        ),
+    )
+    assert [response.headers["X-Cache"] for response in responses] == ["MISS", "HIT"]
+    assert ResponseEventDTO.model_validate_json(responses[0].body).data.events == [events[1]]
+    assert ResponseEventDTO.model_validate_json(responses[1].body).data.events == events
+    filtered = await get_events(
+        starts_at=datetime(2021, 1, 1, 10),
+        ends_at=datetime(2021, 1, 1, 12, 40),
+        registry=registry,
+        settings=settings,
+        response_cache=response_cache,
+    )
+    assert filtered.headers["X-Cache"] == "HIT"
+    assert ResponseEventDTO.model_validate_json(filtered.body).data.events == events[:2]
+
+
+async def test_get_events_window_bucket_page(mock_providers_config, mock_settings, response_cache, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    execute_mock = mocker.AsyncMock(return_value=ResponseEventDTO(data=EventsDTO(events=[])))
+    mocker.patch.object(RequestEventsUseCase, "execute", execute_mock)
+
+    await get_events(
+        starts_at=datetime(2021, 1, 1, 10, 15),
+        ends_at=datetime(2021, 1, 1, 12, 45),
+        limit=10,
+        registry=create_provider_registry(mocker.AsyncMock(), mocker.Mock(), mock_providers_config, mock_settings),
+        settings=mock_settings.model_copy(update={"response_cache_window_bucket": 3600}),
+        response_cache=response_cache,
+    )
+
+    # A page of a wider window would be filled with events outside the window requested
+    execute_mock.assert_awaited_once_with(
+        FilterQuery(
+            starts_at=datetime(2021, 1, 1, 10, 15, tzinfo=timezone.utc),
+            ends_at=datetime(2021, 1, 1, 12, 45, tzinfo=timezone.utc),
+            limit=10,
+        ),
+    )
+
+
+async def test_get_events_generation_error(mock_providers_config, mock_settings, response_cache, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    execute_mock = mocker.AsyncMock(return_value=ResponseEventDTO(data=EventsDTO(events=[event_dto])))
+    mocker.patch.object(RequestEventsUseCase, "execute", execute_mock)
+    mocker.patch.object(
+        RequestEventsUseCase,
+        "get_generation",
+        mocker.AsyncMock(side_effect=DatabaseError("Error getting generation")),
+    )
+
+    for _ in range(2):
+        response = await get_events(
+            starts_at=datetime(2021, 1, 1),
+            ends_at=datetime(2022, 1, 2),
+            registry=create_provider_registry(mocker.AsyncMock(), mocker.Mock(), mock_providers_config, mock_settings),
+            settings=mock_settings,
+            response_cache=response_cache,
+        )
+        assert response.headers["X-Cache"] == "MISS"
+        assert ResponseEventDTO.model_validate_json(response.body).data.events == [event_dto]
+
+    # Requested without the cache
+    assert execute_mock.await_count == 2
+    assert (response_cache.hits, response_cache.misses) == (0, 0)
+
+
+@pytest.mark.benchmark
+def test_benchmark_orjson_vs_default_response_serialization():
+    events = [
+        event_dto.model_copy(update={"id": str(i), "start_date": date(2021, 1, 1) + timedelta(days=i % 365)})
+        for i in range(10_000)
+    ]
+    response = ResponseEventDTO(data=EventsDTO(events=events))
+
+    # FastAPI serializes a returned model validating it against the response model and with the JSON encoder
+    default_elapsed = min(
+        timeit.repeat(
+            lambda: json.dumps(jsonable_encoder(ResponseEventDTO.model_validate(response))).encode(),
+            number=1,
+            repeat=5,
+        ),
+    )
+    pydantic_elapsed = min(timeit.repeat(lambda: response.model_dump_json().encode(), number=1, repeat=5))
+    orjson_elapsed = min(timeit.repeat(lambda: _to_json(response), number=1, repeat=5))
+
+    log.info(
+        f"{len(events)} events serialized: default {default_elapsed * 1000:.1f} ms, "
+        f"pydantic {pydantic_elapsed * 1000:.1f} ms, orjson {orjson_elapsed * 1000:.1f} ms",
+    )
+    assert json.loads(_to_json(response)) == json.loads(response.model_dump_json())
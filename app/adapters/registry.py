@@ -0,0 +1,82 @@
+import importlib
+import logging
+from dataclasses import dataclass
+from typing import cast
+
+import httpx
+from starlette.requests import Request
+
+from app.adapters.dependencies import ProviderConfig, ProvidersConfig
+from app.application.use_cases.request_events import RequestEventsUseCase
+from app.application.use_cases.update_events import UpdateEventsUseCase
+from app.config import Settings
+from app.infrastructure.database import RedisBase
+from app.infrastructure.repository.entities import UpdateScope
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RegisteredProvider:
+    config: ProviderConfig
+    request_use_case: RequestEventsUseCase
+    update_use_case: UpdateEventsUseCase  # shares the repository with the requests
+    update_scope: UpdateScope  # processes that share the events of the repository
+
+
+class ProviderRegistry:
+    """
+    Providers of the configuration resolved once at start-up, with long-lived repositories and a Redis client shared by
+    all of them, so a request or a refresh only runs its query
+    """
+
+    def __init__(self, providers: list[RegisteredProvider]) -> None:
+        self.providers = providers  # in the order of the configuration
+
+
+def create_provider_registry(
+    redis: RedisBase,
+    http_client: httpx.AsyncClient,
+    providers_config: ProvidersConfig,
+    settings: Settings,
+) -> ProviderRegistry:
+    """
+    :return: the registry of all the providers of the configuration
+    :exception: ValueError if a class of the configuration is not found
+    """
+    return ProviderRegistry(
+        [
+            _register_provider(provider, redis, http_client, settings.update_events_batch_size)
+            for provider in providers_config.external_providers
+        ],
+    )
+
+
+def get_provider_registry(request: Request) -> ProviderRegistry:
+    # Created in the lifespan of the application
+    return cast(ProviderRegistry, request.app.state.provider_registry)
+
+
+def _register_provider(
+    provider: ProviderConfig,
+    redis: RedisBase,
+    http_client: httpx.AsyncClient,
+    batch_size: int,
+) -> RegisteredProvider:
+    try:
+        api_module = importlib.import_module(provider.api_module_path)
+        repository_module = importlib.import_module(provider.repository_module_path)
+        repository = getattr(repository_module, provider.class_name)(redis, **provider.repository_config)
+        return RegisteredProvider(
+            config=provider,
+            request_use_case=RequestEventsUseCase(repository),
+            update_use_case=UpdateEventsUseCase(
+                getattr(api_module, provider.class_name)(http_client, **provider.config),
+                repository,
+                batch_size,
+            ),
+            update_scope=repository.update_scope,
+        )
+    except Exception as e:
+        log.error(f"Invalid configuration: {e}", exc_info=True)
+        raise ValueError(f"Class not found  {provider.class_name} in module {provider.repository_module_path}")
@@ -45,12 +45,21 @@ def test_get_providers_config_no_config_data(clear_cache_mock, mocker):
 def test_get_providers_config_happy_path(clear_cache_mock, mocker):
     config_data = {
         "external_providers": [
-            {"class_name": "class1", "repository_module_path": "path1", "api_module_path": "path1_1", "config": {}},
+            {
+                "class_name": "class1",
+                "repository_module_path": "path1",
+                "api_module_path": "path1_1",
+                "config": {},
+                "repository_config": {},
+                "refresh_interval": 300,
+            },
             {
                 "class_name": "class2",
                 "repository_module_path": "path2",
                 "api_module_path": "path2_1",
-                "config": {"key1": "value1"},
+                "config": {"key1": "value1", "timeout": 5},
+                "repository_config": {"key2": 2},
+                "refresh_interval": 60,
             },
         ],
     }
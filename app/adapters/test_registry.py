@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+
+from app.adapters.dependencies import ProviderConfig, ProvidersConfig
+from app.adapters.http.events.router import get_events
+from app.adapters.registry import create_provider_registry, get_provider_registry
+from app.application.dtos.events import EventsDTO, ResponseEventDTO
+from app.application.use_cases.request_events import RequestEventsUseCase
+from app.conftest import mock_providers_config, mock_settings
+from app.infrastructure.cache import ResponseCache
+from app.infrastructure.repository.entities import UpdateScope
+from app.infrastructure.repository.in_memory.provider_a import ProviderA as InMemoryProviderA
+
+
+def test_create_provider_registry(mock_providers_config, mock_settings, mocker):
+    module = mocker.Mock()
+    import_module = mocker.patch("importlib.import_module", return_value=module)
+    redis, http_client = mocker.Mock(), mocker.Mock()
+
+    registry = create_provider_registry(redis, http_client, mock_providers_config, mock_settings)
+
+    [provider] = registry.providers
+    assert provider.config == mock_providers_config.external_providers[0]
+    import_module.assert_has_calls([mocker.call("api_module"), mocker.call("repository_module")])
+    module.TestClass.assert_has_calls(
+        [mocker.call(redis), mocker.call(http_client, param1="value1", param2="value2")],
+        any_order=True,
+    )
+    # The requests and the refreshes share the repository, and its cache
+    assert provider.request_use_case._repository is provider.update_use_case._event_service._repository
+
+
+def test_create_provider_registry_in_memory_repository(mock_settings, mocker):
+    providers_config = ProvidersConfig(
+        external_providers=[
+            ProviderConfig(
+                class_name="ProviderA",
+                api_module_path="app.infrastructure.api.external_providers.provider_a",
+                repository_module_path="app.infrastructure.repository.in_memory.provider_a",
+                config={"provider_url": "http://localhost:8001/api/v1/events/"},
+                repository_config={"chunk_size": 100},
+            ),
+        ],
+    )
+
+    registry = create_provider_registry(mocker.Mock(), mocker.Mock(), providers_config, mock_settings)
+
+    [provider] = registry.providers
+    assert isinstance(provider.request_use_case._repository, InMemoryProviderA)
+    # Each process refreshes its own events
+    assert provider.update_scope == UpdateScope.PROCESS
+
+
+def test_create_provider_registry_invalid_batch_size(mock_providers_config, mock_settings, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    settings = mock_settings.model_copy(update={"update_events_batch_size": 0})
+
+    with pytest.raises(ValueError):
+        create_provider_registry(mocker.Mock(), mocker.Mock(), mock_providers_config, settings)
+
+
+async def test_get_events_without_per_request_construction(mock_providers_config, mock_settings, mocker):
+    import_module = mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    execute_mock = mocker.AsyncMock(return_value=ResponseEventDTO(data=EventsDTO(events=[])))
+    mocker.patch.object(RequestEventsUseCase, "execute", execute_mock)
+    mocker.patch.object(RequestEventsUseCase, "get_generation", mocker.AsyncMock(return_value=b"1"))
+    registry = create_provider_registry(mocker.AsyncMock(), mocker.Mock(), mock_providers_config, mock_settings)
+    import_module.reset_mock()
+
+    for ends_at in [datetime(2022, 1, 1), datetime(2022, 1, 2)]:
+        await get_events(
+            starts_at=datetime(2021, 1, 1),
+            ends_at=ends_at,
+            registry=registry,
+            settings=mock_settings,
+            response_cache=ResponseCache(max_size=0, ttl=60),
+        )
+
+    import_module.assert_not_called()
+    assert execute_mock.await_count == 2
+
+
+def test_get_provider_registry(mocker):
+    request = mocker.Mock()
+
+    assert get_provider_registry(request) is request.app.state.provider_registry
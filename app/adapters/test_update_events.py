@@ -1,30 +1,103 @@
+import asyncio
+
 import pytest
 
-from app.adapters.update_events import update_events
+from app.adapters.registry import create_provider_registry
+from app.adapters.update_events import schedule_update_events
 from app.application.use_cases.update_events import (
     ResultStatus,
     ResultUpdateProvider,
     UpdateEventsUseCase,
 )
-from app.conftest import mock_providers_config
+from app.conftest import mock_providers_config, mock_settings, redis_mock
+from app.infrastructure.scheduler import Scheduler
+
+
+async def test_update_events_no_providers_config(mock_providers_config, mock_settings, mocker):
+    mocker.patch("importlib.import_module", side_effect=AttributeError("Error class 'TestClass' not found"))
+
+    with pytest.raises(ValueError) as exc_info:
+        create_provider_registry(mocker.AsyncMock(), mocker.Mock(), mock_providers_config, mock_settings)
+
+    assert str(exc_info.value) == "Class not found  TestClass in module repository_module"
 
 
-async def test_update_events_happy_path(mock_providers_config, mocker):
+async def test_schedule_update_events_provider_timeout(mock_providers_config, mock_settings, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    providers_config = mock_providers_config.model_copy(
+        update={"external_providers": mock_providers_config.external_providers * 2},
+    )
+    settings = mock_settings.model_copy(update={"update_events_timeout": 0.05})
+    slow_provider = asyncio.Event()
+
+    async def execute(_):
+        if not slow_provider.is_set():
+            slow_provider.set()
+            await asyncio.sleep(10)
+        return ResultUpdateProvider(status=ResultStatus.OK)
+
+    mocker.patch.object(UpdateEventsUseCase, "execute", execute)
+
+    scheduler = mocker.Mock(spec_set=Scheduler)
+    registry = create_provider_registry(mocker.Mock(), mocker.Mock(), providers_config, settings)
+
+    schedule_update_events(scheduler, registry, settings)
+    result = [await add_job.args[1]() for add_job in scheduler.add_job.call_args_list]
+
+    assert result == [
+        ResultUpdateProvider(status=ResultStatus.ERROR, error_description="Timeout updating events"),
+        ResultUpdateProvider(status=ResultStatus.OK),
+    ]
+
+
+async def test_schedule_update_events(mock_providers_config, mock_settings, mocker):
     mocker.patch("importlib.import_module", return_value=mocker.Mock())
     execute_mock = mocker.AsyncMock(return_value=ResultUpdateProvider(status=ResultStatus.OK))
     mocker.patch.object(UpdateEventsUseCase, "execute", execute_mock)
+    scheduler = mocker.Mock(spec_set=Scheduler)
 
-    result = await update_events(redis=mocker.Mock(), providers_config=mock_providers_config)
+    registry = create_provider_registry(mocker.Mock(), mocker.Mock(), mock_providers_config, mock_settings)
 
-    assert len(result) == 1
-    assert result[0].status == ResultStatus.OK
-    execute_mock.assert_awaited_with()
+    schedule_update_events(scheduler, registry, mock_settings)
 
+    [provider] = registry.providers
+    scheduler.add_job.assert_called_once_with(
+        "update_events:TestClass",
+        mocker.ANY,
+        300,
+        provider.update_scope,
+        mocker.ANY,
+    )
+    [name, job, interval, scope, semaphore] = scheduler.add_job.call_args.args
+    assert await job() == ResultUpdateProvider(status=ResultStatus.OK)
+    execute_mock.assert_awaited_once_with()
 
-async def test_update_events_no_providers_config(mock_providers_config, mocker):
-    mocker.patch("importlib.import_module", side_effect=AttributeError("Error class 'TestClass' not found"))
 
-    with pytest.raises(ValueError) as exc_info:
-        await update_events(redis=mocker.AsyncMock(), providers_config=mock_providers_config)
+async def test_schedule_update_events_concurrency(mock_providers_config, mock_settings, redis_mock, mocker):
+    mocker.patch("importlib.import_module", return_value=mocker.Mock())
+    providers_config = mock_providers_config.model_copy(
+        update={"external_providers": mock_providers_config.external_providers * 3},
+    )
+    settings = mock_settings.model_copy(update={"update_events_concurrency": 2})
+    running, max_running = 0, 0
 
-    assert str(exc_info.value) == "Class not found  TestClass in module repository_module"
+    async def execute(_):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return ResultUpdateProvider(status=ResultStatus.OK)
+
+    mocker.patch.object(UpdateEventsUseCase, "execute", execute)
+    redis_mock.set = mocker.AsyncMock(return_value=True)
+    scheduler = Scheduler(redis_mock)
+    registry = create_provider_registry(mocker.Mock(), mocker.Mock(), providers_config, settings)
+
+    schedule_update_events(scheduler, registry, settings)
+    await asyncio.sleep(0.05)
+    await scheduler.stop()
+
+    # Every provider refreshed once, at most two at the same time
+    assert redis_mock.set.await_count == 3
+    assert max_running == 2
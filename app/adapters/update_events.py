@@ -1,41 +1,44 @@
-import importlib
+import asyncio
 import logging
+from functools import partial
 
-from fastapi import Depends
-
-from app.adapters.dependencies import (
-    ProviderConfig,
-    ProvidersConfig,
-    get_providers_config,
-)
+from app.adapters.dependencies import ProviderConfig
+from app.adapters.registry import ProviderRegistry
 from app.application.use_cases.update_events import (
+    ResultStatus,
     ResultUpdateProvider,
     UpdateEventsUseCase,
 )
-from app.infrastructure.database import RedisBase, create_redis_client
+from app.config import Settings
+from app.infrastructure.scheduler import Scheduler
 
 log = logging.getLogger(__name__)
 
 
-def _create_use_case(provider: ProviderConfig, redis: RedisBase) -> UpdateEventsUseCase:
+async def _execute_use_case(
+    provider: ProviderConfig,
+    use_case: UpdateEventsUseCase,
+    timeout: float,
+) -> ResultUpdateProvider:
     try:
-        api_module = importlib.import_module(provider.api_module_path)
-        repository_module = importlib.import_module(provider.repository_module_path)
-        return UpdateEventsUseCase(
-            getattr(api_module, provider.class_name)(**provider.config),
-            getattr(repository_module, provider.class_name)(redis),
-        )
-    except Exception as e:
-        log.error(f"Invalid configuration: {e}", exc_info=True)
-        raise ValueError(f"Class not found  {provider.class_name} in module {provider.repository_module_path}")
+        return await asyncio.wait_for(use_case.execute(), timeout)
+    except TimeoutError:
+        log.error(f"Timeout updating events of {provider.class_name} after {timeout} seconds")
+        return ResultUpdateProvider(status=ResultStatus.ERROR, error_description="Timeout updating events")
 
 
-async def update_events(
-    redis: RedisBase = Depends(create_redis_client),
-    providers_config: ProvidersConfig = Depends(get_providers_config),
-) -> list[ResultUpdateProvider]:
-    result = []
-    for provider in providers_config.external_providers:
-        use_case = _create_use_case(provider, redis)
-        result.append(await use_case.execute())
-    return result
+def schedule_update_events(scheduler: Scheduler, registry: ProviderRegistry, settings: Settings) -> None:
+    """
+    Refresh each provider periodically, every `refresh_interval` seconds of its configuration. The refreshes share a
+    semaphore, at most `update_events_concurrency` providers are refreshed at the same time, and it is taken before the
+    lock of the scheduler. A single process of the update scope of the repository refreshes it
+    """
+    semaphore = asyncio.Semaphore(settings.update_events_concurrency)
+    for provider in registry.providers:
+        scheduler.add_job(
+            f"update_events:{provider.config.class_name}",
+            partial(_execute_use_case, provider.config, provider.update_use_case, settings.update_events_timeout),
+            provider.config.refresh_interval,
+            provider.update_scope,
+            semaphore,
+        )
@@ -22,8 +22,10 @@ class EventErrorDTO(BaseModel):
 
 class EventsDTO(BaseModel):
     events: list[EventDTO]
+    next_cursor: Optional[str] = None
 
 
 class ResponseEventDTO(BaseModel):
     data: Optional[EventsDTO] = None
     error: Optional[EventErrorDTO] = None
+    provider_errors: Optional[dict[str, EventErrorDTO]] = None  # providers that failed, the rest are in data
@@ -1,34 +1,111 @@
-import sys
+import base64
+import json
+from typing import Optional
 
-from app.application.dtos.events import EventDTO, EventsDTO, ResponseEventDTO
-from app.domain.entities.event import AbstractEvent
-from app.domain.entities.provider_a.provider_a import ProviderABaseEvent
+from starlette import status
+
+from app.application.dtos.events import (
+    EventDTO,
+    EventErrorDTO,
+    EventsDTO,
+    ResponseEventDTO,
+)
+from app.domain.entities.event import AbstractEvent, EventProjection
+from app.infrastructure.repository.entities import EventCursor
 
 
 def map_provider_events_to_response_dto(base_events: list[AbstractEvent]) -> ResponseEventDTO:
-    events_data = []
-    for base_event in base_events:
-        if not isinstance(base_event, ProviderABaseEvent):
-            continue
-        for event in base_event.events:
-            min_price = sys.float_info.max
-            max_price = sys.float_info.min
-            for zone in event.zones:
-                if zone.price < min_price:
-                    min_price = zone.price
-                if zone.price > max_price:
-                    max_price = zone.price
-
-            event_data = EventDTO(
-                id=str(base_event.base_event_id),
-                title=base_event.title,
-                start_date=event.event_start_date.date(),
-                start_time=event.event_start_date.time(),
-                end_date=event.event_end_date.date(),
-                end_time=event.event_end_date.time(),
-                min_price=min_price,
-                max_price=max_price,
+    return map_event_projections_to_response_dto(
+        [projection for base_event in base_events for projection in base_event.projections()],
+    )
+
+
+def map_event_projections_to_response_dto(
+    projections: list[EventProjection],
+    next_cursor: Optional[EventCursor] = None,
+) -> ResponseEventDTO:
+    events_data = [
+        EventDTO(
+            id=projection.id,
+            title=projection.title,
+            start_date=projection.start.date(),
+            start_time=projection.start.time(),
+            end_date=projection.end.date(),
+            end_time=projection.end.time(),
+            min_price=projection.min_price,
+            max_price=projection.max_price,
+        )
+        for projection in projections
+    ]
+    return ResponseEventDTO(data=EventsDTO(events=events_data, next_cursor=map_cursor_to_dto(next_cursor)))
+
+
+def map_cursor_to_dto(cursor: Optional[EventCursor]) -> Optional[str]:
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(f"{cursor.start}:{cursor.event_id}".encode()).decode()
+
+
+def map_dto_to_cursor(cursor: str) -> EventCursor:
+    """
+    :exception: ValueError if the cursor was not returned by `map_cursor_to_dto`
+    """
+    start, separator, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition(":")
+    if not separator or not event_id:
+        raise ValueError(f"Invalid cursor {cursor}")
+    return EventCursor(start=float(start), event_id=event_id)
+
+
+def merge_provider_responses_dto(responses: dict[str, ResponseEventDTO]) -> ResponseEventDTO:
+    """
+    Merge the responses of the providers, sorted by start and without duplicated events
+    :param responses: response of each provider by provider name
+    :return: error only if all the providers failed, the failed providers are in `provider_errors`
+    """
+    events: dict[tuple[object, ...], EventDTO] = {}
+    next_cursors: dict[str, str] = {}
+    provider_errors: dict[str, EventErrorDTO] = {}
+    for provider, response in responses.items():
+        if response.data is None:
+            provider_errors[provider] = response.error or EventErrorDTO(
+                code=str(status.HTTP_500_INTERNAL_SERVER_ERROR),
+                message="No events returned",
             )
-            events_data.append(event_data)
+            continue
+        for event in response.data.events:
+            events.setdefault((event.id, event.start_date, event.start_time, event.end_date, event.end_time), event)
+        if response.data.next_cursor:
+            next_cursors[provider] = response.data.next_cursor
+
+    if provider_errors and len(provider_errors) == len(responses):
+        return ResponseEventDTO(
+            error=EventErrorDTO(
+                code=str(status.HTTP_500_INTERNAL_SERVER_ERROR),
+                message=f"Error retrieving events from providers: {', '.join(provider_errors)}",
+            ),
+            provider_errors=provider_errors,
+        )
+    return ResponseEventDTO(
+        data=EventsDTO(
+            events=sorted(events.values(), key=lambda event: (event.start_date, event.start_time, event.id)),
+            next_cursor=map_provider_cursors_to_dto(next_cursors),
+        ),
+        provider_errors=provider_errors or None,
+    )
+
+
+def map_provider_cursors_to_dto(cursors: dict[str, str]) -> Optional[str]:
+    """Each provider is paginated with its own cursor, the providers without more pages are left out"""
+    if not cursors:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(cursors).encode()).decode()
+
 
-    return ResponseEventDTO(data=EventsDTO(events=events_data))
+def map_dto_to_provider_cursors(cursor: str) -> dict[str, EventCursor]:
+    """
+    :exception: ValueError if the cursor was not returned by `map_provider_cursors_to_dto`
+    """
+    cursors = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(cursors, dict) or not cursors:
+        raise ValueError(f"Invalid cursor {cursor}")
+    return {str(provider): map_dto_to_cursor(str(provider_cursor)) for provider, provider_cursor in cursors.items()}
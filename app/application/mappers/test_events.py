@@ -1,8 +1,29 @@
-from datetime import datetime
+import logging
+import timeit
+import tracemalloc
+from datetime import date, datetime, time, timedelta
 
 import pytest
+from pydantic import BaseModel, TypeAdapter
 
-from app.application.mappers.events import map_provider_events_to_response_dto
+from app.application.dtos.events import (
+    EventErrorDTO,
+    EventsDTO,
+    ResponseEventDTO,
+)
+from app.application.mappers.events import (
+    map_cursor_to_dto,
+    map_dto_to_cursor,
+    map_dto_to_provider_cursors,
+    map_event_projections_to_response_dto,
+    map_provider_cursors_to_dto,
+    map_provider_events_to_response_dto,
+    merge_provider_responses_dto,
+)
+from app.domain.entities.event import EventProjection
+from app.infrastructure.repository.codec import encode_packed, unpack
+from app.infrastructure.repository.entities import EventCursor
+from app.infrastructure.repository.provider_a import ProviderA
 from app.domain.entities.provider_a.provider_a import (
     ProviderABaseEvent,
     ProviderAEvent,
@@ -10,6 +31,8 @@ from app.domain.entities.provider_a.provider_a import (
     SellModeEnum,
 )
 
+log = logging.getLogger(__name__)
+
 
 @pytest.fixture
 def sample_provider_event():
@@ -84,3 +107,142 @@ def test_map_provider_to_response_single_zone():
     assert response.data.events[0].max_price == 50.0
     assert response.data.events[0].title == "Single Zone Event"
     assert response.data.events[0].id == "1"
+
+
+def test_map_event_projections_to_response_happy_path():
+    projection = EventProjection(
+        id="1",
+        event_id="1000",
+        title="Projection Event",
+        start=datetime(2024, 5, 8, 10, 0),
+        end=datetime(2024, 5, 8, 12, 30),
+        min_price=50.0,
+        max_price=75.0,
+    )
+    response = map_event_projections_to_response_dto([projection])
+    assert response.error is None
+    assert len(response.data.events) == 1
+    assert response.data.events[0].id == "1"
+    assert response.data.events[0].title == "Projection Event"
+    assert response.data.events[0].start_date == date(2024, 5, 8)
+    assert response.data.events[0].start_time == time(10, 0)
+    assert response.data.events[0].end_date == date(2024, 5, 8)
+    assert response.data.events[0].end_time == time(12, 30)
+    assert response.data.events[0].min_price == 50.0
+    assert response.data.events[0].max_price == 75.0
+
+
+def test_map_event_projections_to_response_next_cursor():
+    response = map_event_projections_to_response_dto([], EventCursor(start=1625083200.0, event_id="291"))
+    assert response.data.events == []
+    assert map_dto_to_cursor(response.data.next_cursor) == EventCursor(start=1625083200.0, event_id="291")
+
+
+def test_map_cursor_round_trip():
+    cursor = EventCursor(start=1625083200.5, event_id="base:291")
+    assert map_dto_to_cursor(map_cursor_to_dto(cursor)) == cursor
+    assert map_cursor_to_dto(None) is None
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "MTIz", "YWJjOjE="])
+def test_map_dto_to_cursor_invalid(cursor):
+    with pytest.raises(ValueError):
+        map_dto_to_cursor(cursor)
+
+
+def test_merge_provider_responses_next_cursors(sample_provider_event):
+    [event] = map_provider_events_to_response_dto(sample_provider_event).data.events
+    provider_cursor = map_cursor_to_dto(EventCursor(start=1625083200.0, event_id="1"))
+
+    response = merge_provider_responses_dto(
+        {
+            "ProviderA": ResponseEventDTO(data=EventsDTO(events=[event], next_cursor=provider_cursor)),
+            "ProviderB": ResponseEventDTO(data=EventsDTO(events=[event])),
+        },
+    )
+
+    assert response.error is None
+    assert response.provider_errors is None
+    assert response.data.events == [event]
+    assert map_dto_to_provider_cursors(response.data.next_cursor) == {
+        "ProviderA": EventCursor(start=1625083200.0, event_id="1"),
+    }
+
+
+def test_merge_provider_responses_all_failed():
+    error = EventErrorDTO(code="500", message="Error retrieving events")
+
+    response = merge_provider_responses_dto(
+        {"ProviderA": ResponseEventDTO(error=error), "ProviderB": ResponseEventDTO(error=error)},
+    )
+
+    assert response.data is None
+    assert response.error == EventErrorDTO(
+        code="500",
+        message="Error retrieving events from providers: ProviderA, ProviderB",
+    )
+    assert response.provider_errors == {"ProviderA": error, "ProviderB": error}
+
+
+def test_map_provider_cursors_empty():
+    assert map_provider_cursors_to_dto({}) is None
+    with pytest.raises(ValueError):
+        map_dto_to_provider_cursors(map_cursor_to_dto(EventCursor(start=1.0, event_id="1")))
+
+
+class _EventProjectionModel(BaseModel):
+    """Pydantic model of the projections before the slotted dataclass, to compare the read path"""
+
+    id: str
+    event_id: str
+    title: str
+    start: datetime
+    end: datetime
+    min_price: float
+    max_price: float
+
+
+@pytest.mark.benchmark
+def test_benchmark_slotted_dataclass_vs_model_projections():
+    documents = [
+        encode_packed(
+            EventProjection(
+                id=str(i),
+                event_id=str(i),
+                title=f"Event {i}",
+                start=datetime(2021, 1, 1) + timedelta(hours=i),
+                end=datetime(2021, 1, 1) + timedelta(hours=i + 1),
+                min_price=10.0,
+                max_price=20.0,
+            ),
+        )
+        for i in range(10_000)
+    ]
+    models_adapter = TypeAdapter(list[_EventProjectionModel])
+
+    def read_models():
+        models = models_adapter.validate_python([unpack(_EventProjectionModel, document) for document in documents])
+        return map_event_projections_to_response_dto(models)
+
+    def read_dataclasses():
+        return map_event_projections_to_response_dto(ProviderA._decode_projections(documents))
+
+    measurements = {}
+    for name, read in [("model", read_models), ("dataclass", read_dataclasses)]:
+        elapsed = min(timeit.repeat(read, number=1, repeat=5))
+        tracemalloc.start()
+        response = read()
+        _, allocated = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        measurements[name] = (elapsed, allocated, response)
+
+    log.info(
+        f"{len(documents)} events read: "
+        + ", ".join(
+            f"{name} {elapsed * 1000:.1f} ms {allocated / 2**20:.1f} MiB"
+            for name, (elapsed, allocated, _) in measurements.items()
+        ),
+    )
+    # The latency is dominated by the response DTOs, only the allocations are stable enough to compare
+    assert measurements["dataclass"][2] == measurements["model"][2]
+    assert measurements["dataclass"][1] < measurements["model"][1]
@@ -1,9 +1,15 @@
+import asyncio
+import logging
+from typing import AsyncIterator, ClassVar, Hashable, Optional
+
 from starlette import status
 
 from app.application.dtos.events import EventErrorDTO, ResponseEventDTO
-from app.application.mappers.events import map_provider_events_to_response_dto
+from app.application.mappers.events import map_event_projections_to_response_dto
 from app.infrastructure.repository.base import BaseRepositoryProvider
-from app.infrastructure.repository.entities import DatabaseError, FilterQuery
+from app.infrastructure.repository.entities import DatabaseError, EventPage, FilterQuery
+
+log = logging.getLogger(__name__)
 
 
 class ResultEvent:
@@ -11,14 +17,63 @@ class ResultEvent:
 
 
 class RequestEventsUseCase:
+    # Repository requests in flight of all the instances, by repository instance and query
+    _in_flight: ClassVar[dict[Hashable, "asyncio.Future[EventPage]"]] = {}
+
     def __init__(self, repository: BaseRepositoryProvider) -> None:
         self._repository = repository
 
     async def execute(self, filter_query: FilterQuery) -> ResponseEventDTO:
         try:
-            events = await self._repository.get_all(filter_query)
-            return map_provider_events_to_response_dto(events)
+            page = await self._get_all(filter_query)
+            return map_event_projections_to_response_dto(page.projections, page.next_cursor)
         except (DatabaseError, Exception) as e:
             return ResponseEventDTO(
                 error=EventErrorDTO(code=str(status.HTTP_500_INTERNAL_SERVER_ERROR), message=str(e)),
             )
+
+    async def get_generation(self) -> Optional[bytes]:
+        """:return: generation of the events of the repository, it changes when they are updated"""
+        return await self._repository.get_generation()
+
+    async def _get_all(self, filter_query: FilterQuery) -> EventPage:
+        """
+        Concurrent identical queries share a single repository request (single-flight), the first one starts it
+        and the rest await the same result. A cancelled awaiter does not cancel the request of the others
+        :return: the page of events of the repository
+        :exception: the one raised by the repository, to all the awaiters
+        """
+        # Repositories of the same class hold the events of different providers. The id is not reused while the request
+        # in flight references the repository
+        key = (id(self._repository), filter_query)
+        request = self._in_flight.get(key)
+        if request is None:
+            request = asyncio.ensure_future(self._repository.get_all(filter_query))
+            self._in_flight[key] = request
+            request.add_done_callback(lambda done: self._request_done(key, done))
+        else:
+            log.debug(f"Awaiting request in flight for {filter_query}")
+        return await asyncio.shield(request)
+
+    @classmethod
+    def _request_done(cls, key: Hashable, request: "asyncio.Future[EventPage]") -> None:
+        if cls._in_flight.get(key) is request:
+            del cls._in_flight[key]
+        # Retrieved, even if all the awaiters were cancelled
+        if not request.cancelled():
+            request.exception()
+
+    async def stream(self, filter_query: FilterQuery) -> AsyncIterator[ResponseEventDTO]:
+        """
+        Yield the events in batches as they are read from the repository
+        :return: a response per batch, the last one with the next cursor if the limit was reached, or with the error if
+        the repository fails
+        """
+        try:
+            async for page in self._repository.stream_all(filter_query):
+                yield map_event_projections_to_response_dto(page.projections, page.next_cursor)
+        except (DatabaseError, Exception) as e:
+            log.error(f"Error streaming events: {e}", exc_info=True)
+            yield ResponseEventDTO(
+                error=EventErrorDTO(code=str(status.HTTP_500_INTERNAL_SERVER_ERROR), message=str(e)),
+            )
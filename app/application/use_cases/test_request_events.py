@@ -1,8 +1,15 @@
+import asyncio
+from datetime import datetime
+
 import pytest
 from redis import RedisError
 
 from app.application.dtos.events import EventsDTO
+from app.application.mappers.events import map_cursor_to_dto
 from app.application.use_cases.request_events import RequestEventsUseCase
+from app.domain.entities.event import EventProjection
+from app.infrastructure.repository.base import BaseRepositoryProvider
+from app.infrastructure.repository.entities import EventCursor, EventPage, FilterQuery
 from app.infrastructure.repository.provider_a import ProviderA
 
 
@@ -14,27 +21,147 @@ async def repository_use_case(redis_mock):
 
 
 async def test_execute_failed_redis_error(redis_mock, repository_use_case, mocker):
-    redis_mock.pipeline.side_effect = RedisError("Error retrieving events")
-    filter_query = mocker.Mock()
+    redis_mock.register_script().side_effect = RedisError("Error retrieving events")
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
     result = await repository_use_case.execute(filter_query)
     assert result.data is None
     assert result.error.message == "Error retrieving events"
 
 
 async def test_execute_failed_unexpected_exception(redis_mock, repository_use_case, mocker):
-    redis_mock.pipeline.side_effect = KeyError("Error retrieving events")
-    filter_query = mocker.Mock()
+    redis_mock.register_script().side_effect = KeyError("Error retrieving events")
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
     result = await repository_use_case.execute(filter_query)
     assert result.data is None
     assert result.error.message == "'Error retrieving events'"
 
 
 async def test_execute_empty_response(redis_mock, repository_use_case, mocker):
-    redis_mock.pipeline().execute.return_value = [[], []]
-    filter_query = mocker.Mock()
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
     result = await repository_use_case.execute(filter_query)
     assert result.data == EventsDTO(events=[])
     assert result.error is None
-    redis_mock.pipeline().execute.assert_called_once()
+    redis_mock.register_script().assert_awaited_once()
+    redis_mock.pipeline().execute.assert_not_called()
     redis_mock.scan_iter.assert_not_called()
     redis_mock.get.assert_not_called()
+
+
+async def test_stream_happy_path(mocker):
+    projection = EventProjection(
+        id="1",
+        event_id="11",
+        title="Event 1",
+        start=datetime(2020, 1, 1),
+        end=datetime(2020, 1, 2),
+        min_price=10.0,
+        max_price=20.0,
+    )
+
+    async def stream_all(_):
+        yield EventPage(projections=[projection])
+        yield EventPage(projections=[projection, projection], next_cursor=EventCursor(start=1, event_id="11"))
+
+    repository = mocker.Mock(spec_set=BaseRepositoryProvider)
+    repository.stream_all = stream_all
+    use_case = RequestEventsUseCase(repository)
+
+    responses = [response async for response in use_case.stream(mocker.Mock())]
+
+    assert [len(response.data.events) for response in responses] == [1, 2]
+    assert all(response.error is None for response in responses)
+    assert [response.data.next_cursor for response in responses] == [
+        None,
+        map_cursor_to_dto(EventCursor(start=1, event_id="11")),
+    ]
+
+
+async def test_stream_failed_redis_error(redis_mock, repository_use_case, mocker):
+    redis_mock.register_script().side_effect = RedisError("Error retrieving events")
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
+
+    [response] = [response async for response in repository_use_case.stream(filter_query)]
+
+    assert response.data is None
+    assert response.error.message == "Error retrieving events"
+
+
+@pytest.fixture
+def slow_repository(mocker):
+    released = asyncio.Event()
+
+    async def get_all(_):
+        await released.wait()
+        return EventPage(projections=[])
+
+    repository = mocker.Mock(spec_set=BaseRepositoryProvider)
+    repository.get_all = mocker.AsyncMock(side_effect=get_all)
+    return repository, released
+
+
+async def test_execute_concurrent_identical_queries(slow_repository):
+    repository, released = slow_repository
+    filter_queries = [FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2)) for _ in range(3)]
+
+    requests = [asyncio.create_task(RequestEventsUseCase(repository).execute(query)) for query in filter_queries]
+    await asyncio.sleep(0)
+    released.set()
+    responses = await asyncio.gather(*requests)
+
+    repository.get_all.assert_awaited_once_with(filter_queries[0])
+    assert all(response.data == EventsDTO(events=[]) for response in responses)
+    assert not RequestEventsUseCase._in_flight
+
+
+async def test_execute_concurrent_different_queries(slow_repository):
+    repository, released = slow_repository
+    filter_queries = [
+        FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2)),
+        FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 3)),
+    ]
+
+    requests = [asyncio.create_task(RequestEventsUseCase(repository).execute(query)) for query in filter_queries]
+    await asyncio.sleep(0)
+    released.set()
+    await asyncio.gather(*requests)
+
+    assert repository.get_all.await_count == 2
+
+
+async def test_execute_concurrent_identical_queries_of_different_repositories(mocker):
+    # Repositories of the same class, of different providers
+    repositories = [ProviderA(redis=mocker.Mock()) for _ in range(2)]
+    for repository in repositories:
+        repository.get_all = mocker.AsyncMock(return_value=EventPage(projections=[], next_cursor=None))
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
+
+    await asyncio.gather(*(RequestEventsUseCase(repository).execute(filter_query) for repository in repositories))
+
+    for repository in repositories:
+        repository.get_all.assert_awaited_once_with(filter_query)
+
+
+async def test_execute_concurrent_error(mocker):
+    repository = mocker.Mock(spec_set=BaseRepositoryProvider)
+    repository.get_all = mocker.AsyncMock(side_effect=RedisError("Error retrieving events"))
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
+
+    responses = await asyncio.gather(*(RequestEventsUseCase(repository).execute(filter_query) for _ in range(2)))
+
+    repository.get_all.assert_awaited_once()
+    assert [response.error.message for response in responses] == ["Error retrieving events"] * 2
+
+
+async def test_execute_cancelled_awaiter(slow_repository):
+    repository, released = slow_repository
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
+
+    cancelled = asyncio.create_task(RequestEventsUseCase(repository).execute(filter_query))
+    request = asyncio.create_task(RequestEventsUseCase(repository).execute(filter_query))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    released.set()
+
+    response = await request
+    assert response.data == EventsDTO(events=[])
+    assert cancelled.cancelled()
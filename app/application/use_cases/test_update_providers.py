@@ -1,3 +1,5 @@
+import logging
+
 import httpx
 import pytest
 from httpx import HTTPStatusError
@@ -9,10 +11,31 @@ from app.application.use_cases.update_events import (
     UpdateEventsUseCase,
 )
 from app.domain.entities.provider_a.provider_a import ProviderABaseEvent, SellModeEnum
-from app.infrastructure.api.external_providers.base import BaseApiProvider
+from app.domain.entities.feed import FeedValidators
+from app.infrastructure.api.external_providers.base import (
+    BaseApiProvider,
+    FeedNotModifiedError,
+)
 from app.infrastructure.repository.base import BaseRepositoryProvider
 
 
+def base_event(base_event_id, sell_mode=SellModeEnum.online):
+    return ProviderABaseEvent(
+        sell_mode=sell_mode,
+        title=f"Event {base_event_id}",
+        organizer_company_id=base_event_id,
+        events=[],
+        base_event_id=base_event_id,
+    )
+
+
+async def stream(base_events, error=None):
+    for event in base_events:
+        yield event
+    if error:
+        raise error
+
+
 @pytest.fixture
 def use_case(mocker):
     use_case = UpdateEventsUseCase(
@@ -20,106 +43,150 @@ def use_case(mocker):
         repository=mocker.Mock(spec_set=BaseRepositoryProvider),
     )
     use_case._event_service = mocker.AsyncMock()
+    use_case._event_service.stream_events = mocker.Mock(return_value=stream([]))
+    use_case._event_service.get_feed_validators.return_value = None
     return use_case
 
 
 async def test_execute_no_online_events(use_case):
-    use_case._event_service.extract_events.return_value = [
-        ProviderABaseEvent(
-            sell_mode=SellModeEnum.offline,
-            title="Event 1",
-            organizer_company_id=1,
-            events=[],
-            base_event_id=1,
-        ),
-    ]
-    use_case._event_service.store_events.return_value = ResultUpdateProvider(status=ResultStatus.OK)
+    use_case._event_service.stream_events.return_value = stream([base_event(1, SellModeEnum.offline)])
     result = await use_case.execute()
 
     assert result.status == ResultStatus.OK
     assert result.error_description is None
-    use_case._event_service.extract_events.assert_called_with()
-    use_case._event_service.store_events.assert_called_with([])
+    use_case._event_service.stream_events.assert_called_with(None)
+    use_case._event_service.store_events.assert_not_called()
 
 
 async def test_execute_parsing_error(use_case):
-    use_case._event_service.extract_events.side_effect = ValueError
+    use_case._event_service.stream_events.return_value = stream([], ValueError())
 
     result = await use_case.execute()
 
     assert result.status == ResultStatus.ERROR
     assert result.error_description == "Error updating events"
-    use_case._event_service.extract_events.assert_called_with()
+    use_case._event_service.stream_events.assert_called_with(None)
     use_case._event_service.store_events.assert_not_called()
 
 
 async def test_execute_connection_error(use_case, mocker, caplog):
     response = httpx.Response(status_code=status.HTTP_400_BAD_REQUEST)
     status_error = HTTPStatusError(request=mocker.Mock(), response=response, message="Connection error")
-    use_case._event_service.extract_events.side_effect = status_error
+    use_case._event_service.stream_events.return_value = stream([], status_error)
 
     result = await use_case.execute()
 
     assert result.status == ResultStatus.ERROR
-    use_case._event_service.extract_events.assert_called_with()
+    use_case._event_service.stream_events.assert_called_with(None)
     use_case._event_service.store_events.assert_not_called()
     assert "Error updating events: Connection error" in caplog.text
 
 
 async def test_execute_unexpected_error(use_case, caplog):
-    use_case._event_service.extract_events.side_effect = Exception("Unexpected error")
+    use_case._event_service.stream_events.return_value = stream([], Exception("Unexpected error"))
 
     result = await use_case.execute()
 
     assert result.status == ResultStatus.ERROR
-    use_case._event_service.extract_events.assert_called_with()
+    use_case._event_service.stream_events.assert_called_with(None)
     use_case._event_service.store_events.assert_not_called()
     assert "Error updating events: Unexpected error" in caplog.text
 
 
 async def test_execute_happy_path(use_case):
-    use_case._event_service.extract_events.return_value = [
-        ProviderABaseEvent(
-            sell_mode=SellModeEnum.online,
-            title="Event 1",
-            organizer_company_id=1,
-            events=[],
-            base_event_id=1,
-        ),
-        ProviderABaseEvent(
-            sell_mode=SellModeEnum.offline,
-            title="Event 2",
-            organizer_company_id=2,
-            events=[],
-            base_event_id=2,
-        ),
-        ProviderABaseEvent(
-            sell_mode=SellModeEnum.online,
-            title="Event 3",
-            organizer_company_id=3,
-            events=[],
-            base_event_id=3,
-        ),
-    ]
+    use_case._event_service.stream_events.return_value = stream(
+        [base_event(1), base_event(2, SellModeEnum.offline), base_event(3)],
+    )
 
     result = await use_case.execute()
 
     assert result.status == ResultStatus.OK
     assert result.error_description is None
-    expected = [
-        ProviderABaseEvent(
-            base_event_id=1,
-            sell_mode=SellModeEnum.online,
-            title="Event 1",
-            organizer_company_id=1,
-            events=[],
-        ),
-        ProviderABaseEvent(
-            base_event_id=3,
-            sell_mode=SellModeEnum.online,
-            title="Event 3",
-            organizer_company_id=3,
-            events=[],
-        ),
+    use_case._event_service.store_events.assert_called_once_with([base_event(1), base_event(3)])
+
+
+async def test_execute_store_in_batches(use_case, mocker):
+    use_case._batch_size = 2
+    use_case._event_service.stream_events.return_value = stream(
+        [base_event(1), base_event(2, SellModeEnum.offline), base_event(3), base_event(4), base_event(5)],
+    )
+
+    result = await use_case.execute()
+
+    assert result.status == ResultStatus.OK
+    assert use_case._event_service.store_events.await_args_list == [
+        mocker.call([base_event(1), base_event(3)]),
+        mocker.call([base_event(4), base_event(5)]),
     ]
-    use_case._event_service.store_events.assert_called_once_with(expected)
+
+
+async def test_execute_error_after_batch_stored(use_case):
+    use_case._batch_size = 1
+    use_case._event_service.stream_events.return_value = stream([base_event(1)], ValueError("XML Parsing Error"))
+
+    result = await use_case.execute()
+
+    assert result.status == ResultStatus.ERROR
+    use_case._event_service.store_events.assert_called_once_with([base_event(1)])
+
+
+def test_invalid_batch_size(mocker):
+    with pytest.raises(ValueError) as exc_info:
+        UpdateEventsUseCase(
+            api=mocker.Mock(spec_set=BaseApiProvider),
+            repository=mocker.Mock(spec_set=BaseRepositoryProvider),
+            batch_size=0,
+        )
+    assert str(exc_info.value) == "'update_events_batch_size' must be greater than 0"
+
+
+async def test_execute_saves_feed_validators_after_storing(use_case):
+    validators = FeedValidators(etag='"etag-1"')
+    use_case._event_service.get_feed_validators.return_value = validators
+    use_case._event_service.stream_events.return_value = stream([base_event(1)])
+
+    result = await use_case.execute()
+
+    assert result.status == ResultStatus.OK
+    use_case._event_service.stream_events.assert_called_once_with(validators)
+    use_case._event_service.store_events.assert_called_once_with([base_event(1)])
+    use_case._event_service.save_feed_validators.assert_awaited_once_with()
+
+
+async def test_execute_feed_not_modified(use_case, caplog):
+    caplog.set_level(logging.INFO)
+    use_case._event_service.get_feed_validators.return_value = FeedValidators(etag='"etag-1"')
+    use_case._event_service.stream_events.return_value = stream([], FeedNotModifiedError('ETag: "etag-1"'))
+
+    result = await use_case.execute()
+
+    assert result == ResultUpdateProvider(status=ResultStatus.OK)
+    use_case._event_service.store_events.assert_not_called()
+    use_case._event_service.save_feed_validators.assert_not_called()
+    assert 'Events not updated: ETag: "etag-1"' in caplog.text
+
+
+async def test_execute_error_does_not_save_feed_validators(use_case):
+    use_case._event_service.stream_events.return_value = stream([base_event(1)], ValueError("XML Parsing Error"))
+
+    await use_case.execute()
+
+    use_case._event_service.save_feed_validators.assert_not_called()
+
+
+async def test_execute_finishes_update(use_case):
+    use_case._event_service.stream_events.return_value = stream([base_event(1)])
+
+    await use_case.execute()
+
+    use_case._event_service.finish_update.assert_awaited_once_with()
+
+
+async def test_execute_error_finishes_update(use_case):
+    use_case._batch_size = 1
+    use_case._event_service.stream_events.return_value = stream([base_event(1)], ValueError("XML Parsing Error"))
+
+    await use_case.execute()
+
+    # The batch stored before the error is indexed
+    use_case._event_service.finish_update.assert_awaited_once_with()
@@ -7,10 +7,14 @@ from pydantic import BaseModel
 from app.domain.entities.event import AbstractEvent
 from app.domain.entities.provider_a.provider_a import ProviderABaseEvent, SellModeEnum
 from app.domain.services.provider_a import ProviderService
-from app.infrastructure.api.external_providers.base import BaseApiProvider
+from app.infrastructure.api.external_providers.base import (
+    BaseApiProvider,
+    FeedNotModifiedError,
+)
 from app.infrastructure.repository.base import BaseRepositoryProvider
 from app.infrastructure.repository.entities import DatabaseError
 
+DEFAULT_BATCH_SIZE = 1000
 log = logging.getLogger(__name__)
 
 
@@ -25,24 +29,40 @@ class ResultUpdateProvider(BaseModel):
 
 
 class UpdateEventsUseCase:
-    def __init__(self, api: BaseApiProvider, repository: BaseRepositoryProvider):
+    def __init__(self, api: BaseApiProvider, repository: BaseRepositoryProvider, batch_size: int = DEFAULT_BATCH_SIZE):
+        if batch_size < 1:
+            raise ValueError("'update_events_batch_size' must be greater than 0")
         self._event_service = ProviderService(api, repository)
+        self._batch_size = batch_size
 
     async def execute(self) -> ResultUpdateProvider:
         """
-        1. Obtain all the events from the providers
+        1. Stream the events from the provider, one base event at a time, unless the feed did not change
         2. Filter the provider A events that the sell mode is 'online'
-        3. Store the events
+        3. Store the events in batches of `batch_size` base events, the whole feed is never kept in memory
+        4. Let the repository index the events stored, even if the update failed
         :return: status of the operation
         """
         try:
-            events = await self._event_service.extract_events()
-            online_events = self._filter_online_events(events)
-            await self._event_service.store_events(online_events)
+            validators = await self._event_service.get_feed_validators()
+            batch: list[ProviderABaseEvent] = []
+            async for base_event in self._event_service.stream_events(validators):
+                batch.extend(self._filter_online_events([base_event]))
+                if len(batch) == self._batch_size:
+                    await self._event_service.store_events(batch)
+                    batch = []
+            if batch:
+                await self._event_service.store_events(batch)
+            await self._event_service.save_feed_validators()
+            return ResultUpdateProvider(status=ResultStatus.OK)
+        except FeedNotModifiedError as not_modified:
+            log.info(f"Events not updated: {not_modified}")
             return ResultUpdateProvider(status=ResultStatus.OK)
         except (ValueError, DatabaseError, Exception) as e:
             log.error(f"Error updating events: {e}", exc_info=True)
             return ResultUpdateProvider(status=ResultStatus.ERROR, error_description="Error updating events")
+        finally:
+            await self._event_service.finish_update()
 
     @staticmethod
     def _filter_online_events(events: list[AbstractEvent]) -> list[ProviderABaseEvent]:
@@ -12,5 +12,19 @@ class Settings(BaseSettings):
     redis_host: str
     redis_port: int
     redis_db: int
+    redis_max_connections: int = 50  # connections of the pool shared by the requests and the refreshes
+    redis_pool_timeout: float = 5  # seconds to wait for a free connection of the pool
+    redis_socket_timeout: float = 5  # seconds to wait for a reply
+    redis_socket_connect_timeout: float = 2  # seconds to open a connection
+    update_events_concurrency: int = 4  # providers refreshed at the same time
+    update_events_timeout: float = 60  # seconds to refresh a provider, retries included
+    update_events_batch_size: int = 1000  # base events stored at once while the provider feed is parsed
+    http_client_max_connections: int = 100  # connections to the providers, shared by all of them
+    http_client_max_keepalive_connections: int = 20  # idle connections kept open for the next requests
+    http_client_keepalive_expiry: float = 60  # seconds an idle connection is kept open
+    http_client_http2: bool = True  # negotiated with the providers served over TLS, HTTP/1.1 otherwise
+    response_cache_max_size: int = 1000  # /search responses kept in memory, 0 disables the cache
+    response_cache_ttl: float = 60  # seconds
+    response_cache_window_bucket: int = 0  # seconds, windows widened to whole buckets share responses, then filtered
 
     model_config = SettingsConfigDict(frozen=True)
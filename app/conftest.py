@@ -1,12 +1,12 @@
 import os
 from pathlib import Path
 
-import fastapi_cache
 import pytest
-from fastapi_cache.backends.inmemory import InMemoryBackend
+import redis
 from testcontainers.compose import DockerCompose
 
 from app.adapters.dependencies import ProviderConfig, ProvidersConfig
+from app.config import Settings
 
 
 @pytest.fixture()
@@ -23,14 +23,39 @@ def docker_dependencies():
         os.environ.pop("ENV")
 
 
+@pytest.fixture()
+async def redis_client(docker_dependencies):
+    host, port = docker_dependencies.get_service_host_and_port("redis")
+    client = redis.asyncio.Redis(host=host, port=int(port))
+    await client.flushdb()
+    yield client
+    await client.flushdb()
+    await client.close()
+
+
 @pytest.fixture
 def redis_mock(mocker):
     redis_mock = mocker.MagicMock()
     pipeline = mocker.AsyncMock()
     pipeline.zadd = mocker.Mock()
     pipeline.set = mocker.Mock()
+    pipeline.sadd = mocker.Mock()
+    pipeline.smismember = mocker.Mock()
+    pipeline.smembers = mocker.Mock()
+    pipeline.delete = mocker.Mock()
+    pipeline.mget = mocker.Mock()
     pipeline.zrangebyscore = mocker.Mock(return_value=[])
+    pipeline.hset = mocker.Mock()
+    pipeline.get = mocker.Mock()
+    pipeline.incr = mocker.Mock()
+    pipeline.zrem = mocker.Mock()
+    pipeline.hdel = mocker.Mock()
+    pipeline.unlink = mocker.Mock()
+    pipeline.expireat = mocker.Mock()
     redis_mock.pipeline.return_value = pipeline
+    redis_mock.hmget = mocker.AsyncMock(side_effect=lambda name, keys: [None] * len(keys))
+    redis_mock.zrangebyscore = mocker.AsyncMock(return_value=[])
+    redis_mock.register_script.return_value = mocker.AsyncMock(return_value=[])
     return redis_mock
 
 
@@ -49,7 +74,5 @@ def mock_providers_config():
 
 
 @pytest.fixture
-def mock_cache():
-    fastapi_cache.FastAPICache.init(InMemoryBackend())
-    yield
-    fastapi_cache.FastAPICache.reset()
+def mock_settings():
+    return Settings(redis_host="localhost", redis_port=6379, redis_db=0)
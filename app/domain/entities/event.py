@@ -1,7 +1,28 @@
-from abc import ABC
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
 
 from pydantic import BaseModel
 
 
+@dataclass(frozen=True, slots=True)
+class EventProjection:
+    """
+    Flattened, response-ready view of an event computed at ingest time.
+    A slotted dataclass, not a model, as it is created and kept in memory for every event read. It is validated when it
+    is decoded from the database
+    """
+
+    id: str  # identifier of the base event exposed to the clients
+    event_id: str
+    title: str  # title of the plan
+    start: datetime  # local time
+    end: datetime  # local time
+    min_price: float  # of the zones
+    max_price: float  # of the zones
+
+
 class AbstractEvent(BaseModel, ABC):
-    pass
+    @abstractmethod
+    def projections(self) -> list[EventProjection]:
+        raise NotImplementedError
@@ -0,0 +1,9 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class FeedValidators(BaseModel):
+    etag: Optional[str] = Field(None, description="ETag header of the last feed fetched")
+    last_modified: Optional[str] = Field(None, description="Last-Modified header of the last feed fetched")
+    body_hash: Optional[str] = Field(None, description="Hash of the last feed fetched, when it had no validators")
@@ -1,10 +1,11 @@
+import sys
 from datetime import datetime
 from enum import Enum
-from typing import Any, Optional
+from typing import Optional
 
 from pydantic import BaseModel, Field, model_validator
 
-from app.domain.entities.event import AbstractEvent
+from app.domain.entities.event import AbstractEvent, EventProjection
 
 
 class SellModeEnum(str, Enum):
@@ -29,23 +30,12 @@ class ProviderAEvent(BaseModel):
     sold_out: bool = Field(description="Event is sold out or not")
     zones: list[ProviderAZone] = Field(description="List of zones for the event")
 
-    @model_validator(mode="before")
-    def start_date_must_be_before_end_date(
-        cls,
-        values: dict[str, Any],
-    ) -> dict[str, Any]:  # Any used in official documentation
-        date_format = "%Y-%m-%dT%H:%M:%S"
-        event_start = values.get("event_start_date")
-        event_end = values.get("event_end_date")
-        if (
-            event_end
-            and event_start
-            and isinstance(event_start, str)
-            and isinstance(event_end, str)
-            and datetime.strptime(event_start, date_format) >= datetime.strptime(event_end, date_format)
-        ):
+    @model_validator(mode="after")
+    def start_date_must_be_before_end_date(self) -> "ProviderAEvent":
+        # Dates are compared once parsed, each date is parsed a single time
+        if self.event_start_date >= self.event_end_date:
             raise ValueError("Event start date must be before event end date")
-        return values
+        return self
 
 
 class ProviderABaseEvent(AbstractEvent):
@@ -54,3 +44,17 @@ class ProviderABaseEvent(AbstractEvent):
     title: str = Field(description="Title of the plan")
     organizer_company_id: Optional[int] = Field(None, description="Identifier for the organizer company")
     events: list[ProviderAEvent] = Field(description="List of events for the base event")
+
+    def projections(self) -> list[EventProjection]:
+        return [
+            EventProjection(
+                id=str(self.base_event_id),
+                event_id=str(event.event_id),
+                title=self.title,
+                start=event.event_start_date,
+                end=event.event_end_date,
+                min_price=min((zone.price for zone in event.zones), default=sys.float_info.max),
+                max_price=max((zone.price for zone in event.zones), default=sys.float_info.min),
+            )
+            for event in self.events
+        ]
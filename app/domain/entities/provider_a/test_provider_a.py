@@ -1,6 +1,15 @@
+import sys
+from datetime import datetime
+
 import pytest
 
-from app.domain.entities.provider_a.provider_a import ProviderAEvent
+from app.domain.entities.event import EventProjection
+from app.domain.entities.provider_a.provider_a import (
+    ProviderABaseEvent,
+    ProviderAEvent,
+    ProviderAZone,
+    SellModeEnum,
+)
 
 
 def test_start_date_must_be_before_end_date():
@@ -18,3 +27,46 @@ def test_start_date_must_be_before_end_date():
         ProviderAEvent(**parameters)
 
     assert "Event start date must be before event end date" in str(exc_info.value)
+
+
+def test_projections():
+    event = ProviderAEvent(
+        event_id=11,
+        event_start_date=datetime(2021, 7, 31, 20),
+        event_end_date=datetime(2021, 7, 31, 21),
+        sell_from=datetime(2021, 1, 1),
+        sell_to=datetime(2021, 7, 31),
+        sold_out=False,
+        zones=[
+            ProviderAZone(zone_id=1, capacity=100, price=75.0, name="Zone 1", numbered=True),
+            ProviderAZone(zone_id=2, capacity=100, price=65.0, name="Zone 2", numbered=False),
+        ],
+    )
+    no_zones_event = event.model_copy(update={"event_id": 12, "zones": []})
+    base_event = ProviderABaseEvent(
+        base_event_id=1,
+        sell_mode=SellModeEnum.online,
+        title="Event 1",
+        events=[event, no_zones_event],
+    )
+
+    assert base_event.projections() == [
+        EventProjection(
+            id="1",
+            event_id="11",
+            title="Event 1",
+            start=datetime(2021, 7, 31, 20),
+            end=datetime(2021, 7, 31, 21),
+            min_price=65.0,
+            max_price=75.0,
+        ),
+        EventProjection(
+            id="1",
+            event_id="12",
+            title="Event 1",
+            start=datetime(2021, 7, 31, 20),
+            end=datetime(2021, 7, 31, 21),
+            min_price=sys.float_info.max,
+            max_price=sys.float_info.min,
+        ),
+    ]
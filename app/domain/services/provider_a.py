@@ -1,7 +1,8 @@
 from datetime import datetime
-from typing import Sequence
+from typing import AsyncIterator, Optional, Sequence
 
-from app.domain.entities.event import AbstractEvent
+from app.domain.entities.event import AbstractEvent, EventProjection
+from app.domain.entities.feed import FeedValidators
 from app.infrastructure.api.external_providers.base import BaseApiProvider
 from app.infrastructure.repository.base import BaseRepositoryProvider
 from app.infrastructure.repository.entities import FilterQuery
@@ -18,8 +19,23 @@ class ProviderService:
         response_str = await self._api.extract()
         return [event for event in await self._api.parse(response_str)]
 
+    def stream_events(self, validators: Optional[FeedValidators] = None) -> AsyncIterator[AbstractEvent]:
+        return self._api.stream(validators)
+
+    async def get_feed_validators(self) -> Optional[FeedValidators]:
+        return await self._repository.get_feed_validators()
+
+    async def save_feed_validators(self) -> None:
+        """Validators of the feed just stored, the next refresh is skipped while the feed does not change"""
+        if validators := self._api.validators:
+            await self._repository.save_feed_validators(validators)
+
     async def store_events(self, base_events: Sequence[AbstractEvent]) -> None:
         return await self._repository.add_or_update_events(base_events)
 
-    async def retrieve_events(self, event_start: datetime, event_end: datetime) -> list[AbstractEvent]:
-        return await self._repository.get_all(FilterQuery(starts_at=event_start, ends_at=event_end))
+    async def finish_update(self) -> None:
+        await self._repository.finish_update()
+
+    async def retrieve_events(self, event_start: datetime, event_end: datetime) -> list[EventProjection]:
+        page = await self._repository.get_all(FilterQuery(starts_at=event_start, ends_at=event_end))
+        return page.projections
@@ -1,5 +1,6 @@
 import json
 
+from app.domain.entities.feed import FeedValidators
 from app.domain.entities.provider_a.provider_a import (
     ProviderABaseEvent,
     ProviderAEvent,
@@ -53,3 +54,45 @@ async def test_retrieve_all_events_empty_response(mocker):
     api.extract.assert_called_once_with()
     api.parse.assert_called_once_with("")
     assert events == []
+
+
+async def test_stream_events(mocker):
+    repository = mocker.Mock(spec_set=BaseRepositoryProvider)
+    api = mocker.Mock(spec_set=BaseApiProvider)
+    stream = mocker.Mock()
+    api.stream.return_value = stream
+    event_service = ProviderService(repository=repository, api=api)
+
+    assert event_service.stream_events() is stream
+    api.stream.assert_called_once_with(None)
+
+
+async def test_save_feed_validators(mocker):
+    repository = mocker.AsyncMock(spec_set=BaseRepositoryProvider)
+    api = mocker.Mock(spec_set=BaseApiProvider)
+    api.validators = FeedValidators(etag='"etag-1"')
+    event_service = ProviderService(repository=repository, api=api)
+
+    await event_service.save_feed_validators()
+
+    repository.save_feed_validators.assert_awaited_once_with(FeedValidators(etag='"etag-1"'))
+
+
+async def test_save_feed_validators_without_feed_streamed(mocker):
+    repository = mocker.AsyncMock(spec_set=BaseRepositoryProvider)
+    api = mocker.Mock(spec_set=BaseApiProvider)
+    api.validators = None
+    event_service = ProviderService(repository=repository, api=api)
+
+    await event_service.save_feed_validators()
+
+    repository.save_feed_validators.assert_not_called()
+
+
+async def test_finish_update(mocker):
+    repository = mocker.AsyncMock(spec_set=BaseRepositoryProvider)
+    event_service = ProviderService(repository=repository, api=mocker.Mock(spec_set=BaseApiProvider))
+
+    await event_service.finish_update()
+
+    repository.finish_update.assert_awaited_once_with()
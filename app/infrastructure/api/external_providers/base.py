@@ -1,6 +1,12 @@
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
 
 from app.domain.entities.event import AbstractEvent
+from app.domain.entities.feed import FeedValidators
+
+
+class FeedNotModifiedError(Exception):
+    """The feed did not change since it was fetched with the validators"""
 
 
 class BaseApiProvider(ABC):
@@ -13,3 +19,18 @@ class BaseApiProvider(ABC):
     @abstractmethod
     async def parse(self, response: str) -> list[AbstractEvent]:
         pass
+
+    @abstractmethod
+    def stream(self, validators: Optional[FeedValidators] = None) -> AsyncIterator[AbstractEvent]:
+        """
+        Extract and parse the events incrementally, one base event at a time
+        :param validators: of the previous feed, the feed is only fetched again when it changed
+        :exception: FeedNotModifiedError
+        """
+        pass
+
+    @property
+    @abstractmethod
+    def validators(self) -> Optional[FeedValidators]:
+        """Validators of the last feed streamed completely"""
+        pass
@@ -1,95 +1,207 @@
+import hashlib
 import logging
 import xml.etree.ElementTree as ET  # noqa
-from typing import List, Optional
+from contextlib import aclosing
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, AsyncIterable, AsyncIterator, Iterator, Optional, cast
 
 import httpx
 import pybreaker
 import tenacity
 from httpx import TransportError
-from pydantic import Field, ValidationError
+from pydantic import ValidationError
 from pydantic_core import PydanticSerializationError
-from pydantic_xml import BaseXmlModel, ParsingError, attr, element
 
 from app.domain.entities.event import AbstractEvent
 from app.domain.entities.provider_a.provider_a import ProviderABaseEvent
-from app.infrastructure.api.external_providers.base import BaseApiProvider
-
-
-class Zone(BaseXmlModel):
-    zone_id: int = attr()
-    capacity: int = attr()
-    price: float = attr()
-    name: str = attr()
-    numbered: bool = attr()
-
-
-class Event(BaseXmlModel):
-    event_start_date: str = attr()
-    event_end_date: str = attr()
-    event_id: str = attr()
-    sell_from: str = attr()
-    sell_to: str = attr()
-    sold_out: bool = attr()
-    zones: List[Zone] = element(tag="zone")
-
+from app.domain.entities.feed import FeedValidators
+from app.infrastructure.api.external_providers.base import (
+    BaseApiProvider,
+    FeedNotModifiedError,
+)
+from app.infrastructure.http_client import DEFAULT_TIMEOUT
+
+ROOT_TAG = "eventList"
+BASE_EVENTS_PATH = "output/base_event"
+# Tag of the children of each element and the field of the domain entity where they are validated
+CHILDREN = {
+    "base_event": ("event", "events"),
+    "event": ("zone", "zones"),
+}
+BASE_EVENT_DEPTH = 2  # eventList > output > base_event
+SPOOL_MAX_SIZE = 10 * 1024 * 1024  # bytes of a feed without validators kept in memory, the rest is written to disk
+CHUNK_SIZE = 64 * 1024
+log = logging.getLogger(__name__)
 
-class BaseEvent(BaseXmlModel):
-    base_event_id: str = attr()
-    sell_mode: str = attr()
-    title: str = attr()
-    organizer_company_id: Optional[str] = attr(default=None)
-    events: list[Event] = element(tag="event")
 
+def _to_fields(element: ET.Element) -> dict[str, Any]:
+    """
+    Attributes of the element and its children, validated by the domain entities in a single pass
+    """
+    fields: dict[str, Any] = dict(element.attrib)
+    if element.tag in CHILDREN:
+        tag, field = CHILDREN[element.tag]
+        # Without children the field is missing, so it is reported as required
+        if children := [_to_fields(child) for child in element.iterfind(tag)]:
+            fields[field] = children
+    return fields
 
-class Output(BaseXmlModel):
-    base_events: list[BaseEvent] = Field(alias="base_event")
 
+async def _read_chunks(file: IO[bytes]) -> AsyncIterator[bytes]:
+    while chunk := file.read(CHUNK_SIZE):
+        yield chunk
 
-class EventList(BaseXmlModel, tag="eventList"):
-    output: Output
 
-
-log = logging.getLogger(__name__)
+def _conditional_headers(validators: FeedValidators) -> dict[str, str]:
+    headers = {}
+    if validators.etag:
+        headers["If-None-Match"] = validators.etag
+    if validators.last_modified:
+        headers["If-Modified-Since"] = validators.last_modified
+    return headers
 
 
 def is_400_error(exception: BaseException) -> bool:
     return isinstance(exception, httpx.HTTPStatusError) and exception.response.status_code < 500
 
 
+retry = tenacity.retry(
+    reraise=True,
+    wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
+    stop=tenacity.stop_after_attempt(5),
+    retry=(
+        tenacity.retry_if_exception_type(TransportError)
+        | tenacity.retry_if_exception(lambda exc: not is_400_error(exc))
+    ),
+)
+
+
 class ProviderA(BaseApiProvider):
     breaker = pybreaker.CircuitBreaker(fail_max=1, reset_timeout=60, exclude=[is_400_error])
 
-    def __init__(self, provider_url: str) -> None:
+    def __init__(self, http_client: httpx.AsyncClient, provider_url: str, timeout: float = DEFAULT_TIMEOUT) -> None:
         if not provider_url:
             raise ValueError("'conf.url' is not set or is empty in config.yml file")
+        self._http_client = http_client
         self._url = provider_url
+        self._timeout = timeout
+        self._validators: Optional[FeedValidators] = None
+
+    @property
+    def validators(self) -> Optional[FeedValidators]:
+        return self._validators
 
     @breaker(__pybreaker_call_async=True)
-    @tenacity.retry(
-        reraise=True,
-        wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
-        stop=tenacity.stop_after_attempt(5),
-        retry=(
-            tenacity.retry_if_exception_type(TransportError)
-            | tenacity.retry_if_exception(lambda exc: not is_400_error(exc))
-        ),
-    )
+    @retry
     async def extract(self) -> str:
         """
         :exception: HTTPStatusError, CircuitBreakerError
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self._url, follow_redirects=True, timeout=10)
-            response.raise_for_status()
-            return response.text
+        response = await self._http_client.get(self._url, timeout=self._timeout)
+        response.raise_for_status()
+        return response.text
 
     async def parse(self, response: str) -> list[AbstractEvent]:
         if not response:
             raise ValueError("Response string is empty")
         try:
-            events = EventList.from_xml(response.encode())
-            return [ProviderABaseEvent(**base_event.model_dump()) for base_event in events.output.base_events]
-        except (ET.ParseError, ParsingError) as parse_err:
+            root = ET.fromstring(response.encode())
+            if root.tag != ROOT_TAG:
+                raise ET.ParseError(f"root element not found (actual: {root.tag}, expected: {ROOT_TAG})")
+            return [self._to_base_event(base_event) for base_event in root.iterfind(BASE_EVENTS_PATH)]
+        except ET.ParseError as parse_err:
             raise ValueError(f"XML Parsing Error: {parse_err}")
         except (ValidationError, PydanticSerializationError, ValueError) as value_err:
             raise ValueError(f"XML Validation Error: {value_err}")
+
+    async def stream(self, validators: Optional[FeedValidators] = None) -> AsyncIterator[AbstractEvent]:
+        """
+        Parse the base events while the response is downloaded, the memory does not grow with the size of the feed.
+        The request is conditional on the validators of the previous feed, the feed is not parsed when it did not change
+        :exception: HTTPStatusError, CircuitBreakerError, ValueError, FeedNotModifiedError
+        """
+        validators = validators or FeedValidators()
+        response = await self._open_stream(_conditional_headers(validators))
+        try:
+            if response.status_code == httpx.codes.NOT_MODIFIED:
+                raise FeedNotModifiedError(f"Feed not modified, ETag: {validators.etag}")
+            new_validators = FeedValidators(
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+            async with aclosing(response.aiter_bytes()) as chunks:
+                if new_validators.etag or new_validators.last_modified:
+                    async for base_event in self.parse_stream(chunks):
+                        yield base_event
+                else:
+                    # Without validators the feed is hashed before parsing it, an unchanged feed is not parsed again
+                    with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as body:
+                        body_hash = hashlib.blake2b(digest_size=16)
+                        async for chunk in chunks:
+                            body_hash.update(chunk)
+                            body.write(chunk)
+                        new_validators.body_hash = body_hash.hexdigest()
+                        if new_validators.body_hash == validators.body_hash:
+                            raise FeedNotModifiedError(f"Feed not modified, hash: {validators.body_hash}")
+                        body.seek(0)
+                        async for base_event in self.parse_stream(_read_chunks(body)):
+                            yield base_event
+            self._validators = new_validators
+        finally:
+            await response.aclose()
+
+    async def parse_stream(self, chunks: AsyncIterable[bytes]) -> AsyncIterator[AbstractEvent]:
+        parser: "ET.XMLPullParser[ET.Element]" = ET.XMLPullParser(events=("start", "end"))
+        elements: list[ET.Element] = []  # open elements, from the root to the current one
+        try:
+            async for chunk in chunks:
+                parser.feed(chunk)
+                for base_event in self._read_base_events(parser, elements):
+                    yield base_event
+            parser.close()
+            for base_event in self._read_base_events(parser, elements):
+                yield base_event
+        except ET.ParseError as parse_err:
+            raise ValueError(f"XML Parsing Error: {parse_err}")
+        except (ValidationError, PydanticSerializationError, ValueError) as value_err:
+            raise ValueError(f"XML Validation Error: {value_err}")
+
+    @breaker(__pybreaker_call_async=True)
+    @retry
+    async def _open_stream(self, headers: dict[str, str]) -> httpx.Response:
+        """
+        :return: response with the body not read yet, it has to be closed by the caller
+        :exception: HTTPStatusError, CircuitBreakerError
+        """
+        request = self._http_client.build_request("GET", self._url, headers=headers, timeout=self._timeout)
+        response = await self._http_client.send(request, stream=True)
+        try:
+            if response.status_code != httpx.codes.NOT_MODIFIED:
+                response.raise_for_status()
+        except httpx.HTTPStatusError:
+            await response.aclose()
+            raise
+        return response
+
+    @staticmethod
+    def _read_base_events(
+        parser: "ET.XMLPullParser[ET.Element]",
+        elements: list[ET.Element],
+    ) -> Iterator[ProviderABaseEvent]:
+        # Only start and end events are requested to the parser, all of them are elements
+        for xml_event, node in cast(Iterator[tuple[str, ET.Element]], parser.read_events()):
+            if xml_event == "start":
+                if not elements and node.tag != ROOT_TAG:
+                    raise ET.ParseError(f"root element not found (actual: {node.tag}, expected: {ROOT_TAG})")
+                elements.append(node)
+                continue
+            elements.pop()
+            if node.tag == "base_event" and len(elements) == BASE_EVENT_DEPTH:
+                base_event = ProviderA._to_base_event(node)
+                # The parsed base event is dropped from the tree, only the open elements are kept in memory
+                elements[-1].remove(node)
+                yield base_event
+
+    @staticmethod
+    def _to_base_event(element: ET.Element) -> ProviderABaseEvent:
+        return ProviderABaseEvent.model_validate(_to_fields(element))
@@ -1,10 +1,16 @@
+import logging
+import time
+import xml.etree.ElementTree as ET  # noqa
 from datetime import datetime
+from typing import List, Optional
 
 import httpx
 import pybreaker
 import pytest
 import tenacity
 from httpx import Response
+from pydantic import Field
+from pydantic_xml import BaseXmlModel, attr, element
 from starlette import status
 
 from app.domain.entities.provider_a.provider_a import (
@@ -12,34 +18,70 @@ from app.domain.entities.provider_a.provider_a import (
     ProviderAEvent,
     ProviderAZone,
 )
+from app.domain.entities.feed import FeedValidators
+from app.infrastructure.api.external_providers.base import FeedNotModifiedError
 from app.infrastructure.api.external_providers.provider_a import ProviderA
 
 URL = "https://example.org/"
+log = logging.getLogger(__name__)
 
 
-async def test_parse_events_no_url():
+@pytest.fixture
+async def http_client():
+    async with httpx.AsyncClient() as client:
+        yield client
+
+
+VALID_XML = """<?xml version="1.0" encoding="utf-8"?>
+<eventList xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" version="1.0"
+xsi:noNamespaceSchemaLocation="eventList.xsd">
+   <output>
+      <base_event base_event_id="291" sell_mode="online" title="Camela en concierto">
+          <event event_start_date="2021-06-30T21:00:00" event_end_date="2021-06-30T22:00:00" event_id="291"
+          sell_from="2020-07-01T00:00:00" sell_to="2021-06-30T20:00:00" sold_out="false">
+            <zone zone_id="40" capacity="240" price="20.00" name="Platea" numbered="true" />
+         </event>
+      </base_event>
+      <base_event base_event_id="322" sell_mode="offline" title="Pantomima Full">
+          <event event_start_date="2021-02-10T20:00:22" event_end_date="2021-02-10T21:30:00" event_id="1642"
+          sell_from="2021-01-01T00:00:00" sell_to="2021-02-09T19:50:00" sold_out="false">
+            <zone zone_id="311" capacity="2" price="55.00" name="A42" numbered="true" />
+         </event>
+      </base_event>
+    </output>
+</eventList>
+"""
+
+
+async def chunked(data: str, chunk_size: int = 64):
+    encoded = data.encode()
+    for i in range(0, len(encoded), chunk_size):
+        yield encoded[i : i + chunk_size]
+
+
+async def test_parse_events_no_url(http_client):
     with pytest.raises(ValueError) as exec_info:
-        provider = ProviderA(provider_url="")
+        provider = ProviderA(http_client, provider_url="")
         await provider.parse("")
     assert str(exec_info.value) == "'conf.url' is not set or is empty in config.yml file"
 
 
-async def test_parse_events_no_events():
+async def test_parse_events_no_events(http_client):
     with pytest.raises(ValueError) as exec_info:
-        provider = ProviderA(provider_url="http://localhost")
+        provider = ProviderA(http_client, provider_url="http://localhost")
         await provider.parse("")
     assert str(exec_info.value) == "Response string is empty"
 
 
-async def test_parse_invalid_xml():
-    provider = ProviderA(provider_url="http://localhost")
+async def test_parse_invalid_xml(http_client):
+    provider = ProviderA(http_client, provider_url="http://localhost")
     with pytest.raises(ValueError) as exec_info:
         await provider.parse("<invalid>xml</invalid>")
     assert str(exec_info.value) == "XML Parsing Error: root element not found (actual: invalid, expected: eventList)"
 
 
-async def test_parse_invalid_fields():
-    provider = ProviderA(provider_url="http://localhost")
+async def test_parse_invalid_fields(http_client):
+    provider = ProviderA(http_client, provider_url="http://localhost")
     xml = """<?xml version="1.0" encoding="utf-8"?>
     <eventList xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
     version="1.0" xsi:noNamespaceSchemaLocation="eventList.xsd">
@@ -51,14 +93,37 @@ async def test_parse_invalid_fields():
     """
     with pytest.raises(ValueError) as exec_info:
         await provider.parse(xml)
-    assert "4 validation errors for EventList" in str(exec_info.value)
-    assert "output.base_events.0.base_event_id" in str(exec_info.value)
-    assert "output.base_events.0.sell_mode" in str(exec_info.value)
-    assert "output.base_events.0.title" in str(exec_info.value)
-    assert "output.base_events.0.events" in str(exec_info.value)
+    assert "4 validation errors for ProviderABaseEvent" in str(exec_info.value)
+    assert "\nbase_event_id\n" in str(exec_info.value)
+    assert "\nsell_mode\n" in str(exec_info.value)
+    assert "\ntitle\n" in str(exec_info.value)
+    assert "\nevents\n" in str(exec_info.value)
 
 
-async def test_parse_valid_events():
+@pytest.mark.parametrize(
+    "zone_capacity,event_end_date,error",
+    [
+        ("many", "2021-06-30T22:00:00", "events.0.zones.0.capacity\n  Input should be a valid integer"),
+        ("240", "2021-06-30T20:00:00", "events.0\n  Value error, Event start date must be before event end date"),
+    ],
+)
+async def test_parse_invalid_nested_fields(http_client, zone_capacity, event_end_date, error):
+    provider = ProviderA(http_client, provider_url="http://localhost")
+    xml = f"""<eventList><output>
+        <base_event base_event_id="291" sell_mode="online" title="Camela en concierto">
+            <event event_start_date="2021-06-30T21:00:00" event_end_date="{event_end_date}" event_id="291"
+            sell_from="2020-07-01T00:00:00" sell_to="2021-06-30T20:00:00" sold_out="false">
+                <zone zone_id="40" capacity="{zone_capacity}" price="20.00" name="Platea" numbered="true" />
+            </event>
+        </base_event>
+    </output></eventList>"""
+    with pytest.raises(ValueError) as exec_info:
+        await provider.parse(xml)
+    assert "1 validation error for ProviderABaseEvent" in str(exec_info.value)
+    assert error in str(exec_info.value)
+
+
+async def test_parse_valid_events(http_client):
     xml = """<?xml version="1.0" encoding="utf-8"?>
     <eventList xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" version="1.0"
     xsi:noNamespaceSchemaLocation="eventList.xsd">
@@ -74,7 +139,7 @@ async def test_parse_valid_events():
         </output>
     </eventList>
     """
-    provider = ProviderA(provider_url="http://localhost")
+    provider = ProviderA(http_client, provider_url="http://localhost")
     [result] = await provider.parse(xml)
 
     assert isinstance(result, ProviderABaseEvent)
@@ -98,11 +163,153 @@ async def test_parse_valid_events():
     )
 
 
-async def test_fetch_xml_success(respx_mock):
+async def test_parse_stream_valid_events(http_client):
+    provider = ProviderA(http_client, provider_url="http://localhost")
+
+    result = [base_event async for base_event in provider.parse_stream(chunked(VALID_XML))]
+
+    assert result == await provider.parse(VALID_XML)
+    assert [base_event.base_event_id for base_event in result] == [291, 322]
+
+
+def test_parse_stream_drops_parsed_base_events():
+    parser = ET.XMLPullParser(events=("start", "end"))
+    parser.feed(VALID_XML.encode())
+    elements = []
+
+    base_events = ProviderA._read_base_events(parser, elements)
+    next(base_events)
+    [_, output] = elements
+    assert [base_event.get("base_event_id") for base_event in output] == ["322"]
+    list(base_events)
+
+    assert len(output) == 0
+
+
+async def test_parse_stream_invalid_xml(http_client):
+    provider = ProviderA(http_client, provider_url="http://localhost")
+    with pytest.raises(ValueError) as exec_info:
+        [base_event async for base_event in provider.parse_stream(chunked("<invalid>xml</invalid>"))]
+    assert str(exec_info.value) == "XML Parsing Error: root element not found (actual: invalid, expected: eventList)"
+
+
+async def test_parse_stream_malformed_xml(http_client):
+    provider = ProviderA(http_client, provider_url="http://localhost")
+    with pytest.raises(ValueError) as exec_info:
+        [base_event async for base_event in provider.parse_stream(chunked(VALID_XML[:-30]))]
+    assert str(exec_info.value) == "XML Parsing Error: unclosed token: line 16, column 6"
+
+
+async def test_parse_stream_invalid_fields(http_client):
+    provider = ProviderA(http_client, provider_url="http://localhost")
+    xml = "<eventList><output><base_event></base_event></output></eventList>"
+    with pytest.raises(ValueError) as exec_info:
+        [base_event async for base_event in provider.parse_stream(chunked(xml))]
+    assert "4 validation errors for ProviderABaseEvent" in str(exec_info.value)
+    assert "\nbase_event_id\n" in str(exec_info.value)
+
+
+async def test_stream_events_success(http_client, respx_mock):
+    provider_route = respx_mock.get(URL).mock(return_value=Response(200, content=VALID_XML))
+    provider = ProviderA(http_client, provider_url=URL)
+
+    result = [base_event async for base_event in provider.stream()]
+
+    provider_route.calls.assert_called_once()
+    assert [base_event.base_event_id for base_event in result] == [291, 322]
+
+
+async def test_stream_events_400_error(http_client, respx_mock):
+    provider_route = respx_mock.get(URL).mock(return_value=Response(status.HTTP_400_BAD_REQUEST))
+    provider = ProviderA(http_client, provider_url=URL)
+
+    with pytest.raises(httpx.HTTPStatusError) as exec_info:
+        [base_event async for base_event in provider.stream()]
+
+    provider_route.calls.assert_called_once()
+    assert exec_info.value.response.status_code == status.HTTP_400_BAD_REQUEST
+    assert isinstance(provider.breaker.state, pybreaker.CircuitClosedState)
+
+
+async def test_stream_events_500_error_circuit_breaker_open(http_client, respx_mock):
+    provider_route = respx_mock.get(URL).mock(return_value=Response(status.HTTP_500_INTERNAL_SERVER_ERROR))
+    provider = ProviderA(http_client, provider_url=URL)
+    provider._open_stream.retry.wait = tenacity.wait_fixed(0)
+
+    with pytest.raises(pybreaker.CircuitBreakerError):
+        [base_event async for base_event in provider.stream()]
+
+    assert provider_route.calls.call_count == provider._open_stream.retry.stop.max_attempt_number
+    assert isinstance(provider.breaker.state, pybreaker.CircuitOpenState)
+    provider.breaker.close()
+
+
+async def test_stream_events_saves_validators(http_client, respx_mock):
+    headers = {"ETag": '"etag-1"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    respx_mock.get(URL).mock(return_value=Response(200, content=VALID_XML, headers=headers))
+    provider = ProviderA(http_client, provider_url=URL)
+    assert provider.validators is None
+
+    result = [base_event async for base_event in provider.stream()]
+
+    assert len(result) == 2
+    assert provider.validators == FeedValidators(etag='"etag-1"', last_modified="Wed, 21 Oct 2015 07:28:00 GMT")
+
+
+async def test_stream_events_not_modified(http_client, respx_mock):
+    provider_route = respx_mock.get(URL).mock(return_value=Response(status.HTTP_304_NOT_MODIFIED))
+    provider = ProviderA(http_client, provider_url=URL)
+    validators = FeedValidators(etag='"etag-1"', last_modified="Wed, 21 Oct 2015 07:28:00 GMT")
+
+    with pytest.raises(FeedNotModifiedError):
+        [base_event async for base_event in provider.stream(validators)]
+
+    request = provider_route.calls.last.request
+    assert request.headers["If-None-Match"] == '"etag-1"'
+    assert request.headers["If-Modified-Since"] == "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert provider.validators is None
+    assert isinstance(provider.breaker.state, pybreaker.CircuitClosedState)
+
+
+async def test_stream_events_without_validators_not_modified(http_client, respx_mock):
+    provider_route = respx_mock.get(URL).mock(return_value=Response(200, content=VALID_XML))
+    provider = ProviderA(http_client, provider_url=URL)
+    [base_event async for base_event in provider.stream()]
+    validators = provider.validators
+    assert validators.etag is None and validators.body_hash
+
+    with pytest.raises(FeedNotModifiedError):
+        [base_event async for base_event in provider.stream(validators)]
+
+    assert "If-None-Match" not in provider_route.calls.last.request.headers
+    assert provider.validators == validators
+
+
+async def test_stream_events_without_validators_modified(http_client, respx_mock):
+    respx_mock.get(URL).mock(return_value=Response(200, content=VALID_XML))
+    provider = ProviderA(http_client, provider_url=URL)
+
+    result = [base_event async for base_event in provider.stream(FeedValidators(body_hash="previous-hash"))]
+
+    assert [base_event.base_event_id for base_event in result] == [291, 322]
+    assert provider.validators.body_hash != "previous-hash"
+
+
+async def test_stream_events_error_does_not_save_validators(http_client, respx_mock):
+    respx_mock.get(URL).mock(return_value=Response(200, content="<invalid/>", headers={"ETag": '"etag-1"'}))
+    provider = ProviderA(http_client, provider_url=URL)
+
+    with pytest.raises(ValueError):
+        [base_event async for base_event in provider.stream()]
+
+    assert provider.validators is None
+
+
+async def test_fetch_xml_success(http_client, respx_mock):
     xml_content = "<root><item>1</item><item>2</item></root>"
     provider_route = respx_mock.get(URL).mock(return_value=Response(200, content=xml_content))
 
-    provider = ProviderA(provider_url=URL)
+    provider = ProviderA(http_client, provider_url=URL)
     response = await provider.extract()
 
     provider_route.calls.assert_called_once()
@@ -110,9 +317,20 @@ async def test_fetch_xml_success(respx_mock):
     assert response == xml_content
 
 
-async def test_retrieve_400_error(respx_mock):
+async def test_extract_with_shared_client_and_provider_timeout(mocker):
+    http_client = mocker.AsyncMock(spec_set=httpx.AsyncClient)
+    http_client.get.return_value = Response(200, content="<eventList/>", request=httpx.Request("GET", URL))
+    provider = ProviderA(http_client, provider_url=URL, timeout=2.5)
+
+    assert await provider.extract() == "<eventList/>"
+    assert await provider.extract() == "<eventList/>"
+
+    assert http_client.get.await_args_list == [mocker.call(URL, timeout=2.5)] * 2
+
+
+async def test_retrieve_400_error(http_client, respx_mock):
     provider_route = respx_mock.get(URL).mock(return_value=Response(status.HTTP_400_BAD_REQUEST))
-    provider = ProviderA(provider_url=URL)
+    provider = ProviderA(http_client, provider_url=URL)
     provider.extract.retry.wait = tenacity.wait_fixed(0)
     assert isinstance(provider.breaker.state, pybreaker.CircuitClosedState)
 
@@ -124,9 +342,9 @@ async def test_retrieve_400_error(respx_mock):
     assert isinstance(provider.breaker.state, pybreaker.CircuitClosedState)
 
 
-async def test_retrieve_500_error_circuit_breaker_open(respx_mock):
+async def test_retrieve_500_error_circuit_breaker_open(http_client, respx_mock):
     provider_route = respx_mock.get(URL).mock(return_value=Response(status.HTTP_500_INTERNAL_SERVER_ERROR))
-    provider = ProviderA(provider_url=URL)
+    provider = ProviderA(http_client, provider_url=URL)
     assert isinstance(provider.breaker.state, pybreaker.CircuitClosedState)
     provider.extract.retry.wait = tenacity.wait_fixed(0)
 
@@ -140,9 +358,9 @@ async def test_retrieve_500_error_circuit_breaker_open(respx_mock):
 
 
 @pytest.mark.parametrize("side_effect", [httpx.ConnectError, httpx.TimeoutException])
-async def test_connection_transport_error_circuit_breaker_open(respx_mock, side_effect):
+async def test_connection_transport_error_circuit_breaker_open(http_client, respx_mock, side_effect):
     provider_route = respx_mock.get(URL).mock(side_effect=side_effect)
-    provider = ProviderA(URL)
+    provider = ProviderA(http_client, URL)
     provider.extract.retry.wait = tenacity.wait_fixed(0)
     assert isinstance(provider.breaker.state, pybreaker.CircuitClosedState)
 
@@ -153,3 +371,83 @@ async def test_connection_transport_error_circuit_breaker_open(respx_mock, side_
     assert exec_info.value.args[0] == "Failures threshold reached, circuit breaker opened"
     assert isinstance(provider.breaker.state, pybreaker.CircuitOpenState)
     provider.breaker.close()
+
+
+class Zone(BaseXmlModel):
+    zone_id: int = attr()
+    capacity: int = attr()
+    price: float = attr()
+    name: str = attr()
+    numbered: bool = attr()
+
+
+class Event(BaseXmlModel):
+    event_start_date: str = attr()
+    event_end_date: str = attr()
+    event_id: str = attr()
+    sell_from: str = attr()
+    sell_to: str = attr()
+    sold_out: bool = attr()
+    zones: List[Zone] = element(tag="zone")
+
+
+class BaseEvent(BaseXmlModel, tag="base_event"):
+    base_event_id: str = attr()
+    sell_mode: str = attr()
+    title: str = attr()
+    organizer_company_id: Optional[str] = attr(default=None)
+    events: list[Event] = element(tag="event")
+
+
+class Output(BaseXmlModel):
+    base_events: list[BaseEvent] = Field(alias="base_event")
+
+
+class EventList(BaseXmlModel, tag="eventList"):
+    output: Output
+
+
+def _parse_with_xml_models(response: str) -> list[ProviderABaseEvent]:
+    """Previous parser, validated by the XML models and again by the domain entities"""
+    events = EventList.from_xml(response.encode())
+    return [ProviderABaseEvent(**base_event.model_dump()) for base_event in events.output.base_events]
+
+
+def _synthetic_feed(base_events: int, events_per_base_event: int = 3, zones_per_event: int = 3) -> str:
+    zones = "".join(
+        f'<zone zone_id="{zone_id}" capacity="100" price="{zone_id}.50" name="Zone {zone_id}" numbered="true" />'
+        for zone_id in range(zones_per_event)
+    )
+    events = "".join(
+        f'<event event_start_date="2021-06-{day + 1:02d}T21:00:00" event_end_date="2021-06-{day + 1:02d}T22:00:00" '
+        f'event_id="{day}" sell_from="2020-07-01T00:00:00" sell_to="2021-06-30T20:00:00" sold_out="false">'
+        f"{zones}</event>"
+        for day in range(events_per_base_event)
+    )
+    base_events_xml = "".join(
+        f'<base_event base_event_id="{base_event_id}" sell_mode="online" title="Event {base_event_id}" '
+        f'organizer_company_id="1">{events}</base_event>'
+        for base_event_id in range(base_events)
+    )
+    return f'<?xml version="1.0" encoding="utf-8"?><eventList><output>{base_events_xml}</output></eventList>'
+
+
+@pytest.mark.benchmark
+async def test_benchmark_single_pass_vs_xml_models_parsing(http_client):
+    base_events, events_per_base_event = 2_000, 3
+    feed = _synthetic_feed(base_events, events_per_base_event)
+    provider = ProviderA(http_client, provider_url="http://localhost")
+
+    started = time.perf_counter()
+    xml_models_result = _parse_with_xml_models(feed)
+    xml_models_elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    single_pass_result = await provider.parse(feed)
+    single_pass_elapsed = time.perf_counter() - started
+
+    events = base_events * events_per_base_event
+    log.info(
+        f"{events} events parsed: XML models {events / xml_models_elapsed:.0f} events/s, "
+        f"single pass {events / single_pass_elapsed:.0f} events/s",
+    )
+    assert single_pass_result == xml_models_result
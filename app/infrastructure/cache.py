@@ -0,0 +1,88 @@
+import logging
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Generic, Hashable, Optional, TypeVar
+
+from fastapi import Depends
+
+from app.adapters.dependencies import get_settings
+from app.config import Settings
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+log = logging.getLogger(__name__)
+
+
+class LruTtlCache(Generic[K, V]):
+    """
+    In-process cache bounded in size, the least recently used entries are evicted first.
+    Entries older than the TTL are not returned, the owner invalidates the rest with `clear`
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        if max_size < 0:
+            raise ValueError("'max_size' of the cache must not be negative")
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        if not self._max_size:
+            return
+        self._entries[key] = (time.monotonic() + self._ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class ResponseCache:
+    """
+    Serialized responses by request, valid while the generation of the events does not change.
+    A new generation, after an ingest of any provider, invalidates all the responses at once
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._cache: LruTtlCache[Hashable, bytes] = LruTtlCache(max_size, ttl)
+        self._generation: Optional[Hashable] = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, generation: Hashable, key: Hashable) -> Optional[bytes]:
+        if generation != self._generation:
+            self._cache.clear()
+            self._generation = generation
+        content = self._cache.get(key)
+        if content is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        log.debug(f"Response cache hits: {self.hits}, misses: {self.misses}")
+        return content
+
+    def set(self, generation: Hashable, key: Hashable, content: bytes) -> None:
+        # A response of a previous generation is never stored
+        if generation == self._generation:
+            self._cache.set(key, content)
+
+
+@lru_cache
+def get_response_cache(settings: Settings = Depends(get_settings)) -> ResponseCache:
+    return ResponseCache(settings.response_cache_max_size, settings.response_cache_ttl)
@@ -4,7 +4,7 @@ from typing import TYPE_CHECKING, Never
 import redis
 from fastapi import Depends
 from redis.asyncio.client import Redis
-from redis.asyncio.connection import ConnectionPool
+from redis.asyncio.connection import BlockingConnectionPool, ConnectionPool
 
 from app.adapters.dependencies import get_settings
 from app.config import Settings
@@ -21,7 +21,14 @@ else:
 def get_or_create_redis_pool(settings: Settings = Depends(get_settings)) -> ConnectionPoolBase:
     # Future work change pool to ARQ when using jobs
     protocol = "redis"
-    return ConnectionPool.from_url(f"{protocol}://{settings.redis_host}:{settings.redis_port}/{settings.redis_db}")
+    # A request waits for a free connection instead of failing when all of them are in use
+    return BlockingConnectionPool.from_url(
+        f"{protocol}://{settings.redis_host}:{settings.redis_port}/{settings.redis_db}",
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_pool_timeout,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_connect_timeout,
+    )
 
 
 async def create_redis_client(pool: ConnectionPoolBase = Depends(get_or_create_redis_pool)) -> RedisBase:
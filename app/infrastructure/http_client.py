@@ -0,0 +1,23 @@
+import httpx
+
+from app.config import Settings
+
+DEFAULT_TIMEOUT = 10  # seconds, overridden by the timeout of each provider
+
+
+def create_http_client(settings: Settings) -> httpx.AsyncClient:
+    """
+    Client shared by all the providers, the connections are reused across requests, retries and refreshes.
+    It has to be closed with `aclose` when the application stops
+    """
+    limits = httpx.Limits(
+        max_connections=settings.http_client_max_connections,
+        max_keepalive_connections=settings.http_client_max_keepalive_connections,
+        keepalive_expiry=settings.http_client_keepalive_expiry,
+    )
+    return httpx.AsyncClient(
+        http2=settings.http_client_http2,
+        limits=limits,
+        timeout=DEFAULT_TIMEOUT,
+        follow_redirects=True,
+    )
@@ -1,15 +1,42 @@
 from abc import ABC, abstractmethod
-from typing import Sequence
+from typing import AsyncIterator, Optional, Sequence
 
 from app.domain.entities.event import AbstractEvent
-from app.infrastructure.repository.entities import FilterQuery
+from app.domain.entities.feed import FeedValidators
+from app.infrastructure.repository.entities import EventPage, FilterQuery, UpdateScope
 
 
 class BaseRepositoryProvider(ABC):
+    update_scope = UpdateScope.REPLICAS  # the scheduler runs each update in a single process of the scope
+
     @abstractmethod
     async def add_or_update_events(self, base_events: Sequence[AbstractEvent]) -> None:
         raise NotImplementedError
 
     @abstractmethod
-    async def get_all(self, filter_query: FilterQuery) -> list[AbstractEvent]:
+    async def get_all(self, filter_query: FilterQuery) -> EventPage:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stream_all(self, filter_query: FilterQuery) -> AsyncIterator[EventPage]:
+        """
+        Yield the events in bounded batches, the peak memory does not depend on the number of events. The last batch
+        has the cursor of the next page if the limit of the query was reached
+        """
+        raise NotImplementedError
+
+    async def finish_update(self) -> None:
+        """Called once an update stored its events, or failed, to index at once all the events stored by the update"""
+
+    @abstractmethod
+    async def get_generation(self) -> Optional[bytes]:
+        """:return: generation of the stored events, the caches of the events are valid while it does not change"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_feed_validators(self) -> Optional[FeedValidators]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save_feed_validators(self, validators: FeedValidators) -> None:
         raise NotImplementedError
@@ -0,0 +1,21 @@
+"""
+Monthly buckets of the index of the events in Redis.
+
+The events are indexed in the bucket of the month of their start in UTC, e.g. `event_start:2021-07`, so a query reads
+only the buckets of its window and the events of a month are dropped at once
+"""
+
+from datetime import datetime, timezone
+
+
+def get_bucket(timestamp: float) -> tuple[str, float]:
+    """:return: name and start of the bucket of the timestamp"""
+    date = datetime.fromtimestamp(timestamp, timezone.utc)
+    return f"{date.year:04d}-{date.month:02d}", datetime(date.year, date.month, 1, tzinfo=timezone.utc).timestamp()
+
+
+def add_months(timestamp: float, months: int) -> float:
+    """:return: start of the bucket `months` after the bucket of the timestamp, before it if negative"""
+    date = datetime.fromtimestamp(timestamp, timezone.utc)
+    month = date.year * 12 + date.month - 1 + months
+    return datetime(month // 12, month % 12 + 1, 1, tzinfo=timezone.utc).timestamp()
@@ -0,0 +1,59 @@
+"""
+Versioned encoding of the documents stored in Redis.
+
+The first byte of a document is its format, documents of every format are read so instances of different versions can
+share Redis during a rolling upgrade. Documents stored before the formats are JSON, so they start with `{`
+"""
+
+import zlib
+from dataclasses import fields, is_dataclass
+from typing import Any, TypeVar, cast
+
+import msgpack
+import orjson
+from pydantic import BaseModel
+from pydantic_core import to_jsonable_python
+
+JSON_FORMAT = b"{"  # legacy documents, without format byte
+ZLIB_JSON_FORMAT = b"\x01"  # compressed JSON, for documents written at ingest and seldom read
+MSGPACK_FORMAT = b"\x02"  # MessagePack array of the field values, for small documents read on every request
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def encode_compressed(model: BaseModel) -> bytes:
+    return ZLIB_JSON_FORMAT + zlib.compress(model.model_dump_json().encode())
+
+
+def encode_packed(model: Any) -> bytes:
+    """
+    Values of the fields of a model or a dataclass in the order they are declared, the names are not stored. Only new
+    fields with a default can be added at the end, any other change of the fields needs a new format
+    :return: the document, compact for models without nested models
+    """
+    return MSGPACK_FORMAT + cast(bytes, msgpack.packb(list(to_jsonable_python(model).values())))
+
+
+def unpack(model_type: type[Any], document: bytes) -> dict[str, Any]:
+    """
+    :return: the fields of the document of any format, to be validated by the model
+    :exception: ValueError if the format is unknown
+    """
+    document_format = document[:1]
+    if document_format == JSON_FORMAT:
+        return cast(dict[str, Any], orjson.loads(document))
+    if document_format == ZLIB_JSON_FORMAT:
+        return cast(dict[str, Any], orjson.loads(zlib.decompress(document[1:])))
+    if document_format == MSGPACK_FORMAT:
+        return dict(zip(_field_names(model_type), msgpack.unpackb(document[1:])))
+    raise ValueError(f"Unknown format {document_format!r} of document")
+
+
+def decode(model_type: type[M], document: bytes) -> M:
+    return model_type.model_validate(unpack(model_type, document))
+
+
+def _field_names(model_type: type[Any]) -> list[str]:
+    if is_dataclass(model_type):
+        return [field.name for field in fields(model_type)]
+    return list(model_type.model_fields)
@@ -0,0 +1,224 @@
+"""
+Columnar index of the events kept in memory.
+
+Each projection is a row of NumPy arrays sorted by the start of its event, a window is answered with `searchsorted` for
+its bounds and vectorized masks over the rows inside them, and Python objects are created only for the events found.
+Ids and titles are interned in tables, the rows keep their position in the table. The index is made only of arrays, so
+it can be stored in a snapshot and read without copying it
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from itertools import starmap
+from typing import Any, Iterable, Mapping, Optional, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from app.domain.entities.event import EventProjection
+from app.infrastructure.repository.entities import EventCursor, FilterQuery
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+COLUMNS = (
+    "id_codes",
+    "event_codes",
+    "title_codes",
+    "event_starts",
+    "event_ends",
+    "start_timestamps",
+    "end_timestamps",
+    "starts",
+    "ends",
+    "min_prices",
+    "max_prices",
+)
+TABLES = ("ids", "event_ids", "titles")
+
+Rows = npt.NDArray[np.intp]
+
+
+class ColumnarEventIndex:
+    def __init__(self, columns: Mapping[str, npt.NDArray[Any]], tables: Mapping[str, Sequence[str]]) -> None:
+        """
+        :param columns: arrays of the rows, sorted by start and id of the event, then by id of the base event
+        :param tables: interned ids, event ids (sorted) and titles, the codes of the rows are positions in them
+        """
+        self._columns = dict(columns)
+        self._tables = dict(tables)
+        self._ids, self._event_ids, self._titles = (tables[name] for name in TABLES)
+        self._id_codes = columns["id_codes"]
+        self._event_codes = columns["event_codes"]
+        self._title_codes = columns["title_codes"]
+        self._event_starts = columns["event_starts"]
+        self._event_ends = columns["event_ends"]
+        self._start_timestamps = columns["start_timestamps"]
+        self._end_timestamps = columns["end_timestamps"]
+        self._starts = columns["starts"]  # local times, as they are returned
+        self._ends = columns["ends"]
+        self._min_prices = columns["min_prices"]
+        self._max_prices = columns["max_prices"]
+
+    @classmethod
+    def build(
+        cls,
+        projections: Iterable[EventProjection],
+        dates: dict[str, tuple[float, float]],
+    ) -> "ColumnarEventIndex":
+        """
+        :param projections: events of all the base events
+        :param dates: start and end timestamps by event id, an event id shared by several base events is found by
+        these dates and its projections are then filtered by their own dates, as in Redis
+        """
+        projections = list(projections)
+        count = len(projections)
+        ids, id_codes = _intern_sorted([projection.id for projection in projections])
+        event_ids, event_codes = _intern_sorted([projection.event_id for projection in projections])
+        titles, title_codes = _intern([projection.title for projection in projections])
+        columns: dict[str, npt.NDArray[Any]] = {
+            "id_codes": id_codes,
+            "event_codes": event_codes,
+            "title_codes": title_codes,
+            "event_starts": _float_column((dates[projection.event_id][0] for projection in projections), count),
+            "event_ends": _float_column((dates[projection.event_id][1] for projection in projections), count),
+            "start_timestamps": _float_column((projection.start.timestamp() for projection in projections), count),
+            "end_timestamps": _float_column((projection.end.timestamp() for projection in projections), count),
+            "starts": _to_datetime64([projection.start for projection in projections]),
+            "ends": _to_datetime64([projection.end for projection in projections]),
+            "min_prices": _float_column((projection.min_price for projection in projections), count),
+            "max_prices": _float_column((projection.max_price for projection in projections), count),
+        }
+        order = np.lexsort((id_codes, event_codes, columns["event_starts"]))
+        return cls(
+            {name: column[order] for name, column in columns.items()},
+            {"ids": ids, "event_ids": event_ids, "titles": titles},
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, npt.NDArray[Any]]) -> "ColumnarEventIndex":
+        """
+        :param arrays: returned by `to_arrays`, the index reads them without copying them
+        :exception: KeyError if an array is missing
+        """
+        tables = {name: StringTable(arrays[f"{name}_offsets"], arrays[f"{name}_data"]) for name in TABLES}
+        return cls({name: arrays[name] for name in COLUMNS}, tables)
+
+    def to_arrays(self) -> dict[str, npt.NDArray[Any]]:
+        """:return: the columns and the tables encoded as arrays"""
+        arrays = dict(self._columns)
+        for name, table in self._tables.items():
+            encoded = [value.encode() for value in table]
+            offsets = np.zeros(len(encoded) + 1, np.int64)
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            arrays[f"{name}_offsets"] = offsets
+            arrays[f"{name}_data"] = np.frombuffer(b"".join(encoded), np.uint8)
+        return arrays
+
+    def dates(self) -> dict[str, tuple[float, float]]:
+        """:return: start and end timestamps by event id, as the index was built"""
+        event_ids = [self._event_ids[code] for code in self._event_codes.tolist()]
+        return dict(zip(event_ids, zip(self._event_starts.tolist(), self._event_ends.tolist())))
+
+    def __len__(self) -> int:
+        return len(self._id_codes)
+
+    def search(self, filter_query: FilterQuery) -> tuple[Rows, Optional[EventCursor]]:
+        """
+        The limit is applied to the event ids, as in Redis, and the cursor is the last event id of a full page
+        :return: rows of the events fully inside the window, sorted, after the cursor if any, and the next cursor
+        """
+        starts_at = filter_query.starts_at.timestamp()
+        ends_at = filter_query.ends_at.timestamp()
+        cursor = filter_query.cursor
+        if cursor and cursor.start >= starts_at:
+            first = int(np.searchsorted(self._event_starts, cursor.start, "left"))
+            same_start = int(np.searchsorted(self._event_starts, cursor.start, "right"))
+            # The table is sorted, the events with a lower code have a lower or the same id as the cursor
+            cursor_code = bisect_right(self._event_ids, cursor.event_id)
+            first += int(np.searchsorted(self._event_codes[first:same_start], cursor_code, "left"))
+        else:
+            first = int(np.searchsorted(self._event_starts, starts_at, "left"))
+        # An event starts before it ends, only the events starting inside the window can be inside it
+        last = int(np.searchsorted(self._event_starts, ends_at, "right"))
+        rows = np.flatnonzero(self._event_ends[first:last] <= ends_at) + first
+
+        next_cursor = None
+        if filter_query.limit and len(rows):
+            # The rows of an event id are contiguous, they are numbered by event id
+            event_codes = self._event_codes[rows]
+            event_numbers = np.cumsum(np.concatenate(([True], event_codes[1:] != event_codes[:-1])))
+            rows = rows[event_numbers <= filter_query.limit]
+            if event_numbers[-1] >= filter_query.limit:
+                last_row = rows[-1]
+                next_cursor = EventCursor(
+                    start=float(self._event_starts[last_row]),
+                    event_id=self._event_ids[self._event_codes[last_row]],
+                )
+
+        inside = (self._start_timestamps[rows] >= starts_at) & (self._end_timestamps[rows] <= ends_at)
+        return rows[inside], next_cursor
+
+    def projections(self, rows: Rows) -> list[EventProjection]:
+        """:return: the events of the rows, created from the columns"""
+        ids, event_ids, titles = self._ids, self._event_ids, self._titles
+        return list(
+            starmap(
+                EventProjection,
+                zip(
+                    [ids[code] for code in self._id_codes[rows].tolist()],
+                    [event_ids[code] for code in self._event_codes[rows].tolist()],
+                    [titles[code] for code in self._title_codes[rows].tolist()],
+                    self._starts[rows].tolist(),
+                    self._ends[rows].tolist(),
+                    self._min_prices[rows].tolist(),
+                    self._max_prices[rows].tolist(),
+                ),
+            ),
+        )
+
+
+class StringTable(Sequence[str]):
+    """Strings stored as UTF-8 one after another, decoded when they are read"""
+
+    def __init__(self, offsets: npt.NDArray[np.int64], data: npt.NDArray[np.uint8]) -> None:
+        """
+        :param offsets: position of each string in the data, and the end of the last one
+        :param data: the strings encoded
+        """
+        # Read as Python integers and bytes, several times faster than reading NumPy scalars
+        self._offsets = memoryview(offsets).cast("B").cast("q")
+        self._data = memoryview(data)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, position: Any) -> Any:
+        # Only positions from 0 are read, slices are not supported
+        if position < 0:
+            raise IndexError(position)
+        start, end = self._offsets[position], self._offsets[position + 1]
+        return str(self._data[start:end], "utf-8")
+
+
+def _intern(values: list[str]) -> tuple[list[str], npt.NDArray[np.int32]]:
+    """:return: the distinct values, in the order they are found, and the position of each value among them"""
+    table: dict[str, int] = {}
+    codes = np.fromiter((table.setdefault(value, len(table)) for value in values), np.int32, len(values))
+    return list(table), codes
+
+
+def _intern_sorted(values: list[str]) -> tuple[list[str], npt.NDArray[np.int32]]:
+    """:return: the distinct values, sorted so the positions are ordered as the values, and the position of each value"""
+    table, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+    return table.tolist(), codes.astype(np.int32)
+
+
+def _float_column(values: Iterable[float], count: int) -> npt.NDArray[np.float64]:
+    return np.fromiter(values, np.float64, count)
+
+
+def _to_datetime64(values: list[datetime]) -> npt.NDArray[np.datetime64]:
+    # Several times faster than converting each datetime in NumPy
+    return np.fromiter(((value - EPOCH) // MICROSECOND for value in values), np.int64, len(values)).view(
+        "datetime64[us]"
+    )
@@ -1,12 +1,43 @@
 from datetime import datetime
+from enum import Enum
+from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+
+from app.domain.entities.event import EventProjection
+
+
+class EventCursor(BaseModel):
+    """Keyset of the last event of a page, ordered by start and event id"""
+
+    model_config = ConfigDict(frozen=True)
+
+    start: float
+    event_id: str
 
 
 class FilterQuery(BaseModel):
+    # Hashable, identical queries share the same in-flight request
+    model_config = ConfigDict(frozen=True)
+
     starts_at: datetime
     ends_at: datetime
+    limit: Optional[int] = None
+    cursor: Optional[EventCursor] = None
+
+
+class EventPage(BaseModel):
+    projections: list[EventProjection]
+    next_cursor: Optional[EventCursor] = None
 
 
 class DatabaseError(Exception):
     pass
+
+
+class UpdateScope(Enum):
+    """Processes that share the events of a repository, a single process of them runs each update"""
+
+    REPLICAS = "replicas"  # every replica of the application, e.g. Redis
+    HOST = "host"  # the workers of a host, e.g. a snapshot file
+    PROCESS = "process"  # each process updates its own events
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+from typing import Any, AsyncIterator, Optional, Sequence
+
+import numpy as np
+
+from app.domain.entities.event import AbstractEvent, EventProjection
+from app.domain.entities.feed import FeedValidators
+from app.domain.entities.provider_a.provider_a import ProviderABaseEvent
+from app.infrastructure.repository.base import BaseRepositoryProvider
+from app.infrastructure.repository.columnar import ColumnarEventIndex
+from app.infrastructure.repository.entities import (
+    EventCursor,
+    EventPage,
+    FilterQuery,
+    UpdateScope,
+)
+from app.infrastructure.repository.snapshot import (
+    get_file_id,
+    read_snapshot,
+    write_snapshot,
+)
+
+DEFAULT_CHUNK_SIZE = 500
+log = logging.getLogger(__name__)
+
+
+class ProviderA(BaseRepositoryProvider):
+    """
+    Events kept in the memory of the process, for a single node without Redis round-trips and for tests and benchmarks.
+    The events are indexed by start in a sorted array, a window is answered with a binary search and only the events
+    starting inside it are checked. Each process keeps and refreshes its own events, or the workers of a host share a
+    snapshot refreshed by one of them, with the same use case as Redis
+    """
+
+    def __init__(
+        self,
+        *_: Any,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        columnar_index: bool = False,
+        snapshot_path: Optional[str] = None,
+    ) -> None:
+        """
+        :param _: ignored, the repositories are created with the Redis client
+        :param chunk_size: events per batch when they are streamed
+        :param columnar_index: answer the windows with a columnar index of NumPy arrays instead of the sorted array,
+        faster for windows with many events. It is built again once per update, the events of an update are returned
+        when the whole update is stored
+        :param snapshot_path: file of the columnar index shared by the processes of the node, written by the process
+        that updates the events and mapped read-only by all of them. The columnar index is used
+        """
+        if chunk_size < 1:
+            raise ValueError("'chunk_size' must be greater than 0 in config.yml file")
+        self._chunk_size = chunk_size
+        self._index: list[tuple[float, str]] = []  # start and id of the events, sorted
+        self._dates: dict[str, tuple[float, float]] = {}  # start and end by event id
+        self._base_ids: dict[str, set[str]] = {}  # reverse index, base event ids per event id
+        self._projections: dict[tuple[str, str], EventProjection] = {}  # by base event id and event id
+        self._generation = 0
+        self._feed_validators: Optional[FeedValidators] = None
+        self._columns = ColumnarEventIndex.build([], {}) if columnar_index or snapshot_path else None
+        self._columns_outdated = False
+        self._snapshot_path = snapshot_path
+        self.update_scope = UpdateScope.HOST if snapshot_path else UpdateScope.PROCESS
+        self._snapshot_file_id: Optional[tuple[int, int, int]] = None
+        self._stored_generation = 0  # generation of the snapshot the events stored by this process come from
+        # A process started again is ready as soon as the snapshot is mapped
+        self._map_snapshot()
+
+    async def add_or_update_events(self, base_events: Sequence[AbstractEvent]) -> None:
+        self._map_snapshot()
+        if self._snapshot_path and self._stored_generation != self._generation:
+            self._load_snapshot_events()
+        changed = 0
+        dates: dict[str, tuple[float, float]] = {}
+        for base_event in base_events:
+            if not isinstance(base_event, ProviderABaseEvent):
+                continue
+            projections = {(projection.id, projection.event_id): projection for projection in base_event.projections()}
+            if all(self._projections.get(key) == projection for key, projection in projections.items()):
+                continue
+            changed += 1
+            for event in base_event.events:
+                # An event id shared by several base events keeps the dates of the last one, as in Redis
+                dates[str(event.event_id)] = (event.event_start_date.timestamp(), event.event_end_date.timestamp())
+                self._base_ids.setdefault(str(event.event_id), set()).add(str(base_event.base_event_id))
+            self._projections.update(projections)
+        log.info(f"Storing {changed} new or changed base events out of {len(base_events)}")
+        if not changed:
+            return
+        if self._columns is None:
+            self._update_index(dates)
+            self._generation += 1
+        else:
+            self._dates.update(dates)
+            self._columns_outdated = True
+
+    async def finish_update(self) -> None:
+        if self._columns is None or not self._columns_outdated:
+            return
+        self._columns_outdated = False
+        # Built out of the event loop, the requests are answered by the previous index meanwhile
+        columns = await asyncio.to_thread(ColumnarEventIndex.build, list(self._projections.values()), dict(self._dates))
+        log.info(f"Columnar index of {len(columns)} events built")
+        if self._snapshot_path is None:
+            self._columns = columns
+            self._generation += 1
+            return
+        generation = self._generation + 1
+        await asyncio.to_thread(self._write_snapshot, self._snapshot_path, generation, columns)
+        self._stored_generation = generation
+        self._map_snapshot()
+
+    async def get_all(self, filter_query: FilterQuery) -> EventPage:
+        self._map_snapshot()
+        if self._columns is not None:
+            rows, next_cursor = self._columns.search(filter_query)
+            return EventPage(projections=self._columns.projections(rows), next_cursor=next_cursor)
+        event_ids = self._query(filter_query)
+        return EventPage(
+            projections=self._get_projections(event_ids, filter_query),
+            next_cursor=self._get_next_cursor(event_ids, filter_query),
+        )
+
+    async def stream_all(self, filter_query: FilterQuery) -> AsyncIterator[EventPage]:
+        self._map_snapshot()
+        if self._columns is not None:
+            rows, next_cursor = self._columns.search(filter_query)
+            for first in range(0, len(rows), self._chunk_size):
+                last = first + self._chunk_size
+                yield EventPage(
+                    projections=self._columns.projections(rows[first:last]),
+                    next_cursor=next_cursor if last >= len(rows) else None,
+                )
+            return
+        event_ids = self._query(filter_query)
+        next_cursor = self._get_next_cursor(event_ids, filter_query)
+        for first in range(0, len(event_ids), self._chunk_size):
+            last = first + self._chunk_size
+            projections = self._get_projections(event_ids[first:last], filter_query)
+            if last >= len(event_ids) and next_cursor:
+                yield EventPage(projections=projections, next_cursor=next_cursor)
+            elif projections:
+                yield EventPage(projections=projections)
+
+    async def get_generation(self) -> Optional[bytes]:
+        self._map_snapshot()
+        return str(self._generation).encode()
+
+    async def get_feed_validators(self) -> Optional[FeedValidators]:
+        return self._feed_validators
+
+    async def save_feed_validators(self, validators: FeedValidators) -> None:
+        self._feed_validators = validators
+
+    @staticmethod
+    def _write_snapshot(path: str, generation: int, columns: ColumnarEventIndex) -> None:
+        write_snapshot(path, generation, columns.to_arrays())
+
+    def _map_snapshot(self) -> None:
+        """Map the snapshot written by any process if it was replaced, the previous one is read until then"""
+        if self._snapshot_path is None:
+            return
+        try:
+            file_id = get_file_id(self._snapshot_path)
+        except FileNotFoundError:
+            return  # no events stored yet
+        if file_id == self._snapshot_file_id:
+            return
+        self._snapshot_file_id = file_id  # a snapshot that can not be read is not read again
+        try:
+            snapshot = read_snapshot(self._snapshot_path)
+            self._columns = ColumnarEventIndex.from_arrays(snapshot.arrays)
+        except (OSError, ValueError, KeyError) as r_e:
+            log.error(f"Error reading snapshot {self._snapshot_path}: {r_e}", exc_info=True)
+            return
+        self._snapshot_file_id = snapshot.file_id
+        self._generation = snapshot.generation
+        log.info(f"Snapshot {self._snapshot_path} of generation {snapshot.generation} mapped")
+
+    def _load_snapshot_events(self) -> None:
+        """The events of a snapshot written by another process are updated from the events of the snapshot"""
+        if self._columns is None:
+            return
+        projections = self._columns.projections(np.arange(len(self._columns)))
+        self._projections = {(projection.id, projection.event_id): projection for projection in projections}
+        self._dates = self._columns.dates()
+        self._stored_generation = self._generation
+        log.info(f"{len(projections)} events of the snapshot loaded to be updated")
+
+    def _update_index(self, dates: dict[str, tuple[float, float]]) -> None:
+        changed_dates = {event_id: date for event_id, date in dates.items() if self._dates.get(event_id) != date}
+        if len(changed_dates) > len(self._index) // 8:
+            # Sorted again at once, instead of moving the array for each event
+            self._dates.update(changed_dates)
+            self._index = sorted((start, event_id) for event_id, (start, _) in self._dates.items())
+            return
+        for event_id, (start, end) in changed_dates.items():
+            if previous := self._dates.get(event_id):
+                del self._index[bisect_left(self._index, (previous[0], event_id))]
+            insort(self._index, (start, event_id))
+            self._dates[event_id] = (start, end)
+
+    def _query(self, filter_query: FilterQuery) -> list[str]:
+        """:return: ids of the events fully inside the window, sorted by start and id, after the cursor if any"""
+        starts_at = filter_query.starts_at.timestamp()
+        ends_at = filter_query.ends_at.timestamp()
+        cursor = filter_query.cursor
+        if cursor and cursor.start >= starts_at:
+            first = bisect_right(self._index, (cursor.start, cursor.event_id))
+        else:
+            first = bisect_left(self._index, starts_at, key=itemgetter(0))
+        # An event starts before it ends, only the events starting inside the window can be inside it
+        last = bisect_right(self._index, ends_at, key=itemgetter(0))
+        event_ids = []
+        for position in range(first, last):
+            event_id = self._index[position][1]
+            if self._dates[event_id][1] <= ends_at:
+                event_ids.append(event_id)
+                if filter_query.limit and len(event_ids) == filter_query.limit:
+                    break
+        return event_ids
+
+    def _get_next_cursor(self, event_ids: list[str], filter_query: FilterQuery) -> Optional[EventCursor]:
+        """:return: cursor of the last event if the limit of the query was reached"""
+        if not filter_query.limit or len(event_ids) < filter_query.limit:
+            return None
+        last_event_id = event_ids[-1]
+        return EventCursor(start=self._dates[last_event_id][0], event_id=last_event_id)
+
+    def _get_projections(self, event_ids: list[str], filter_query: FilterQuery) -> list[EventProjection]:
+        # An event id can be shared by several base events, only the ones inside the time range are returned
+        start_timestamp = filter_query.starts_at.timestamp()
+        end_timestamp = filter_query.ends_at.timestamp()
+        projections = (
+            self._projections[(base_id, event_id)]
+            for event_id in event_ids
+            for base_id in sorted(self._base_ids[event_id])
+        )
+        return [
+            projection
+            for projection in projections
+            if start_timestamp <= projection.start.timestamp() and projection.end.timestamp() <= end_timestamp
+        ]
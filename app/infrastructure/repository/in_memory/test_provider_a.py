@@ -0,0 +1,370 @@
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.conftest import redis_client
+from app.domain.entities.feed import FeedValidators
+from app.domain.entities.provider_a.provider_a import (
+    ProviderABaseEvent,
+    ProviderAEvent,
+    ProviderAZone,
+    SellModeEnum,
+)
+from app.infrastructure.repository.entities import EventCursor, EventPage, FilterQuery, UpdateScope
+from app.infrastructure.repository.in_memory.provider_a import ProviderA
+from app.infrastructure.repository.provider_a import ProviderA as RedisProviderA
+
+log = logging.getLogger(__name__)
+
+
+def base_event(base_event_id, *events):
+    return ProviderABaseEvent(
+        base_event_id=base_event_id,
+        sell_mode=SellModeEnum.online,
+        title=f"Event {base_event_id}",
+        events=[
+            ProviderAEvent(
+                event_id=event_id,
+                event_start_date=start,
+                event_end_date=end,
+                sell_from=start - timedelta(days=30),
+                sell_to=start,
+                sold_out=False,
+                zones=[ProviderAZone(zone_id=1, capacity=100, price=10.0, name="Zone 1", numbered=True)],
+            )
+            for event_id, start, end in events
+        ],
+    )
+
+
+base_event_1 = base_event(
+    1,
+    (11, datetime(2020, 1, 1, 10), datetime(2020, 1, 1, 12)),
+    (12, datetime(2020, 1, 2, 10), datetime(2020, 1, 2, 12)),
+)
+base_event_2 = base_event(
+    2,
+    (21, datetime(2020, 1, 1, 20), datetime(2020, 1, 2, 2)),
+    (22, datetime(2020, 1, 3, 10), datetime(2020, 1, 3, 12)),
+)
+window = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2, 12))
+
+
+@pytest.fixture(params=["sorted_array", "columnar_index", "snapshot"])
+def create_repository(request, tmp_path):
+    options = {
+        "sorted_array": {},
+        "columnar_index": {"columnar_index": True},
+        "snapshot": {"snapshot_path": str(tmp_path / "events.snapshot")},
+    }[request.param]
+    return lambda **kwargs: ProviderA(**options, **kwargs)
+
+
+async def store(repository, base_events):
+    await repository.add_or_update_events(base_events)
+    await repository.finish_update()
+
+
+@pytest.fixture
+async def repository(create_repository):
+    repository = create_repository()
+    await store(repository, [base_event_1, base_event_2])
+    return repository
+
+
+async def test_retrieve_events_inside_window(repository):
+    result = await repository.get_all(window)
+
+    assert result == EventPage(
+        projections=[base_event_1.projections()[0], base_event_2.projections()[0], base_event_1.projections()[1]],
+    )
+
+
+async def test_retrieve_events_empty_window(repository):
+    result = await repository.get_all(FilterQuery(starts_at=datetime(2020, 1, 1, 11), ends_at=datetime(2020, 1, 1, 19)))
+
+    assert result == EventPage(projections=[])
+
+
+async def test_retrieve_events_shared_event_id(repository):
+    base_event_3 = base_event(3, (11, datetime(2020, 1, 1, 10), datetime(2020, 1, 1, 12)))
+    await store(repository, [base_event_3])
+
+    result = await repository.get_all(FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 1, 12)))
+
+    assert result.projections == [base_event_1.projections()[0], base_event_3.projections()[0]]
+
+
+async def test_retrieve_events_pages(repository):
+    filter_query = window.model_copy(update={"limit": 2})
+
+    first_page = await repository.get_all(filter_query)
+    last_page = await repository.get_all(filter_query.model_copy(update={"cursor": first_page.next_cursor}))
+
+    assert first_page == EventPage(
+        projections=[base_event_1.projections()[0], base_event_2.projections()[0]],
+        next_cursor=EventCursor(start=datetime(2020, 1, 1, 20).timestamp(), event_id="21"),
+    )
+    assert last_page == EventPage(projections=[base_event_1.projections()[1]])
+
+
+async def test_stream_events_in_batches(create_repository):
+    repository = create_repository(chunk_size=2)
+    await store(repository, [base_event_1, base_event_2])
+
+    batches = [page async for page in repository.stream_all(window)]
+
+    assert batches == [
+        EventPage(projections=[base_event_1.projections()[0], base_event_2.projections()[0]]),
+        EventPage(projections=[base_event_1.projections()[1]]),
+    ]
+
+
+async def test_stream_events_limit(create_repository):
+    repository = create_repository(chunk_size=1)
+    await store(repository, [base_event_1, base_event_2])
+
+    batches = [page async for page in repository.stream_all(window.model_copy(update={"limit": 2}))]
+
+    # The last batch has the cursor of the next page
+    assert batches == [
+        EventPage(projections=[base_event_1.projections()[0]]),
+        EventPage(
+            projections=[base_event_2.projections()[0]],
+            next_cursor=EventCursor(start=datetime(2020, 1, 1, 20).timestamp(), event_id="21"),
+        ),
+    ]
+
+
+async def test_store_changed_dates(create_repository):
+    repository = create_repository()
+    # Enough events to update the sorted array without sorting it again
+    await store(
+        repository,
+        [base_event_1, base_event_2]
+        + [base_event(i, (i, datetime(2021, 1, 1), datetime(2021, 1, 2))) for i in range(100, 120)],
+    )
+    base_event_1_moved = base_event(
+        1,
+        (11, datetime(2020, 1, 1, 22), datetime(2020, 1, 1, 23)),
+        (12, datetime(2020, 1, 2, 10), datetime(2020, 1, 2, 12)),
+    )
+
+    await store(repository, [base_event_1_moved])
+
+    result = await repository.get_all(window)
+    assert result.projections == [
+        base_event_2.projections()[0],
+        base_event_1_moved.projections()[0],
+        base_event_1_moved.projections()[1],
+    ]
+
+
+async def test_store_unchanged_events(repository):
+    generation = await repository.get_generation()
+
+    await store(repository, [base_event_1, base_event_2])
+
+    assert await repository.get_generation() == generation
+
+
+async def test_store_changed_events(repository):
+    generation = await repository.get_generation()
+
+    await store(repository, [base_event_1.model_copy(update={"title": "Event 1 changed"})])
+
+    assert await repository.get_generation() != generation
+    assert (await repository.get_all(window)).projections[0].title == "Event 1 changed"
+
+
+async def test_columnar_index_updated_once_finished():
+    repository = ProviderA(columnar_index=True)
+    generation = await repository.get_generation()
+
+    await repository.add_or_update_events([base_event_1, base_event_2])
+
+    assert await repository.get_all(window) == EventPage(projections=[])
+    assert await repository.get_generation() == generation
+    await repository.finish_update()
+    assert len((await repository.get_all(window)).projections) == 3
+    assert await repository.get_generation() != generation
+
+
+async def test_snapshot_shared_by_processes(tmp_path):
+    snapshot_path = str(tmp_path / "events.snapshot")
+    updated, other = ProviderA(snapshot_path=snapshot_path), ProviderA(snapshot_path=snapshot_path)
+
+    await store(updated, [base_event_1, base_event_2])
+
+    assert await other.get_generation() == await updated.get_generation() == b"1"
+    assert await other.get_all(window) == await updated.get_all(window)
+    assert len((await other.get_all(window)).projections) == 3
+    # Ready at once
+    assert await ProviderA(snapshot_path=snapshot_path).get_all(window) == await updated.get_all(window)
+
+
+async def test_snapshot_updated_by_another_process(tmp_path):
+    snapshot_path = str(tmp_path / "events.snapshot")
+    first, second = ProviderA(snapshot_path=snapshot_path), ProviderA(snapshot_path=snapshot_path)
+    await store(first, [base_event_1])
+    base_event_2_changed = base_event_2.model_copy(update={"title": "Event 2 changed"})
+
+    await store(second, [base_event_2])
+    await store(first, [base_event_2_changed])
+
+    # Each process goes on from the events stored by the other one
+    assert await second.get_generation() == b"3"
+    assert (await second.get_all(window)).projections == [
+        base_event_1.projections()[0],
+        base_event_2_changed.projections()[0],
+        base_event_1.projections()[1],
+    ]
+
+
+async def test_snapshot_not_readable(tmp_path, caplog):
+    snapshot_path = tmp_path / "events.snapshot"
+    snapshot_path.write_bytes(b"not a snapshot")
+
+    repository = ProviderA(snapshot_path=str(snapshot_path))
+
+    assert await repository.get_all(window) == EventPage(projections=[])
+    assert caplog.text.count(f"Error reading snapshot {snapshot_path}") == 1
+    await store(repository, [base_event_1])
+    assert len((await repository.get_all(window)).projections) == 2
+
+
+async def test_feed_validators():
+    repository = ProviderA()
+    validators = FeedValidators(etag='"v1"')
+
+    assert await repository.get_feed_validators() is None
+    await repository.save_feed_validators(validators)
+    assert await repository.get_feed_validators() == validators
+
+
+def test_update_scope(tmp_path):
+    assert ProviderA().update_scope == UpdateScope.PROCESS
+    # The workers of the host share the snapshot, one of them updates it
+    assert ProviderA(snapshot_path=str(tmp_path / "events.snapshot")).update_scope == UpdateScope.HOST
+
+
+def test_invalid_chunk_size():
+    with pytest.raises(ValueError) as exc_info:
+        ProviderA(chunk_size=0)
+
+    assert str(exc_info.value) == "'chunk_size' must be greater than 0 in config.yml file"
+
+
+def _random_base_events(base_events):
+    history_start = datetime(2020, 1, 1)
+    result = []
+    for base_event_id in range(base_events):
+        event_start = history_start + timedelta(minutes=random.randint(0, 5 * 365 * 24 * 60))
+        event_end = event_start + timedelta(minutes=random.randint(30, 240))
+        # Some event ids are shared by several base events
+        result.append(base_event(base_event_id, (random.randint(0, base_events), event_start, event_end)))
+    return result
+
+
+async def test_columnar_index_same_events_as_sorted_array():
+    random.seed(1)
+    base_events = _random_base_events(2_000)
+    # Moved and new events
+    updated_base_events = _random_base_events(500) + base_events[1_000:]
+    sorted_array, columnar_index = ProviderA(chunk_size=7), ProviderA(chunk_size=7, columnar_index=True)
+    for repository in (sorted_array, columnar_index):
+        await store(repository, base_events[:1_000])
+        await store(repository, updated_base_events)
+
+    for _ in range(20):
+        starts_at = datetime(2020, 1, 1) + timedelta(days=random.randint(0, 5 * 365))
+        filter_query = FilterQuery(starts_at=starts_at, ends_at=starts_at + timedelta(days=30))
+        streamed = [page async for page in sorted_array.stream_all(filter_query)]
+        assert sum((page.projections for page in streamed), []) == sum(
+            [page.projections async for page in columnar_index.stream_all(filter_query)], []
+        )
+        filter_query = filter_query.model_copy(update={"limit": 10})
+        while filter_query:
+            page = await sorted_array.get_all(filter_query)
+            assert page == await columnar_index.get_all(filter_query)
+            filter_query = page.next_cursor and filter_query.model_copy(update={"cursor": page.next_cursor})
+
+
+class _CountedDates(dict):
+    """Dates of the events that count the events read"""
+
+    reads = 0
+
+    def __getitem__(self, event_id):
+        self.reads += 1
+        return super().__getitem__(event_id)
+
+
+async def test_query_reads_only_events_starting_inside_window():
+    random.seed(1)
+    repository = ProviderA()
+    await repository.add_or_update_events(_random_base_events(10_000))
+    repository._dates = _CountedDates(repository._dates)
+    starts_at, ends_at = datetime(2022, 6, 1).timestamp(), datetime(2022, 6, 2).timestamp()
+
+    event_ids = repository._query(FilterQuery(starts_at=datetime(2022, 6, 1), ends_at=datetime(2022, 6, 2)))
+
+    # The binary search skips the events starting outside the window instead of scanning all of them
+    assert repository._dates.reads == sum(starts_at <= start <= ends_at for start, _ in repository._dates.values())
+    assert event_ids == [
+        event_id
+        for start, event_id in sorted(
+            (start, event_id)
+            for event_id, (start, end) in repository._dates.items()
+            if starts_at <= start and end <= ends_at
+        )
+    ]
+
+
+@pytest.mark.integration
+async def test_same_events_as_redis(redis_client):
+    random.seed(1)
+    base_events = _random_base_events(2_000)
+    repository, redis_repository = ProviderA(), RedisProviderA(redis_client)
+    await repository.add_or_update_events(base_events)
+    await redis_repository.add_or_update_events(base_events)
+
+    for _ in range(20):
+        starts_at = datetime(2020, 1, 1) + timedelta(days=random.randint(0, 5 * 365))
+        filter_query = FilterQuery(starts_at=starts_at, ends_at=starts_at + timedelta(days=30), limit=10)
+        while filter_query:
+            page = await repository.get_all(filter_query)
+            assert page == await redis_repository.get_all(filter_query)
+            filter_query = page.next_cursor and filter_query.model_copy(update={"cursor": page.next_cursor})
+
+
+@pytest.mark.benchmark
+async def test_benchmark_binary_search_vs_scan():
+    random.seed(1)
+    repository = ProviderA()
+    await repository.add_or_update_events(_random_base_events(100_000))
+    starts_at, ends_at = datetime(2022, 6, 1), datetime(2022, 6, 2)
+    filter_query = FilterQuery(starts_at=starts_at, ends_at=ends_at)
+    repetitions = 20
+
+    started = time.perf_counter()
+    for _ in range(repetitions):
+        scan_ids = sorted(
+            (start, event_id)
+            for event_id, (start, end) in repository._dates.items()
+            if starts_at.timestamp() <= start and end <= ends_at.timestamp()
+        )
+    scan_elapsed = (time.perf_counter() - started) / repetitions
+    started = time.perf_counter()
+    for _ in range(repetitions):
+        page = await repository.get_all(filter_query)
+    binary_search_elapsed = (time.perf_counter() - started) / repetitions
+
+    log.info(
+        f"{len(page.projections)} of 100000 events in a day window: "
+        f"scan {scan_elapsed * 1000:.2f} ms, binary search {binary_search_elapsed * 1000:.2f} ms",
+    )
+    assert repository._query(filter_query) == [event_id for _, event_id in scan_ids]
@@ -0,0 +1,98 @@
+from bisect import bisect_right
+from typing import Optional
+
+from app.infrastructure.database import RedisBase
+from app.infrastructure.repository.entities import EventCursor
+
+# An event starts before it ends, so only the events starting inside the window can be fully inside it:
+# the start index is queried with both bounds and the end is checked for those candidates only.
+# The index is split in monthly buckets, only the buckets from the one of the first start (the last one starting before
+# it) to the end of the window are read, in order. They are resolved by the client and passed as KEYS, the start keys
+# then the end keys, so the script only accesses declared keys.
+# Pages are read with keyset pagination after the (start, event id) cursor, in the order of the sorted sets.
+INTERVAL_QUERY_SCRIPT = """
+local ends_at = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local cursor_start, cursor_event_id = tonumber(ARGV[4]), ARGV[5]
+local min_start = (cursor_start and cursor_start > tonumber(ARGV[1])) and ARGV[4] or ARGV[1]
+local batch_size = 512
+local result = {}
+local bucket_count = #KEYS / 2
+for i = 1, bucket_count do
+    local start_key, end_key = KEYS[i], KEYS[bucket_count + i]
+    local offset = 0
+    repeat
+        local candidates = redis.call(
+            'ZRANGEBYSCORE', start_key, min_start, ARGV[2], 'WITHSCORES', 'LIMIT', offset, batch_size
+        )
+        for i = 1, #candidates, 2 do
+            local event_id, event_start = candidates[i], candidates[i + 1]
+            if not cursor_start or tonumber(event_start) > cursor_start or event_id > cursor_event_id then
+                local event_end = redis.call('ZSCORE', end_key, event_id)
+                if event_end and tonumber(event_end) <= ends_at then
+                    table.insert(result, event_id)
+                    table.insert(result, event_start)
+                    if limit > 0 and #result >= 2 * limit then
+                        return result
+                    end
+                end
+            end
+        end
+        offset = offset + batch_size
+    until #candidates < 2 * batch_size
+end
+return result
+"""
+
+
+class IntervalQuery:
+    """Server side query of the events fully inside a time window, the cost is proportional to the result"""
+
+    def __init__(self, redis: RedisBase, buckets_key: str, start_key: str, end_key: str) -> None:
+        """
+        :param buckets_key: sorted set of the names of the buckets by their start
+        :param start_key: prefix of the sorted sets of the starts of the events of each bucket
+        :param end_key: prefix of the sorted sets of the ends of the events of each bucket
+        """
+        self._redis = redis
+        self._script = redis.register_script(INTERVAL_QUERY_SCRIPT)
+        self._buckets_key = buckets_key
+        self._start_key = start_key
+        self._end_key = end_key
+
+    async def execute(
+        self,
+        starts_at: float,
+        ends_at: float,
+        limit: Optional[int] = None,
+        cursor: Optional[EventCursor] = None,
+    ) -> list[tuple[bytes, float]]:
+        """
+        :param limit: maximum number of events, all of them if not set
+        :param cursor: return only the events after this one
+        :return: id and start of the events starting at or after `starts_at` and ending at or before `ends_at`
+        """
+        buckets = await self._get_buckets(max(starts_at, cursor.start) if cursor else starts_at, ends_at)
+        keys = [f"{self._start_key}:{bucket}" for bucket in buckets] + [
+            f"{self._end_key}:{bucket}" for bucket in buckets
+        ]
+        args = [
+            starts_at,
+            ends_at,
+            limit or 0,
+            *((cursor.start, cursor.event_id) if cursor else ("", "")),
+        ]
+        result: list[bytes] = await self._script(keys=keys, args=args)
+        return [(event_id, float(event_start)) for event_id, event_start in zip(result[::2], result[1::2])]
+
+    async def _get_buckets(self, min_start: float, ends_at: float) -> list[str]:
+        """:return: names of the buckets from the one of `min_start` to the one of `ends_at`, in order"""
+        buckets: list[tuple[bytes, float]] = await self._redis.zrangebyscore(
+            self._buckets_key,
+            "-inf",
+            ends_at,
+            withscores=True,
+        )
+        # The last bucket starting at or before the first start holds it, the previous ones end before it
+        first = max(bisect_right([bucket_start for _, bucket_start in buckets], min_start) - 1, 0)
+        return [bucket.decode() for bucket, _ in buckets[first:]]
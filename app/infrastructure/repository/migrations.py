@@ -0,0 +1,129 @@
+"""
+One-off data migrations of the events stored in Redis.
+
+Run with `python -m app.infrastructure.repository.migrations`
+"""
+
+import asyncio
+import logging
+from itertools import batched
+
+from pydantic_core import to_json
+
+from app.adapters.dependencies import get_providers_config, get_settings
+from app.domain.entities.provider_a.provider_a import ProviderABaseEvent
+from app.infrastructure.database import (
+    RedisBase,
+    create_redis_client,
+    get_or_create_redis_pool,
+)
+from app.infrastructure.repository.buckets import get_bucket
+from app.infrastructure.repository.codec import decode, encode_packed
+from app.infrastructure.repository.provider_a import (
+    BASE_IDS_KEY,
+    BUCKET_BASE_IDS_KEY,
+    BUCKET_KEY,
+    BUCKETS_KEY,
+    END_KEY,
+    PROJECTION_KEY,
+    ROOT_KEY,
+    START_KEY,
+    ProviderA,
+)
+
+log = logging.getLogger(__name__)
+
+
+async def migrate_event_base_keys(redis: RedisBase, batch_size: int = 1000) -> int:
+    """
+    Move the legacy `event:<base_event_id>:<event_id>` keys to the `event_base_ids:<event_id>` reverse index
+    :return: number of migrated keys
+    """
+    migrated = 0
+    pipeline = redis.pipeline()
+    async for key in redis.scan_iter(f"{ROOT_KEY}:*:*", count=batch_size):
+        _, base_id, event_id = key.decode().split(":")
+        pipeline.sadd(f"{BASE_IDS_KEY}:{event_id}", base_id)
+        pipeline.delete(key)
+        migrated += 1
+        if migrated % batch_size == 0:
+            await pipeline.execute()
+    if migrated % batch_size:
+        await pipeline.execute()
+    return migrated
+
+
+async def migrate_event_projections(redis: RedisBase, batch_size: int = 1000, compact_documents: bool = True) -> int:
+    """
+    Store the `event_projection:<base_event_id>:<event_id>` of the base events stored before the projections
+    :param compact_documents: store the projections in the compact format, JSON otherwise, as the repository does
+    :return: number of migrated base events
+    """
+    keys = [key async for key in redis.scan_iter(f"{ROOT_KEY}:*", count=batch_size) if key.count(b":") == 1]
+    for chunk in batched(keys, batch_size):
+        pipeline = redis.pipeline()
+        for base_event_data in await redis.mget(chunk):
+            if base_event_data:
+                for projection in decode(ProviderABaseEvent, base_event_data).projections():
+                    document = encode_packed(projection) if compact_documents else to_json(projection)
+                    pipeline.set(f"{PROJECTION_KEY}:{projection.id}:{projection.event_id}", document)
+        await pipeline.execute()
+    return len(keys)
+
+
+async def migrate_event_buckets(redis: RedisBase, batch_size: int = 1000) -> int:
+    """
+    Move the events of the `event_start` and `event_end` sorted sets to the monthly `event_start:<YYYY-MM>` and
+    `event_end:<YYYY-MM>` buckets, with their base event ids from the `event_base_ids:<event_id>` reverse index. The
+    previous sorted sets are removed once all the events are moved
+    :return: number of migrated events
+    """
+    migrated = 0
+    events = [event async for event in redis.zscan_iter(START_KEY, count=batch_size)]
+    for chunk in batched(events, batch_size):
+        pipeline = redis.pipeline(transaction=False)
+        for event_id, _ in chunk:
+            pipeline.zscore(END_KEY, event_id)
+            pipeline.smembers(f"{BASE_IDS_KEY}:{event_id.decode()}")
+        results = await pipeline.execute()
+        pipeline = redis.pipeline()
+        for (event_id, event_start), event_end, base_ids in zip(chunk, results[::2], results[1::2]):
+            if event_end is None:
+                continue
+            bucket, bucket_start = get_bucket(event_start)
+            pipeline.zadd(f"{START_KEY}:{bucket}", {event_id: event_start})
+            pipeline.zadd(f"{END_KEY}:{bucket}", {event_id: event_end})
+            pipeline.hset(BUCKET_KEY, event_id, bucket)
+            if base_ids:
+                pipeline.sadd(f"{BUCKET_BASE_IDS_KEY}:{bucket}", *base_ids)
+            pipeline.zadd(BUCKETS_KEY, {bucket: bucket_start})
+            migrated += 1
+        await pipeline.execute()
+    await redis.unlink(START_KEY, END_KEY)
+    return migrated
+
+
+async def main() -> None:
+    pool = get_or_create_redis_pool(settings=get_settings())
+    client = await create_redis_client(pool)
+    try:
+        migrated = await migrate_event_base_keys(client)
+        log.info(f"Migrated {migrated} keys to the '{BASE_IDS_KEY}' reverse index")
+        # Same format as the repositories, JSON if any of them stores JSON while instances of previous versions run
+        compact_documents = all(
+            provider.repository_config.get("compact_documents", True)
+            for provider in get_providers_config().external_providers
+            if provider.repository_module_path == ProviderA.__module__
+        )
+        migrated = await migrate_event_projections(client, compact_documents=compact_documents)
+        log.info(f"Migrated {migrated} base events to the '{PROJECTION_KEY}' projections")
+        migrated = await migrate_event_buckets(client)
+        log.info(f"Migrated {migrated} events to the monthly '{START_KEY}' and '{END_KEY}' buckets")
+    finally:
+        await client.close()
+        await pool.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
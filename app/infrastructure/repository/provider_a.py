@@ -1,22 +1,73 @@
+import hashlib
 import logging
-from typing import Sequence
+import time
+from itertools import batched
+from typing import AsyncIterator, Iterable, Optional, Sequence
 
-from fastapi_cache.decorator import cache
+from pydantic import TypeAdapter
+from pydantic_core import to_json
 from redis.exceptions import RedisError
 
-from app.domain.entities.event import AbstractEvent
+from app.domain.entities.event import AbstractEvent, EventProjection
+from app.domain.entities.feed import FeedValidators
 from app.domain.entities.provider_a.provider_a import ProviderABaseEvent
+from app.infrastructure.cache import LruTtlCache
 from app.infrastructure.database import RedisBase
 from app.infrastructure.repository.base import BaseRepositoryProvider
-from app.infrastructure.repository.entities import DatabaseError, FilterQuery
+from app.infrastructure.repository.buckets import add_months, get_bucket
+from app.infrastructure.repository.codec import encode_compressed, encode_packed, unpack
+from app.infrastructure.repository.entities import (
+    DatabaseError,
+    EventCursor,
+    EventPage,
+    FilterQuery,
+)
+from app.infrastructure.repository.interval_query import IntervalQuery
 
 ROOT_KEY = "event"
+START_KEY = "event_start"  # sorted set of the starts of the events of each monthly bucket, `event_start:<YYYY-MM>`
+END_KEY = "event_end"  # sorted set of the ends of the events of each monthly bucket, `event_end:<YYYY-MM>`
+BUCKETS_KEY = "event_buckets"  # sorted set of the names of the buckets by their start
+BUCKET_KEY = "event_bucket"  # hash of event id to the bucket it is indexed in
+BUCKET_BASE_IDS_KEY = (
+    "event_bucket_base_ids"  # set of the base event ids of each bucket, `event_bucket_base_ids:<YYYY-MM>`
+)
+BASE_IDS_KEY = "event_base_ids"  # reverse index, set of base event ids per event id
+PROJECTION_KEY = "event_projection"  # response-ready event, per base event id and event id
+HASH_KEY = "event_hash"  # hash of base event id to the content hash of its stored document
+GENERATION_KEY = "event_generation"  # incremented by each ingest that changes the events, of any provider
+FEED_VALIDATORS_KEY = "feed_validators:provider_a"  # validators of the last feed stored, for conditional requests
+DEFAULT_MGET_CHUNK_SIZE = 500
+DEFAULT_CACHE_MAX_SIZE = 10_000  # event projections kept in memory
+DEFAULT_CACHE_TTL = 300  # seconds
 log = logging.getLogger(__name__)
+projections_adapter = TypeAdapter(list[EventProjection])
 
 
 class ProviderA(BaseRepositoryProvider):
-    def __init__(self, redis: RedisBase):
+    def __init__(
+        self,
+        redis: RedisBase,
+        mget_chunk_size: int = DEFAULT_MGET_CHUNK_SIZE,
+        cache_max_size: int = DEFAULT_CACHE_MAX_SIZE,
+        cache_ttl: float = DEFAULT_CACHE_TTL,
+        compact_documents: bool = True,
+        retention_months: Optional[int] = None,
+    ):
+        if mget_chunk_size < 1:
+            raise ValueError("'mget_chunk_size' must be greater than 0 in config.yml file")
+        if retention_months is not None and retention_months < 0:
+            raise ValueError("'retention_months' must be 0 or greater in config.yml file")
         self._redis = redis
+        self._mget_chunk_size = mget_chunk_size
+        # Documents stored in the compact formats, JSON while instances that only read JSON are running
+        self._compact_documents = compact_documents
+        # Months kept before the current one, the events of older months are dropped. All of them are kept if not set
+        self._retention_months = retention_months
+        self._interval_query = IntervalQuery(redis, BUCKETS_KEY, START_KEY, END_KEY)
+        # Event projections by key, valid while the generation of the events does not change
+        self._cache: LruTtlCache[str, EventProjection] = LruTtlCache(cache_max_size, cache_ttl)
+        self._cache_generation: Optional[bytes] = None
 
     async def add_or_update_events(self, base_events: Sequence[AbstractEvent]) -> None:
         try:
@@ -28,30 +79,18 @@ class ProviderA(BaseRepositoryProvider):
             log.error(f"Unexpected error storing in Redis: {e}", exc_info=True)
             raise
 
-    async def get_all(self, filter_query: FilterQuery) -> list[AbstractEvent]:
-        # Find event IDs that start after event_start
-        start_timestamp = filter_query.starts_at.timestamp()
-        end_timestamp = filter_query.ends_at.timestamp()
+    async def finish_update(self) -> None:
+        if (oldest_start := self._get_oldest_start()) is None:
+            return
         try:
-            pipeline = self._redis.pipeline()
-            # Get from sorted Set events start after event_start and events end before event_end
-            pipeline.zrangebyscore("event_start", start_timestamp, "+inf")
-            pipeline.zrangebyscore("event_end", "-inf", end_timestamp)
-            [start_event_ids, end_event_ids] = await pipeline.execute()
-
-            # Computational Intersection instead of ZINTERSTORE to avoid blocking the Redis server
-            event_ids = set(start_event_ids) & set(end_event_ids)
-
-            base_events = {}
-
-            for event_id in event_ids:
-                base_ids = await self._get_base_ids(event_id.decode())
-                base_event_data_list = await self._get_base_event_data(base_ids)
-                for base_event_data in base_event_data_list:
-                    base_event = ProviderABaseEvent.model_validate_json(base_event_data)
-                    base_events[base_event.base_event_id] = base_event
+            await self._drop_buckets(oldest_start)
+        except (RedisError, OSError) as g_e:
+            log.error(f"Error dropping old events in Redis: {g_e}", exc_info=True)
+            raise DatabaseError(g_e)
 
-            return list(base_events.values())
+    async def get_all(self, filter_query: FilterQuery) -> EventPage:
+        try:
+            return await self._get_page(filter_query)
         except (ValueError, RedisError, OSError) as g_e:
             log.error(f"Error getting events in Redis: {g_e}", exc_info=True)
             raise DatabaseError(g_e)
@@ -59,30 +98,265 @@ class ProviderA(BaseRepositoryProvider):
             log.error(f"Unexpected error getting events in Redis: {e}", exc_info=True)
             raise
 
-    @cache()
-    async def _get_base_ids(self, event_id: str) -> set[str]:
-        return {
-            base_id.decode().split(":")[1]
-            async for base_id in self._redis.scan_iter(f"{ROOT_KEY}:*:{event_id}")
-            if base_id
-        }
+    async def stream_all(self, filter_query: FilterQuery) -> AsyncIterator[EventPage]:
+        # Read in pages of `mget_chunk_size` events after the cursor of the previous one, each run of the script and
+        # each batch have a bounded size whatever the window
+        remaining = filter_query.limit
+        cursor = filter_query.cursor
+        try:
+            while True:
+                limit = min(self._mget_chunk_size, remaining) if remaining else self._mget_chunk_size
+                page = await self._get_page(filter_query.model_copy(update={"limit": limit, "cursor": cursor}))
+                remaining = remaining - limit if remaining else None
+                if page.next_cursor is None or remaining == 0:
+                    # The cursor of the last page is returned only if the limit of the query was reached
+                    if page.projections or page.next_cursor:
+                        yield page
+                    return
+                if page.projections:
+                    yield EventPage(projections=page.projections)
+                cursor = page.next_cursor
+        except (ValueError, RedisError, OSError) as g_e:
+            log.error(f"Error streaming events in Redis: {g_e}", exc_info=True)
+            raise DatabaseError(g_e)
+        except Exception as e:
+            log.error(f"Unexpected error streaming events in Redis: {e}", exc_info=True)
+            raise
+
+    async def _get_page(self, filter_query: FilterQuery) -> EventPage:
+        start_timestamp = filter_query.starts_at.timestamp()
+        end_timestamp = filter_query.ends_at.timestamp()
+        # Events that start after event_start and end before event_end, filtered in Redis
+        events = await self._interval_query.execute(
+            start_timestamp,
+            end_timestamp,
+            filter_query.limit,
+            filter_query.cursor,
+        )
+        next_cursor = None
+        if filter_query.limit and len(events) == filter_query.limit:
+            last_event_id, last_event_start = events[-1]
+            next_cursor = EventCursor(start=last_event_start, event_id=last_event_id.decode())
+        projection_keys = await self._get_projection_keys(event_id for event_id, _ in events)
+        if not projection_keys:
+            return EventPage(projections=[], next_cursor=next_cursor)
+        projections = await self._get_projections(projection_keys)
+        return EventPage(
+            projections=self._filter_projections(projections, start_timestamp, end_timestamp),
+            next_cursor=next_cursor,
+        )
 
-    @cache()
-    async def _get_base_event_data(self, base_ids: set[str]) -> list[bytes]:
+    async def get_generation(self) -> Optional[bytes]:
+        try:
+            return await self._redis.get(GENERATION_KEY)
+        except (RedisError, OSError) as g_e:
+            log.error(f"Error getting generation of events in Redis: {g_e}", exc_info=True)
+            raise DatabaseError(g_e)
+
+    async def get_feed_validators(self) -> Optional[FeedValidators]:
+        try:
+            data = await self._redis.get(FEED_VALIDATORS_KEY)
+            return FeedValidators.model_validate_json(data) if data else None
+        except (ValueError, RedisError, OSError) as g_e:
+            log.error(f"Error getting feed validators in Redis: {g_e}", exc_info=True)
+            raise DatabaseError(g_e)
+
+    async def save_feed_validators(self, validators: FeedValidators) -> None:
+        try:
+            await self._redis.set(FEED_VALIDATORS_KEY, validators.model_dump_json())
+        except (ValueError, RedisError, OSError) as g_e:
+            log.error(f"Error storing feed validators in Redis: {g_e}", exc_info=True)
+            raise DatabaseError(g_e)
+
+    @staticmethod
+    def _filter_projections(
+        projections: list[EventProjection],
+        start_timestamp: float,
+        end_timestamp: float,
+    ) -> list[EventProjection]:
+        # An event id can be shared by several base events, only the ones inside the time range are returned
         return [
-            base_event_data
-            for base_id in base_ids
-            if (base_event_data := await self._redis.get(f"{ROOT_KEY}:{base_id}"))
+            projection
+            for projection in projections
+            if start_timestamp <= projection.start.timestamp() and projection.end.timestamp() <= end_timestamp
         ]
 
+    async def _get_projection_keys(self, event_ids: Iterable[bytes]) -> list[str]:
+        """
+        Resolve the base event ids of all the events with a single round-trip to the reverse index.
+        The generation of the events is read in the same round-trip to invalidate the cache
+        """
+        decoded_event_ids = [event_id.decode() for event_id in event_ids]
+        if not decoded_event_ids:
+            return []
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.get(GENERATION_KEY)
+        for event_id in decoded_event_ids:
+            pipeline.smembers(f"{BASE_IDS_KEY}:{event_id}")
+        [generation, *base_ids_per_event] = await pipeline.execute()
+        self._sync_cache_generation(generation)
+        # Keys in the order of the events so the projections are returned sorted by start
+        return [
+            f"{PROJECTION_KEY}:{base_id}:{event_id}"
+            for event_id, base_ids in zip(decoded_event_ids, base_ids_per_event)
+            for base_id in sorted(base_id.decode() for base_id in base_ids)
+        ]
+
+    def _sync_cache_generation(self, generation: Optional[bytes]) -> None:
+        # The events were changed by an ingest, in this instance or in another one
+        if generation != self._cache_generation:
+            self._cache.clear()
+            self._cache_generation = generation
+
+    async def _get_projections(self, projection_keys: list[str]) -> list[EventProjection]:
+        """
+        Event projections from the in-process cache, the missing ones are fetched with chunked MGETs sent in a single
+        round-trip
+        """
+        projections = {key: self._cache.get(key) for key in projection_keys}
+        missing_keys = [key for key, projection in projections.items() if projection is None]
+        if missing_keys:
+            pipeline = self._redis.pipeline(transaction=False)
+            for chunk in batched(missing_keys, self._mget_chunk_size):
+                pipeline.mget(chunk)
+            missing_data = (data for chunk_data in await pipeline.execute() for data in chunk_data)
+            found = [(key, data) for key, data in zip(missing_keys, missing_data) if data]
+            for (key, _), projection in zip(found, self._decode_projections([data for _, data in found])):
+                projections[key] = projection
+                self._cache.set(key, projection)
+        return [projection for projection in projections.values() if projection]
+
+    @staticmethod
+    def _decode_projections(documents: list[bytes]) -> list[EventProjection]:
+        # Documents of any format, validated in one call instead of a call per document
+        return projections_adapter.validate_python([unpack(EventProjection, document) for document in documents])
+
+    def _get_oldest_start(self) -> Optional[float]:
+        """:return: start of the oldest bucket kept, all of them are kept if there is no retention"""
+        return None if self._retention_months is None else add_months(time.time(), -self._retention_months)
+
+    def _encode_base_event(self, base_event: AbstractEvent) -> bytes:
+        return encode_compressed(base_event) if self._compact_documents else base_event.model_dump_json().encode()
+
+    def _encode_projection(self, projection: EventProjection) -> bytes:
+        return encode_packed(projection) if self._compact_documents else to_json(projection)
+
     async def _redis_store(self, base_events: Sequence[AbstractEvent]) -> None:
         # Improved performance with indexes for event_start and event_end instead of adding a JSON document to an index
-        pipeline = self._redis.pipeline()  # transactional pipeline
-        for base_event in base_events:
-            if isinstance(base_event, ProviderABaseEvent):
-                pipeline.set(f"{ROOT_KEY}:{base_event.base_event_id}", base_event.model_dump_json())
-                for event in base_event.events:
-                    pipeline.zadd("event_start", {str(event.event_id): event.event_start_date.timestamp()})
-                    pipeline.zadd("event_end", {str(event.event_id): event.event_end_date.timestamp()})
-                    pipeline.set(f"{ROOT_KEY}:{base_event.base_event_id}:{event.event_id}", base_event.base_event_id)
+        documents = {
+            str(base_event.base_event_id): (base_event, self._encode_base_event(base_event))
+            for base_event in base_events
+            if isinstance(base_event, ProviderABaseEvent)
+        }
+        if not documents:
+            return
+        # Only the new and changed base events are written, the write volume follows the churn of the provider
+        stored_hashes = await self._redis.hmget(HASH_KEY, list(documents))
+        changed = [
+            (base_event_id, base_event, document, content_hash)
+            for (base_event_id, (base_event, document)), stored_hash in zip(documents.items(), stored_hashes)
+            if (content_hash := self._content_hash(document)) != stored_hash
+        ]
+        log.info(f"Storing {len(changed)} new or changed base events out of {len(documents)}")
+        if not changed:
+            return
+        # An event whose start moved to another month is removed from the bucket it was indexed in
+        event_ids = list({str(event.event_id): None for _, base_event, _, _ in changed for event in base_event.events})
+        stored_buckets = await self._redis.hmget(BUCKET_KEY, event_ids) if event_ids else []
+        event_buckets = {event_id: bucket.decode() for event_id, bucket in zip(event_ids, stored_buckets) if bucket}
+        # The events of the buckets dropped by the retention are not indexed again, they would be dropped once more
+        oldest_start = self._get_oldest_start()
+        pipeline = self._redis.pipeline()  # transactional pipeline, the content hash is stored with the document
+        buckets: dict[str | bytes, float] = {}  # start of the buckets written
+        events_changed = False
+        for base_event_id, base_event, document, content_hash in changed:
+            pipeline.hset(HASH_KEY, base_event_id, content_hash)
+            expire_at: dict[str, int] = {}  # the keys of an event are dropped along with its bucket, with a retention
+            base_event_buckets: set[str] = set()  # the content hash is removed when all of them are dropped
+            for event in base_event.events:
+                event_id = str(event.event_id)
+                bucket, bucket_start = get_bucket(event.event_start_date.timestamp())
+                if (previous_bucket := event_buckets.get(event_id, bucket)) != bucket:
+                    pipeline.zrem(f"{START_KEY}:{previous_bucket}", event_id)
+                    pipeline.zrem(f"{END_KEY}:{previous_bucket}", event_id)
+                    events_changed = True
+                if oldest_start is not None and bucket_start < oldest_start:
+                    if event_buckets.pop(event_id, None):
+                        pipeline.hdel(BUCKET_KEY, event_id)
+                    continue
+                event_buckets[event_id] = bucket
+                buckets[bucket] = bucket_start
+                base_event_buckets.add(bucket)
+                pipeline.zadd(f"{START_KEY}:{bucket}", {event_id: event.event_start_date.timestamp()})
+                pipeline.zadd(f"{END_KEY}:{bucket}", {event_id: event.event_end_date.timestamp()})
+                pipeline.sadd(f"{BASE_IDS_KEY}:{event_id}", base_event.base_event_id)
+                if self._retention_months is not None:
+                    expire_at[event_id] = int(add_months(bucket_start, self._retention_months + 1))
+                    pipeline.expireat(f"{BASE_IDS_KEY}:{event_id}", expire_at[event_id])
+            if not base_event_buckets:
+                # Only its content hash is kept, so it is not written again while it does not change
+                continue
+            events_changed = True
+            pipeline.set(f"{ROOT_KEY}:{base_event_id}", document)
+            for bucket in base_event_buckets:
+                pipeline.sadd(f"{BUCKET_BASE_IDS_KEY}:{bucket}", base_event.base_event_id)
+            for projection in base_event.projections():
+                if projection.event_id not in event_buckets:
+                    continue
+                key = f"{PROJECTION_KEY}:{projection.id}:{projection.event_id}"
+                pipeline.set(key, self._encode_projection(projection))
+                if projection.event_id in expire_at:
+                    pipeline.expireat(key, expire_at[projection.event_id])
+            if expire_at:
+                pipeline.expireat(f"{ROOT_KEY}:{base_event_id}", max(expire_at.values()))
+        if event_buckets:
+            pipeline.hset(BUCKET_KEY, mapping={event_id: bucket for event_id, bucket in event_buckets.items()})
+            pipeline.zadd(BUCKETS_KEY, buckets)
+        if events_changed:
+            pipeline.incr(GENERATION_KEY)
         await pipeline.execute()
+
+    async def _drop_buckets(self, oldest_start: float) -> None:
+        """
+        Drop the buckets of the months before the oldest one kept, a whole month at once. The content hashes of the
+        base events without events in the buckets kept are removed too, a base event dropped but still in the feed
+        is stored again only if it changes
+        """
+        buckets = await self._redis.zrangebyscore(BUCKETS_KEY, "-inf", "+inf", withscores=True)
+        kept = [bucket.decode() for bucket, bucket_start in buckets if bucket_start >= oldest_start]
+        for bucket in (bucket.decode() for bucket, bucket_start in buckets if bucket_start < oldest_start):
+            event_ids = await self._redis.zrange(f"{START_KEY}:{bucket}", 0, -1)
+            base_event_ids = await self._get_base_ids_not_kept(
+                await self._redis.smembers(f"{BUCKET_BASE_IDS_KEY}:{bucket}"),
+                kept,
+            )
+            pipeline = self._redis.pipeline()
+            for chunk in batched(event_ids, self._mget_chunk_size):
+                pipeline.hdel(BUCKET_KEY, *chunk)
+            for base_chunk in batched(base_event_ids, self._mget_chunk_size):
+                pipeline.hdel(HASH_KEY, *base_chunk)
+            # Freed by Redis in the background
+            pipeline.unlink(f"{START_KEY}:{bucket}", f"{END_KEY}:{bucket}", f"{BUCKET_BASE_IDS_KEY}:{bucket}")
+            pipeline.zrem(BUCKETS_KEY, bucket)
+            pipeline.incr(GENERATION_KEY)
+            await pipeline.execute()
+            log.info(f"Dropped the {len(event_ids)} events of bucket {bucket}")
+
+    async def _get_base_ids_not_kept(self, base_event_ids: set[bytes], kept_buckets: list[str]) -> list[bytes]:
+        """:return: the base event ids without events in any of the buckets kept"""
+        not_kept = sorted(base_event_ids)
+        if not not_kept or not kept_buckets:
+            return not_kept
+        result: list[bytes] = []
+        for chunk in batched(not_kept, self._mget_chunk_size):
+            pipeline = self._redis.pipeline(transaction=False)
+            for bucket in kept_buckets:
+                pipeline.smismember(f"{BUCKET_BASE_IDS_KEY}:{bucket}", list(chunk))
+            members = await pipeline.execute()
+            result.extend(base_event_id for base_event_id, *in_kept in zip(chunk, *members) if not any(in_kept))
+        return result
+
+    @staticmethod
+    def _content_hash(document: bytes) -> bytes:
+        # Hash of the stored document, a change of format rewrites the base event once
+        return hashlib.blake2b(document, digest_size=16).digest()
@@ -0,0 +1,103 @@
+"""
+Immutable snapshots of NumPy arrays in a file, shared by the processes of a node.
+
+The file is mapped read-only, the arrays are views of the mapping, so every process reads the same copy of the data
+from the page cache and a process is ready as soon as it maps the file. A new snapshot is written to a temporary file
+and renamed over the previous one, the processes still reading the previous one keep their mapping until they map the
+new one.
+
+A snapshot starts with a fixed header (magic, format version, generation and length of the description), then the
+description of the arrays as JSON and the arrays, each one aligned to 64 bytes
+"""
+
+import json
+import mmap
+import os
+import struct
+from dataclasses import dataclass
+from typing import Any, Mapping
+
+import numpy as np
+import numpy.typing as npt
+
+MAGIC = b"EVSNAP\x00\x00"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIQQ")
+ALIGNMENT = 64
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    generation: int
+    arrays: dict[str, npt.NDArray[Any]]  # read-only views of the file
+    file_id: tuple[int, int, int]  # device, inode and modification time of the file mapped
+
+
+def write_snapshot(path: str, generation: int, arrays: Mapping[str, npt.NDArray[Any]]) -> None:
+    """The readers see the previous snapshot or the new one, never a partial one"""
+    descriptions: list[dict[str, Any]] = []
+    offset = 0
+    for name, array in arrays.items():
+        offset = _aligned(offset)
+        descriptions.append({"name": name, "dtype": array.dtype.str, "length": len(array), "offset": offset})
+        offset += array.nbytes
+    description = json.dumps(descriptions).encode()
+    data_start = _aligned(HEADER.size + len(description))
+
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, generation, len(description)))
+            file.write(description)
+            for array_description, array in zip(descriptions, arrays.values()):
+                file.seek(data_start + array_description["offset"])
+                np.ascontiguousarray(array).tofile(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def read_snapshot(path: str) -> Snapshot:
+    """
+    :return: the arrays of the snapshot, mapped read-only
+    :exception: OSError if the file can not be read, ValueError if it is not a snapshot of this format
+    """
+    with open(path, "rb") as file:
+        stat = os.fstat(file.fileno())
+        # The mapping is kept open by the arrays, even once the file is replaced
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mapping) < HEADER.size:
+        raise ValueError(f"Snapshot {path} is truncated")
+    magic, format_version, generation, description_length = HEADER.unpack_from(mapping)
+    if magic != MAGIC:
+        raise ValueError(f"File {path} is not a snapshot")
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f"Unknown format {format_version} of snapshot {path}")
+    description_start = HEADER.size
+    description_end = description_start + description_length
+    descriptions = json.loads(mapping[description_start:description_end])
+    data_start = _aligned(description_end)
+    arrays = {description["name"]: _read_array(mapping, data_start, description) for description in descriptions}
+    return Snapshot(generation=generation, arrays=arrays, file_id=(stat.st_dev, stat.st_ino, stat.st_mtime_ns))
+
+
+def get_file_id(path: str) -> tuple[int, int, int]:
+    """:exception: OSError if the file does not exist"""
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino, stat.st_mtime_ns
+
+
+def _read_array(mapping: mmap.mmap, data_start: int, description: dict[str, Any]) -> npt.NDArray[Any]:
+    dtype = np.dtype(description["dtype"])
+    if not description["length"]:
+        # Nothing is written for it, it may start after the end of the file
+        return np.frombuffer(b"", dtype)
+    return np.frombuffer(mapping, dtype=dtype, count=description["length"], offset=data_start + description["offset"])
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
@@ -0,0 +1,105 @@
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import to_json
+
+from app.domain.entities.event import EventProjection
+from app.domain.entities.provider_a.provider_a import (
+    ProviderABaseEvent,
+    ProviderAEvent,
+    ProviderAZone,
+    SellModeEnum,
+)
+from app.infrastructure.repository.codec import (
+    MSGPACK_FORMAT,
+    ZLIB_JSON_FORMAT,
+    decode,
+    encode_compressed,
+    encode_packed,
+    unpack,
+)
+
+projection = EventProjection(
+    id="1",
+    event_id="11",
+    title="Event 1",
+    start=datetime(2020, 1, 1, 10),
+    end=datetime(2020, 1, 1, 12),
+    min_price=10.0,
+    max_price=20.5,
+)
+base_event = ProviderABaseEvent(
+    base_event_id=1,
+    sell_mode=SellModeEnum.online,
+    title="Event 1",
+    events=[
+        ProviderAEvent(
+            event_id=11,
+            event_start_date=datetime(2020, 1, 1, 10),
+            event_end_date=datetime(2020, 1, 1, 12),
+            sell_from=datetime(2019, 12, 1),
+            sell_to=datetime(2020, 1, 1),
+            sold_out=False,
+            zones=[
+                ProviderAZone(
+                    zone_id=zone_id, capacity=100, price=10.0 * zone_id, name=f"Zone {zone_id}", numbered=True
+                )
+                for zone_id in range(1, 4)
+            ],
+        ),
+    ],
+)
+
+
+def _decode(model_type, document):
+    if issubclass(model_type, BaseModel):
+        return decode(model_type, document)
+    return TypeAdapter(model_type).validate_python(unpack(model_type, document))
+
+
+@pytest.mark.parametrize(
+    "model,encode,document_format",
+    [
+        (projection, encode_packed, MSGPACK_FORMAT),
+        (base_event, encode_compressed, ZLIB_JSON_FORMAT),
+        (base_event, encode_packed, MSGPACK_FORMAT),
+    ],
+)
+def test_encode_and_decode(model, encode, document_format):
+    document = encode(model)
+
+    assert document[:1] == document_format
+    assert _decode(type(model), document) == model
+
+
+@pytest.mark.parametrize("model,encode", [(projection, encode_packed), (base_event, encode_compressed)])
+def test_encoded_smaller_than_json(model, encode):
+    assert len(encode(model)) < len(to_json(model))
+
+
+@pytest.mark.parametrize("model", [projection, base_event])
+def test_decode_legacy_json(model):
+    assert _decode(type(model), to_json(model)) == model
+
+
+def test_decode_packed_with_new_field():
+    @dataclass(frozen=True, slots=True)
+    class EventProjectionWithNewField(EventProjection):
+        category: Optional[str] = None
+
+    assert _decode(EventProjectionWithNewField, encode_packed(projection)) == EventProjectionWithNewField(
+        **asdict(projection),
+    )
+
+
+def test_unpack_unknown_format():
+    class Model(BaseModel):
+        value: int
+
+    with pytest.raises(ValueError) as exc_info:
+        unpack(Model, b"\x7f")
+
+    assert str(exc_info.value) == "Unknown format b'\\x7f' of document"
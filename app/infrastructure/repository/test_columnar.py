@@ -0,0 +1,191 @@
+import gc
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.application.mappers.events import map_event_projections_to_response_dto
+from app.conftest import redis_client
+from app.domain.entities.event import EventProjection
+from app.domain.entities.provider_a.provider_a import (
+    ProviderABaseEvent,
+    ProviderAEvent,
+    ProviderAZone,
+    SellModeEnum,
+)
+from app.infrastructure.repository.columnar import ColumnarEventIndex
+from app.infrastructure.repository.entities import EventCursor, EventPage, FilterQuery
+from app.infrastructure.repository.in_memory.provider_a import ProviderA
+from app.infrastructure.repository.provider_a import ProviderA as RedisProviderA
+from app.infrastructure.repository.snapshot import read_snapshot, write_snapshot
+
+log = logging.getLogger(__name__)
+
+
+def projection(base_event_id, event_id, start, end, title="Event"):
+    return EventProjection(
+        id=str(base_event_id),
+        event_id=str(event_id),
+        title=title,
+        start=start,
+        end=end,
+        min_price=10.0,
+        max_price=20.5,
+    )
+
+
+def index(*projections):
+    return ColumnarEventIndex.build(
+        projections,
+        {projection.event_id: (projection.start.timestamp(), projection.end.timestamp()) for projection in projections},
+    )
+
+
+def search(columns, filter_query):
+    rows, next_cursor = columns.search(filter_query)
+    return EventPage(projections=columns.projections(rows), next_cursor=next_cursor)
+
+
+window = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
+
+
+def test_search_empty_index():
+    assert search(index(), window) == EventPage(projections=[])
+
+
+def test_search_keeps_local_times_and_titles():
+    projection_1 = projection(1, 11, datetime(2020, 1, 1, 10, 0, 0, 123456), datetime(2020, 1, 1, 12), "Première")
+    projection_2 = projection(2, 21, datetime(2020, 1, 1, 11), datetime(2020, 1, 1, 13), "Première")
+
+    assert search(index(projection_2, projection_1), window) == EventPage(projections=[projection_1, projection_2])
+
+
+def test_search_sorted_by_event_id_with_same_start():
+    start, end = datetime(2020, 1, 1, 10), datetime(2020, 1, 1, 12)
+    projections = [projection(3, 100, start, end), projection(1, 20, start, end), projection(2, 20, start, end)]
+
+    # Ids are sorted as text, as in Redis
+    assert search(index(*projections), window).projections == [projections[0], projections[1], projections[2]]
+
+
+def test_search_after_cursor_of_missing_event():
+    start, end = datetime(2020, 1, 1, 10), datetime(2020, 1, 1, 12)
+    projections = [projection(1, 10, start, end), projection(2, 30, start, end)]
+    cursor = EventCursor(start=start.timestamp(), event_id="20")
+
+    page = search(index(*projections), window.model_copy(update={"cursor": cursor}))
+
+    assert page == EventPage(projections=[projections[1]])
+
+
+def test_index_from_arrays():
+    projections = [
+        projection(1, 11, datetime(2020, 1, 1, 10), datetime(2020, 1, 1, 12), "Première"),
+        projection(2, 11, datetime(2020, 1, 1, 10), datetime(2020, 1, 1, 12), "Première"),
+        projection(3, 31, datetime(2020, 1, 1, 11), datetime(2020, 1, 1, 13), "Segunda"),
+    ]
+    columns = index(*projections)
+
+    restored = ColumnarEventIndex.from_arrays(columns.to_arrays())
+
+    assert search(restored, window.model_copy(update={"limit": 1})) == search(
+        columns, window.model_copy(update={"limit": 1})
+    )
+    assert search(restored, window) == EventPage(projections=projections)
+    assert restored.dates() == columns.dates()
+
+
+def test_string_table():
+    table = ColumnarEventIndex.build(
+        [projection(1, 11, datetime(2020, 1, 1), datetime(2020, 1, 2), "Ñ")], {"11": (0, 1)}
+    )
+    titles = ColumnarEventIndex.from_arrays(table.to_arrays())._titles
+
+    assert list(titles) == ["Ñ"]
+    with pytest.raises(IndexError):
+        titles[1]
+
+
+def _base_events(count):
+    # Built without validation, the events are only stored
+    history_start = datetime(2020, 1, 1)
+    zone = ProviderAZone.model_construct(zone_id=1, capacity=100, price=10.0, name="Zone 1", numbered=True)
+    base_events = []
+    for base_event_id in range(count):
+        event_start = history_start + timedelta(minutes=random.randint(0, 5 * 365 * 24 * 60))
+        event = ProviderAEvent.model_construct(
+            event_id=base_event_id,
+            event_start_date=event_start,
+            event_end_date=event_start + timedelta(minutes=random.randint(30, 240)),
+            zones=[zone],
+        )
+        base_events.append(
+            ProviderABaseEvent.model_construct(
+                base_event_id=base_event_id,
+                sell_mode=SellModeEnum.online,
+                title=f"Event {base_event_id % 1000}",
+                events=[event],
+            ),
+        )
+    return base_events
+
+
+@pytest.mark.integration
+@pytest.mark.benchmark
+@pytest.mark.parametrize("events", [10_000, 100_000, 1_000_000])
+async def test_benchmark_columnar_index_vs_redis(events, redis_client, tmp_path):
+    random.seed(1)
+    base_events = _base_events(events)
+    # Every read goes to Redis, as the first request of each generation
+    redis_repository = RedisProviderA(redis_client, cache_max_size=0)
+    await redis_repository.add_or_update_events(base_events)
+    repository = ProviderA()
+    await repository.add_or_update_events(base_events)
+    started = time.perf_counter()
+    built_columns = ColumnarEventIndex.build(repository._projections.values(), repository._dates)
+    build_elapsed = time.perf_counter() - started
+    snapshot_path = str(tmp_path / "events.snapshot")
+    write_snapshot(snapshot_path, 1, built_columns.to_arrays())
+    started = time.perf_counter()
+    # As a process started again
+    columns = ColumnarEventIndex.from_arrays(read_snapshot(snapshot_path).arrays)
+    log.info(
+        f"Columnar index of {events} events built in {build_elapsed:.2f} s, "
+        f"mapped from its snapshot in {(time.perf_counter() - started) * 1000:.2f} ms",
+    )
+    repetitions = 5
+
+    for days, limit in [(1, None), (30, None), (365, 1000)]:
+        filter_query = FilterQuery(
+            starts_at=datetime(2022, 1, 1),
+            ends_at=datetime(2022, 1, 1) + timedelta(days=days),
+            limit=limit,
+        )
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(repetitions):
+            page = await redis_repository.get_all(filter_query)
+            response = map_event_projections_to_response_dto(page.projections, page.next_cursor)
+        redis_elapsed = (time.perf_counter() - started) / repetitions
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(repetitions):
+            page = await repository.get_all(filter_query)
+            sorted_array_response = map_event_projections_to_response_dto(page.projections, page.next_cursor)
+        sorted_array_elapsed = (time.perf_counter() - started) / repetitions
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(repetitions):
+            rows, next_cursor = columns.search(filter_query)
+            columnar_response = map_event_projections_to_response_dto(columns.projections(rows), next_cursor)
+        columnar_elapsed = (time.perf_counter() - started) / repetitions
+
+        log.info(
+            f"{len(response.data.events)} of {events} events in {days} days (limit {limit}): "
+            f"Redis {redis_elapsed * 1000:.2f} ms, sorted array {sorted_array_elapsed * 1000:.2f} ms, "
+            f"columnar index {columnar_elapsed * 1000:.2f} ms",
+        )
+        assert sorted_array_response == response
+        assert columnar_response == response
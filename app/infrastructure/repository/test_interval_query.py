@@ -0,0 +1,172 @@
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.conftest import redis_client, redis_mock
+from app.infrastructure.repository.buckets import get_bucket
+from app.infrastructure.repository.entities import EventCursor
+from app.infrastructure.repository.interval_query import (
+    INTERVAL_QUERY_SCRIPT,
+    IntervalQuery,
+)
+
+log = logging.getLogger(__name__)
+
+
+async def test_interval_query_happy_path(redis_mock):
+    redis_mock.zrangebyscore.return_value = [(b"2021-05", 0.5), (b"2021-06", 0.8), (b"2021-07", 1.5)]
+    redis_mock.register_script().return_value = [b"11", b"1", b"12", b"1.5"]
+
+    interval_query = IntervalQuery(redis_mock, "event_buckets", "event_start", "event_end")
+    result = await interval_query.execute(1.0, 2.0)
+
+    assert result == [(b"11", 1.0), (b"12", 1.5)]
+    redis_mock.zrangebyscore.assert_awaited_once_with("event_buckets", "-inf", 2.0, withscores=True)
+    redis_mock.register_script.assert_called_with(INTERVAL_QUERY_SCRIPT)
+    # The buckets from the one of the start of the window, the start keys then the end keys
+    redis_mock.register_script().assert_awaited_once_with(
+        keys=["event_start:2021-06", "event_start:2021-07", "event_end:2021-06", "event_end:2021-07"],
+        args=[1.0, 2.0, 0, "", ""],
+    )
+
+
+async def test_interval_query_page(redis_mock):
+    redis_mock.zrangebyscore.return_value = [(b"2021-06", 0.8), (b"2021-07", 1.5)]
+    redis_mock.register_script().return_value = [b"12", b"1.5"]
+
+    interval_query = IntervalQuery(redis_mock, "event_buckets", "event_start", "event_end")
+    result = await interval_query.execute(1.0, 2.0, limit=1, cursor=EventCursor(start=1.5, event_id="11"))
+
+    assert result == [(b"12", 1.5)]
+    # The buckets from the one of the cursor
+    redis_mock.register_script().assert_awaited_once_with(
+        keys=["event_start:2021-07", "event_end:2021-07"],
+        args=[1.0, 2.0, 1, 1.5, "11"],
+    )
+
+
+async def test_interval_query_window_before_buckets(redis_mock):
+    redis_mock.zrangebyscore.return_value = [(b"2021-07", 1.5)]
+
+    interval_query = IntervalQuery(redis_mock, "event_buckets", "event_start", "event_end")
+    result = await interval_query.execute(1.0, 2.0)
+
+    assert result == []
+    redis_mock.register_script().assert_awaited_once_with(
+        keys=["event_start:2021-07", "event_end:2021-07"],
+        args=[1.0, 2.0, 0, "", ""],
+    )
+
+
+async def _two_ranges_query(redis, starts_at: float, ends_at: float) -> set[bytes]:
+    pipeline = redis.pipeline()
+    pipeline.zrangebyscore("event_start", starts_at, "+inf")
+    pipeline.zrangebyscore("event_end", "-inf", ends_at)
+    [start_event_ids, end_event_ids] = await pipeline.execute()
+    return set(start_event_ids) & set(end_event_ids)
+
+
+async def _store_events(redis, events: dict[str, tuple[float, float]], global_index: bool = False) -> None:
+    pipeline = redis.pipeline(transaction=False)
+    for event_id, (event_start, event_end) in events.items():
+        bucket, bucket_start = get_bucket(event_start)
+        pipeline.zadd(f"event_start:{bucket}", {event_id: event_start})
+        pipeline.zadd(f"event_end:{bucket}", {event_id: event_end})
+        pipeline.zadd("event_buckets", {bucket: bucket_start})
+        if global_index:
+            pipeline.zadd("event_start", {event_id: event_start})
+            pipeline.zadd("event_end", {event_id: event_end})
+    await pipeline.execute()
+
+
+@pytest.mark.integration
+async def test_interval_query_across_buckets(redis_client):
+    events = {
+        str(event_id): (event_start.timestamp(), (event_start + timedelta(hours=2)).timestamp())
+        for event_id, event_start in enumerate(
+            datetime(2021, 6, 30, 23, tzinfo=timezone.utc) + timedelta(days=days) for days in range(0, 70, 3)
+        )
+    }
+    await _store_events(redis_client, events)
+    interval_query = IntervalQuery(redis_client, "event_buckets", "event_start", "event_end")
+    starts_at = datetime(2021, 7, 1, tzinfo=timezone.utc).timestamp()
+    ends_at = datetime(2021, 8, 20, tzinfo=timezone.utc).timestamp()
+
+    pages, cursor = [], None
+    while page := await interval_query.execute(starts_at, ends_at, limit=4, cursor=cursor):
+        pages.append(page)
+        cursor = EventCursor(start=page[-1][1], event_id=page[-1][0].decode())
+
+    expected = sorted(
+        (event_start, event_id)
+        for event_id, (event_start, event_end) in events.items()
+        if starts_at <= event_start and event_end <= ends_at
+    )
+    assert [(event_start, event_id.decode()) for page in pages for event_id, event_start in page] == expected
+    assert [len(page) for page in pages] == [4, 4, 4, 4]
+
+
+@pytest.mark.integration
+@pytest.mark.benchmark
+async def test_benchmark_interval_query_vs_two_ranges(redis_client):
+    events, repetitions = 100_000, 20
+    history_start = datetime(2020, 1, 1)
+    dates = {}
+    for event_id in range(events):
+        event_start = history_start + timedelta(minutes=random.randint(0, 5 * 365 * 24 * 60))
+        event_end = event_start + timedelta(minutes=random.randint(30, 240))
+        dates[str(event_id)] = (event_start.timestamp(), event_end.timestamp())
+    await _store_events(redis_client, dates, global_index=True)
+    starts_at, ends_at = datetime(2022, 6, 1).timestamp(), datetime(2022, 6, 2).timestamp()
+    interval_query = IntervalQuery(redis_client, "event_buckets", "event_start", "event_end")
+
+    started = time.perf_counter()
+    for _ in range(repetitions):
+        two_ranges_ids = await _two_ranges_query(redis_client, starts_at, ends_at)
+    two_ranges_elapsed = (time.perf_counter() - started) / repetitions
+    started = time.perf_counter()
+    for _ in range(repetitions):
+        interval_ids = await interval_query.execute(starts_at, ends_at)
+    interval_elapsed = (time.perf_counter() - started) / repetitions
+
+    log.info(
+        f"{len(interval_ids)} of {events} events in a day window: "
+        f"two ranges {two_ranges_elapsed * 1000:.2f} ms, interval query {interval_elapsed * 1000:.2f} ms",
+    )
+    assert {event_id for event_id, _ in interval_ids} == two_ranges_ids
+
+
+@pytest.mark.integration
+@pytest.mark.benchmark
+async def test_benchmark_drop_bucket_vs_range_removal(redis_client):
+    events = 100_000
+    history_start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    dates = {}
+    for event_id in range(events):
+        event_start = history_start + timedelta(minutes=random.randint(0, 5 * 365 * 24 * 60))
+        dates[str(event_id)] = (event_start.timestamp(), (event_start + timedelta(hours=2)).timestamp())
+    await _store_events(redis_client, dates, global_index=True)
+    month_start = history_start.timestamp()
+    month_end = datetime(2020, 2, 1, tzinfo=timezone.utc).timestamp()
+
+    # A month of a single index: its events are looked up to remove them from the end index too
+    started = time.perf_counter()
+    event_ids = await redis_client.zrangebyscore("event_start", month_start, f"({month_end}")
+    pipeline = redis_client.pipeline()
+    pipeline.zremrangebyscore("event_start", month_start, f"({month_end}")
+    pipeline.zrem("event_end", *event_ids)
+    await pipeline.execute()
+    range_elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    await redis_client.unlink("event_start:2020-01", "event_end:2020-01")
+    bucket_elapsed = time.perf_counter() - started
+
+    log.info(
+        f"{len(event_ids)} of {events} events of a month dropped: "
+        f"range removal {range_elapsed * 1000:.2f} ms, bucket {bucket_elapsed * 1000:.2f} ms",
+    )
+    assert await redis_client.zcard("event_start") == await redis_client.zcard("event_end") == events - len(event_ids)
+    assert not await redis_client.exists("event_start:2020-01", "event_end:2020-01")
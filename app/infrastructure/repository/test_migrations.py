@@ -0,0 +1,152 @@
+from datetime import datetime, timezone
+
+from pydantic_core import to_json
+
+from app.conftest import redis_mock
+from app.domain.entities.provider_a.provider_a import (
+    ProviderABaseEvent,
+    ProviderAEvent,
+    SellModeEnum,
+)
+from app.infrastructure.repository.codec import encode_packed
+from app.infrastructure.repository.migrations import (
+    migrate_event_base_keys,
+    migrate_event_buckets,
+    migrate_event_projections,
+)
+
+
+async def test_migrate_event_base_keys_happy_path(redis_mock, mocker):
+    mock_aiter = mocker.MagicMock()
+    mock_aiter.__aiter__.return_value = [b"event:1:11", b"event:2:11", b"event:2:23"]
+    redis_mock.scan_iter.return_value = mock_aiter
+
+    migrated = await migrate_event_base_keys(redis_mock, batch_size=2)
+
+    pipeline_mock = redis_mock.pipeline()
+    assert migrated == 3
+    redis_mock.scan_iter.assert_called_once_with("event:*:*", count=2)
+    assert pipeline_mock.sadd.call_count == 3
+    pipeline_mock.sadd.assert_any_call("event_base_ids:11", "1")
+    pipeline_mock.sadd.assert_any_call("event_base_ids:11", "2")
+    pipeline_mock.sadd.assert_any_call("event_base_ids:23", "2")
+    assert pipeline_mock.delete.call_count == 3
+    pipeline_mock.delete.assert_any_call(b"event:1:11")
+    assert pipeline_mock.execute.await_count == 2
+
+
+async def test_migrate_event_base_keys_nothing_to_migrate(redis_mock, mocker):
+    mock_aiter = mocker.MagicMock()
+    mock_aiter.__aiter__.return_value = []
+    redis_mock.scan_iter.return_value = mock_aiter
+
+    migrated = await migrate_event_base_keys(redis_mock)
+
+    assert migrated == 0
+    redis_mock.pipeline().execute.assert_not_awaited()
+
+
+async def test_migrate_event_projections_happy_path(redis_mock, mocker):
+    event = ProviderAEvent(
+        event_id=11,
+        event_start_date=datetime(2020, 1, 1),
+        event_end_date=datetime(2020, 1, 2),
+        sell_from=datetime(2020, 1, 1),
+        sell_to=datetime(2020, 1, 2),
+        sold_out=False,
+        zones=[],
+    )
+    base_event = ProviderABaseEvent(base_event_id=1, sell_mode=SellModeEnum.online, title="Event 1", events=[event])
+    mock_aiter = mocker.MagicMock()
+    mock_aiter.__aiter__.return_value = [b"event:1", b"event:1:11", b"event:2"]
+    redis_mock.scan_iter.return_value = mock_aiter
+    redis_mock.mget = mocker.AsyncMock(return_value=[base_event.model_dump_json().encode(), None])
+
+    migrated = await migrate_event_projections(redis_mock)
+
+    assert migrated == 2
+    redis_mock.mget.assert_awaited_once_with((b"event:1", b"event:2"))
+    redis_mock.pipeline().set.assert_called_once_with(
+        "event_projection:1:11",
+        encode_packed(base_event.projections()[0]),
+    )
+
+
+async def test_migrate_event_projections_json(redis_mock, mocker):
+    event = ProviderAEvent(
+        event_id=11,
+        event_start_date=datetime(2020, 1, 1),
+        event_end_date=datetime(2020, 1, 2),
+        sell_from=datetime(2020, 1, 1),
+        sell_to=datetime(2020, 1, 2),
+        sold_out=False,
+        zones=[],
+    )
+    base_event = ProviderABaseEvent(base_event_id=1, sell_mode=SellModeEnum.online, title="Event 1", events=[event])
+    mock_aiter = mocker.MagicMock()
+    mock_aiter.__aiter__.return_value = [b"event:1"]
+    redis_mock.scan_iter.return_value = mock_aiter
+    redis_mock.mget = mocker.AsyncMock(return_value=[base_event.model_dump_json().encode()])
+
+    migrated = await migrate_event_projections(redis_mock, compact_documents=False)
+
+    assert migrated == 1
+    # Readable by the instances of previous versions, as the repository stores them
+    redis_mock.pipeline().set.assert_called_once_with("event_projection:1:11", to_json(base_event.projections()[0]))
+
+
+async def test_migrate_event_buckets_happy_path(redis_mock, mocker):
+    july, august = datetime(2021, 7, 1, tzinfo=timezone.utc), datetime(2021, 8, 1, tzinfo=timezone.utc)
+    mock_aiter = mocker.MagicMock()
+    mock_aiter.__aiter__.return_value = [(b"11", july.timestamp()), (b"12", august.timestamp()), (b"13", 1.0)]
+    redis_mock.zscan_iter.return_value = mock_aiter
+    pipeline_mock = redis_mock.pipeline()
+    pipeline_mock.zscore = mocker.Mock()
+    pipeline_mock.execute.side_effect = [
+        [july.timestamp() + 60, {b"1"}, august.timestamp() + 60, {b"2"}],
+        [],
+        [None, set()],
+        [],
+    ]
+    redis_mock.unlink = mocker.AsyncMock()
+
+    migrated = await migrate_event_buckets(redis_mock, batch_size=2)
+
+    assert migrated == 2
+    redis_mock.zscan_iter.assert_called_once_with("event_start", count=2)
+    assert pipeline_mock.zscore.call_args_list == [
+        mocker.call("event_end", b"11"),
+        mocker.call("event_end", b"12"),
+        mocker.call("event_end", b"13"),
+    ]
+    pipeline_mock.zadd.assert_any_call("event_start:2021-07", {b"11": july.timestamp()})
+    pipeline_mock.zadd.assert_any_call("event_end:2021-07", {b"11": july.timestamp() + 60})
+    pipeline_mock.zadd.assert_any_call("event_start:2021-08", {b"12": august.timestamp()})
+    pipeline_mock.zadd.assert_any_call("event_buckets", {"2021-08": august.timestamp()})
+    assert pipeline_mock.smembers.call_args_list == [
+        mocker.call("event_base_ids:11"),
+        mocker.call("event_base_ids:12"),
+        mocker.call("event_base_ids:13"),
+    ]
+    assert pipeline_mock.sadd.call_args_list == [
+        mocker.call("event_bucket_base_ids:2021-07", b"1"),
+        mocker.call("event_bucket_base_ids:2021-08", b"2"),
+    ]
+    assert pipeline_mock.hset.call_args_list == [
+        mocker.call("event_bucket", b"11", "2021-07"),
+        mocker.call("event_bucket", b"12", "2021-08"),
+    ]
+    assert pipeline_mock.execute.await_count == 4
+    redis_mock.unlink.assert_awaited_once_with("event_start", "event_end")
+
+
+async def test_migrate_event_buckets_nothing_to_migrate(redis_mock, mocker):
+    mock_aiter = mocker.MagicMock()
+    mock_aiter.__aiter__.return_value = []
+    redis_mock.zscan_iter.return_value = mock_aiter
+    redis_mock.unlink = mocker.AsyncMock()
+
+    migrated = await migrate_event_buckets(redis_mock)
+
+    assert migrated == 0
+    redis_mock.pipeline().execute.assert_not_awaited()
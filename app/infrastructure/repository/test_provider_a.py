@@ -1,18 +1,35 @@
-import asyncio
-from datetime import datetime
+import logging
+import random
+import timeit
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
 
 import pytest
+from pydantic import TypeAdapter
+from pydantic_core import to_json
 from redis.exceptions import RedisError
 
-from app.conftest import redis_mock
+from app.conftest import redis_client, redis_mock
+from app.domain.entities.event import EventProjection
+from app.domain.entities.feed import FeedValidators
 from app.domain.entities.provider_a.provider_a import (
     ProviderABaseEvent,
     ProviderAEvent,
+    ProviderAZone,
     SellModeEnum,
 )
-from app.infrastructure.repository.entities import DatabaseError, FilterQuery
+from app.infrastructure.repository.buckets import add_months, get_bucket
+from app.infrastructure.repository.codec import encode_compressed, encode_packed
+from app.infrastructure.repository.entities import (
+    DatabaseError,
+    EventCursor,
+    EventPage,
+    FilterQuery,
+)
 from app.infrastructure.repository.provider_a import ProviderA
 
+log = logging.getLogger(__name__)
+
 event_1 = ProviderAEvent(
     event_id=11,
     event_start_date=datetime(2020, 1, 1),
@@ -61,53 +78,572 @@ def base_events():
     return [base_event_1, base_event_2]
 
 
+bucket, bucket_start = get_bucket(event_1.event_start_date.timestamp())
+
+
+def stored_fields(pipeline_mock):
+    """:return: fields of the hashes written by the pipeline, by hash, as returned by Redis"""
+    fields: dict[str, dict[str, bytes]] = {"event_hash": {}, "event_bucket": {}}
+    for args, kwargs in pipeline_mock.hset.call_args_list:
+        for field, value in (kwargs.get("mapping") or {args[1]: args[2]}).items():
+            fields[args[0]][field] = value.encode() if isinstance(value, str) else value
+    return fields
+
+
 async def test_store_events_happy_path(base_events, redis_mock, mocker):
     repository = ProviderA(redis_mock)
     await repository.add_or_update_events(base_events)
 
     pipeline_mock = redis_mock.pipeline()
 
-    assert pipeline_mock.zadd.call_count == 8
-    pipeline_mock.zadd.assert_any_call("event_end", {"11": event_1.event_end_date.timestamp()})
-    pipeline_mock.zadd.assert_any_call("event_end", {"12": event_2.event_end_date.timestamp()})
-    pipeline_mock.zadd.assert_any_call("event_end", {"23": event_3.event_end_date.timestamp()})
-    pipeline_mock.zadd.assert_any_call("event_start", {"11": event_1.event_start_date.timestamp()})
-    pipeline_mock.zadd.assert_any_call("event_start", {"12": event_2.event_start_date.timestamp()})
-    pipeline_mock.zadd.assert_any_call("event_start", {"23": event_3.event_start_date.timestamp()})
+    assert pipeline_mock.zadd.call_count == 9
+    pipeline_mock.zadd.assert_any_call(f"event_end:{bucket}", {"11": event_1.event_end_date.timestamp()})
+    pipeline_mock.zadd.assert_any_call(f"event_end:{bucket}", {"12": event_2.event_end_date.timestamp()})
+    pipeline_mock.zadd.assert_any_call(f"event_end:{bucket}", {"23": event_3.event_end_date.timestamp()})
+    pipeline_mock.zadd.assert_any_call(f"event_start:{bucket}", {"11": event_1.event_start_date.timestamp()})
+    pipeline_mock.zadd.assert_any_call(f"event_start:{bucket}", {"12": event_2.event_start_date.timestamp()})
+    pipeline_mock.zadd.assert_any_call(f"event_start:{bucket}", {"23": event_3.event_start_date.timestamp()})
+    pipeline_mock.zadd.assert_any_call("event_buckets", {bucket: bucket_start})
+    pipeline_mock.zrem.assert_not_called()
+    pipeline_mock.expireat.assert_not_called()
     assert pipeline_mock.set.call_count == 6
     pipeline_mock.set.assert_any_call("event:1", mocker.ANY)
     pipeline_mock.set.assert_any_call("event:2", mocker.ANY)
-    pipeline_mock.set.assert_any_call("event:1:11", mocker.ANY)
-    pipeline_mock.set.assert_any_call("event:1:12", mocker.ANY)
-    pipeline_mock.set.assert_any_call("event:2:23", mocker.ANY)
-    pipeline_mock.set.assert_any_call("event:2:11", mocker.ANY)
+    pipeline_mock.set.assert_any_call("event_projection:1:11", encode_packed(base_event_1.projections()[0]))
+    pipeline_mock.set.assert_any_call("event_projection:1:12", encode_packed(base_event_1.projections()[1]))
+    pipeline_mock.set.assert_any_call("event_projection:2:11", encode_packed(base_event_2.projections()[0]))
+    pipeline_mock.set.assert_any_call("event_projection:2:23", encode_packed(base_event_2.projections()[1]))
+    assert pipeline_mock.sadd.call_count == 6
+    pipeline_mock.sadd.assert_any_call("event_base_ids:11", 1)
+    pipeline_mock.sadd.assert_any_call("event_base_ids:12", 1)
+    pipeline_mock.sadd.assert_any_call("event_base_ids:23", 2)
+    pipeline_mock.sadd.assert_any_call("event_base_ids:11", 2)
+    pipeline_mock.sadd.assert_any_call(f"event_bucket_base_ids:{bucket}", 1)
+    pipeline_mock.sadd.assert_any_call(f"event_bucket_base_ids:{bucket}", 2)
+    redis_mock.hmget.assert_any_await("event_hash", ["1", "2"])
+    redis_mock.hmget.assert_any_await("event_bucket", ["11", "12", "23"])
+    pipeline_mock.incr.assert_called_once_with("event_generation")
+    assert pipeline_mock.hset.call_count == 3
+    pipeline_mock.hset.assert_any_call("event_hash", "1", mocker.ANY)
+    pipeline_mock.hset.assert_any_call("event_hash", "2", mocker.ANY)
+    pipeline_mock.hset.assert_any_call("event_bucket", mapping={"11": bucket, "12": bucket, "23": bucket})
+    pipeline_mock.execute.assert_awaited_once()
+
+
+async def test_store_only_changed_events(base_events, redis_mock, mocker):
+    repository = ProviderA(redis_mock)
+    await repository.add_or_update_events(base_events)
+    pipeline_mock = redis_mock.pipeline()
+    stored = stored_fields(pipeline_mock)
+    pipeline_mock.reset_mock()
+
+    base_event_2_changed = base_event_2.model_copy(update={"title": "Event 2 changed"})
+    redis_mock.hmget.side_effect = lambda name, keys: [stored[name][key] for key in keys]
+    await repository.add_or_update_events([base_event_1, base_event_2_changed])
+
+    assert pipeline_mock.set.call_count == 3
+    pipeline_mock.set.assert_any_call("event:2", encode_compressed(base_event_2_changed))
+    pipeline_mock.set.assert_any_call("event_projection:2:11", encode_packed(base_event_2_changed.projections()[0]))
+    pipeline_mock.set.assert_any_call("event_projection:2:23", encode_packed(base_event_2_changed.projections()[1]))
+    pipeline_mock.hset.assert_any_call("event_hash", "2", mocker.ANY)
+    assert stored_fields(pipeline_mock)["event_hash"]["2"] != stored["event_hash"]["2"]
+    pipeline_mock.hset.assert_any_call("event_bucket", mapping={"11": bucket, "23": bucket})
+    assert pipeline_mock.zadd.call_count == 5
+    pipeline_mock.zrem.assert_not_called()
+    pipeline_mock.execute.assert_awaited_once()
+
+
+async def test_store_unchanged_events(base_events, redis_mock):
+    repository = ProviderA(redis_mock)
+    await repository.add_or_update_events(base_events)
+    pipeline_mock = redis_mock.pipeline()
+    stored_hashes = stored_fields(pipeline_mock)["event_hash"]
+    pipeline_mock.reset_mock()
+
+    redis_mock.hmget.side_effect = lambda name, keys: [stored_hashes[key] for key in keys]
+    await repository.add_or_update_events(base_events)
+
+    pipeline_mock.set.assert_not_called()
+    pipeline_mock.zadd.assert_not_called()
+    pipeline_mock.incr.assert_not_called()
+    pipeline_mock.execute.assert_not_awaited()
+
+
+async def test_store_event_moved_to_another_month(base_events, redis_mock, mocker):
+    repository = ProviderA(redis_mock)
+    await repository.add_or_update_events(base_events)
+    pipeline_mock = redis_mock.pipeline()
+    stored = stored_fields(pipeline_mock)
+    pipeline_mock.reset_mock()
+
+    moved_start = datetime(2020, 3, 10, tzinfo=timezone.utc)
+    event_3_moved = event_3.model_copy(update={"event_start_date": moved_start, "event_end_date": moved_start})
+    base_event_2_moved = base_event_2.model_copy(update={"events": [event_1, event_3_moved]})
+    redis_mock.hmget.side_effect = lambda name, keys: [stored[name][key] for key in keys]
+    await repository.add_or_update_events([base_event_1, base_event_2_moved])
+
+    assert pipeline_mock.zrem.call_count == 2
+    pipeline_mock.zrem.assert_any_call(f"event_start:{bucket}", "23")
+    pipeline_mock.zrem.assert_any_call(f"event_end:{bucket}", "23")
+    pipeline_mock.zadd.assert_any_call("event_start:2020-03", {"23": moved_start.timestamp()})
+    pipeline_mock.zadd.assert_any_call("event_buckets", {bucket: bucket_start, "2020-03": 1583020800.0})
+    pipeline_mock.hset.assert_any_call("event_bucket", mapping={"11": bucket, "23": "2020-03"})
+
+
+async def test_store_events_with_retention(base_events, redis_mock, mocker):
+    mocker.patch("time.time", return_value=datetime(2020, 2, 15, tzinfo=timezone.utc).timestamp())
+    repository = ProviderA(redis_mock, retention_months=2)
+    await repository.add_or_update_events(base_events)
+
+    pipeline_mock = redis_mock.pipeline()
+    # Expired when the bucket of the event is dropped, the first day of the third month after it
+    expire_at = int(add_months(bucket_start, 3))
+    assert pipeline_mock.expireat.call_count == 10
+    pipeline_mock.expireat.assert_any_call("event_base_ids:11", expire_at)
+    pipeline_mock.expireat.assert_any_call("event_projection:2:23", expire_at)
+    pipeline_mock.expireat.assert_any_call("event:1", expire_at)
+    assert pipeline_mock.set.call_count == 6
+
+
+async def test_store_events_past_retention(redis_mock, mocker):
+    mocker.patch("time.time", return_value=datetime(2020, 6, 15, tzinfo=timezone.utc).timestamp())
+    june = datetime(2020, 6, 1, tzinfo=timezone.utc)
+    event_4 = event_3.model_copy(update={"event_id": 34, "event_start_date": june, "event_end_date": june})
+    base_event_3 = base_event_2.model_copy(update={"base_event_id": 3, "events": [event_3, event_4]})
+    repository = ProviderA(redis_mock, retention_months=2)
+    await repository.add_or_update_events([base_event_1, base_event_3])
+
+    pipeline_mock = redis_mock.pipeline()
+    # The events of the months dropped are not indexed again, the base events without events left keep their hash
+    assert stored_fields(pipeline_mock)["event_hash"].keys() == {"1", "3"}
+    assert pipeline_mock.zadd.call_args_list == [
+        mocker.call("event_start:2020-06", {"34": june.timestamp()}),
+        mocker.call("event_end:2020-06", {"34": june.timestamp()}),
+        mocker.call("event_buckets", {"2020-06": june.timestamp()}),
+    ]
+    assert pipeline_mock.set.call_args_list == [
+        mocker.call("event:3", encode_compressed(base_event_3)),
+        mocker.call("event_projection:3:34", encode_packed(base_event_3.projections()[1])),
+    ]
+    pipeline_mock.sadd.assert_any_call("event_bucket_base_ids:2020-06", 3)
+    stored = stored_fields(pipeline_mock)
+    pipeline_mock.reset_mock()
+
+    # Not written again while they do not change, the generation does not change
+    redis_mock.hmget.side_effect = lambda name, keys: [stored[name].get(key) for key in keys]
+    await repository.add_or_update_events([base_event_1, base_event_3])
+
+    pipeline_mock.incr.assert_not_called()
+    pipeline_mock.execute.assert_not_awaited()
+
+
+async def test_store_events_only_past_retention(redis_mock, mocker):
+    mocker.patch("time.time", return_value=datetime(2020, 6, 15, tzinfo=timezone.utc).timestamp())
+    repository = ProviderA(redis_mock, retention_months=2)
+    await repository.add_or_update_events([base_event_1])
+
+    pipeline_mock = redis_mock.pipeline()
+    assert stored_fields(pipeline_mock)["event_hash"].keys() == {"1"}
+    pipeline_mock.set.assert_not_called()
+    pipeline_mock.zadd.assert_not_called()
+    pipeline_mock.incr.assert_not_called()
+
+
+async def test_finish_update_drops_old_buckets(redis_mock, mocker):
+    mocker.patch("time.time", return_value=datetime(2020, 4, 15, tzinfo=timezone.utc).timestamp())
+    redis_mock.zrangebyscore = mocker.AsyncMock(
+        return_value=[(b"2019-12", 1575158400.0), (b"2020-01", 1577836800.0), (b"2020-03", 1583020800.0)],
+    )
+    redis_mock.zrange = mocker.AsyncMock(side_effect=[[b"11", b"12", b"23"], []])
+    redis_mock.smembers = mocker.AsyncMock(side_effect=[{b"1", b"2"}, set()])
+    pipeline_mock = redis_mock.pipeline()
+    # Base event 1 has events in the bucket kept
+    pipeline_mock.execute.side_effect = [[[1, 0]], [], []]
+    repository = ProviderA(redis_mock, mget_chunk_size=2, retention_months=2)
 
+    await repository.finish_update()
 
-async def test_retrieve_events_happy_path(redis_mock, mock_cache, mocker):
+    redis_mock.zrangebyscore.assert_awaited_once_with("event_buckets", "-inf", "+inf", withscores=True)
+    redis_mock.zrange.assert_any_await("event_start:2019-12", 0, -1)
+    redis_mock.smembers.assert_any_await("event_bucket_base_ids:2019-12")
+    pipeline_mock.smismember.assert_called_once_with("event_bucket_base_ids:2020-03", [b"1", b"2"])
+    # The base events without events left are stored again if they change
+    assert pipeline_mock.hdel.call_args_list == [
+        mocker.call("event_bucket", b"11", b"12"),
+        mocker.call("event_bucket", b"23"),
+        mocker.call("event_hash", b"2"),
+    ]
+    pipeline_mock.unlink.assert_any_call("event_start:2019-12", "event_end:2019-12", "event_bucket_base_ids:2019-12")
+    pipeline_mock.unlink.assert_any_call("event_start:2020-01", "event_end:2020-01", "event_bucket_base_ids:2020-01")
+    pipeline_mock.zrem.assert_any_call("event_buckets", "2019-12")
+    pipeline_mock.zrem.assert_any_call("event_buckets", "2020-01")
+    assert pipeline_mock.incr.call_count == 2
+
+
+async def test_finish_update_without_retention(redis_mock, mocker):
+    redis_mock.zrangebyscore = mocker.AsyncMock()
+    repository = ProviderA(redis_mock)
+
+    await repository.finish_update()
+
+    redis_mock.zrangebyscore.assert_not_awaited()
+
+
+async def test_finish_update_error(redis_mock, mocker):
+    redis_mock.zrangebyscore = mocker.AsyncMock(side_effect=RedisError("Generic Redis error"))
+    repository = ProviderA(redis_mock, retention_months=2)
+
+    with pytest.raises(DatabaseError) as de:
+        await repository.finish_update()
+    assert "Generic Redis error" in str(de)
+
+
+async def test_retrieve_events_happy_path(redis_mock):
     pipeline_mock = redis_mock.pipeline()
-    pipeline_mock.execute.side_effect = [[[b"11", b"12"], [b"11"]]]
-    redis_mock.get = mocker.AsyncMock(side_effect=[base_event_1.model_dump_json(), base_event_2.model_dump_json()])
-    mock_aiter = mocker.MagicMock()
-    mock_aiter.__aiter__.return_value = [b"event:1:11", b"event:2:11"]
-    redis_mock.scan_iter.side_effect = mocker.MagicMock(return_value=mock_aiter)
-    gather_mock = mocker.AsyncMock(return_value=[base_event_1.model_dump_json(), base_event_2.model_dump_json()])
-    mocker.patch.object(asyncio, "gather", gather_mock)
+    redis_mock.zrangebyscore.return_value = [(b"2020-01", 1577836800.0)]
+    redis_mock.register_script().return_value = [b"11", b"1577836800"]
+    projection_1, projection_2 = base_event_1.projections()[0], base_event_2.projections()[0]
+    pipeline_mock.execute.side_effect = [
+        [b"1", {b"1", b"2"}],
+        [[to_json(projection_1), to_json(projection_2)]],
+    ]
 
     repository = ProviderA(redis_mock)
     filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
     result = await repository.get_all(filter_query)
 
-    assert len(result) == 2
-    assert base_event_2 in result
-    assert base_event_1 in result
-    redis_mock.scan_iter.assert_called_once_with("event:*:11")
-    assert redis_mock.get.call_count == 2
-    redis_mock.get.assert_any_call("event:1")
-    redis_mock.get.assert_any_call("event:2")
+    assert result == EventPage(projections=[projection_1, projection_2])
+    redis_mock.register_script().assert_awaited_once_with(
+        keys=["event_start:2020-01", "event_end:2020-01"],
+        args=[
+            filter_query.starts_at.timestamp(),
+            filter_query.ends_at.timestamp(),
+            0,
+            "",
+            "",
+        ],
+    )
+    pipeline_mock.smembers.assert_called_once_with("event_base_ids:11")
+    redis_mock.scan_iter.assert_not_called()
+    pipeline_mock.mget.assert_called_once_with(("event_projection:1:11", "event_projection:2:11"))
+    redis_mock.get.assert_not_called()
+
+
+async def test_store_events_json_documents(base_events, redis_mock):
+    repository = ProviderA(redis_mock, compact_documents=False)
+    await repository.add_or_update_events(base_events)
+
+    pipeline_mock = redis_mock.pipeline()
+    pipeline_mock.set.assert_any_call("event:1", base_event_1.model_dump_json().encode())
+    pipeline_mock.set.assert_any_call("event_projection:1:11", to_json(base_event_1.projections()[0]))
+
+
+async def test_retrieve_events_mixed_formats(redis_mock):
+    pipeline_mock = redis_mock.pipeline()
+    redis_mock.register_script().return_value = [b"11", b"1577836800"]
+    projection_1, projection_2 = base_event_1.projections()[0], base_event_2.projections()[0]
+    pipeline_mock.execute.side_effect = [
+        [b"1", {b"1", b"2"}],
+        [[to_json(projection_1), encode_packed(projection_2)]],
+    ]
+
+    repository = ProviderA(redis_mock)
+    result = await repository.get_all(FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2)))
+
+    assert result == EventPage(projections=[projection_1, projection_2])
+
+
+async def test_retrieve_events_unknown_format(redis_mock):
+    pipeline_mock = redis_mock.pipeline()
+    redis_mock.register_script().return_value = [b"11", b"1577836800"]
+    pipeline_mock.execute.side_effect = [[b"1", {b"1"}], [[b"\x7f"]]]
+
+    repository = ProviderA(redis_mock)
+    with pytest.raises(DatabaseError):
+        await repository.get_all(FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2)))
+
+
+async def test_retrieve_events_from_cache(redis_mock):
+    pipeline_mock = redis_mock.pipeline()
+    redis_mock.register_script().return_value = [b"11", b"1577836800"]
+    projection_1, projection_2 = base_event_1.projections()[0], base_event_2.projections()[0]
+    pipeline_mock.execute.side_effect = [
+        [b"1", {b"1", b"2"}],
+        [[to_json(projection_1), to_json(projection_2)]],
+        [b"1", {b"1", b"2"}],
+    ]
+    repository = ProviderA(redis_mock)
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
+
+    first_result = await repository.get_all(filter_query)
+    second_result = await repository.get_all(filter_query)
+
+    assert first_result == second_result == EventPage(projections=[projection_1, projection_2])
+    pipeline_mock.mget.assert_called_once()
+    assert pipeline_mock.get.call_args_list == [(("event_generation",),)] * 2
+
+
+async def test_retrieve_events_cache_invalidated_by_new_generation(redis_mock):
+    pipeline_mock = redis_mock.pipeline()
+    redis_mock.register_script().return_value = [b"11", b"1577836800"]
+    projection_1 = base_event_1.projections()[0]
+    projection_1_updated = replace(projection_1, title="Event 1 updated")
+    pipeline_mock.execute.side_effect = [
+        [b"1", {b"1"}],
+        [[to_json(projection_1)]],
+        [b"2", {b"1"}],
+        [[to_json(projection_1_updated)]],
+    ]
+    repository = ProviderA(redis_mock)
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
+
+    assert (await repository.get_all(filter_query)).projections == [projection_1]
+    assert (await repository.get_all(filter_query)).projections == [projection_1_updated]
+    assert pipeline_mock.mget.call_count == 2
+
+
+async def test_retrieve_events_partially_cached(redis_mock):
+    pipeline_mock = redis_mock.pipeline()
+    projection_11, projection_12 = base_event_1.projections()
+    pipeline_mock.execute.side_effect = [
+        [b"1", {b"1"}],
+        [[to_json(projection_11)]],
+        [b"1", {b"1"}, {b"1"}],
+        [[to_json(projection_12)]],
+    ]
+    repository = ProviderA(redis_mock)
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
+
+    redis_mock.register_script().return_value = [b"11", b"1577836800"]
+    await repository.get_all(filter_query)
+    redis_mock.register_script().return_value = [b"11", b"1577836800", b"12", b"1577836800"]
+    result = await repository.get_all(filter_query)
+
+    assert result.projections == [projection_11, projection_12]
+    pipeline_mock.mget.assert_called_with(("event_projection:1:12",))
+
+
+async def test_retrieve_events_outside_time_range(redis_mock):
+    pipeline_mock = redis_mock.pipeline()
+    redis_mock.register_script().return_value = [b"11", b"1577836800"]
+    projection_1 = base_event_1.projections()[0]
+    projection_outside = replace(projection_1, id="2", end=datetime(2020, 1, 3))
+    pipeline_mock.execute.side_effect = [
+        [b"1", {b"1", b"2"}],
+        [[to_json(projection_1), to_json(projection_outside)]],
+    ]
+
+    repository = ProviderA(redis_mock)
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
+    result = await repository.get_all(filter_query)
+
+    assert result.projections == [projection_1]
+
+
+async def test_retrieve_events_chunked_mget(redis_mock):
+    pipeline_mock = redis_mock.pipeline()
+    redis_mock.register_script().return_value = [b"11", b"1577836800", b"12", b"1577836800", b"23", b"1577836800"]
+    pipeline_mock.execute.side_effect = [
+        [b"1", {b"1", b"2"}, {b"1"}, {b"2"}],
+        [
+            [to_json(base_event_1.projections()[0]), None],
+            [
+                to_json(base_event_2.projections()[0]),
+                to_json(base_event_2.projections()[1]),
+            ],
+        ],
+    ]
+
+    repository = ProviderA(redis_mock, mget_chunk_size=2)
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
+    result = await repository.get_all(filter_query)
+
+    assert len(result.projections) == 3
+    assert result.next_cursor is None
+    assert pipeline_mock.mget.call_count == 2
+    pipeline_mock.mget.assert_any_call(("event_projection:1:11", "event_projection:2:11"))
+    pipeline_mock.mget.assert_any_call(("event_projection:1:12", "event_projection:2:23"))
+    assert pipeline_mock.execute.await_count == 2
+
+
+async def test_retrieve_events_page(redis_mock):
+    pipeline_mock = redis_mock.pipeline()
+    redis_mock.zrangebyscore.return_value = [(b"2020-01", 1577836800.0)]
+    redis_mock.register_script().return_value = [b"12", b"1577836800", b"23", b"1577840400"]
+    pipeline_mock.execute.side_effect = [
+        [b"1", {b"1"}, {b"2"}],
+        [
+            [
+                to_json(base_event_1.projections()[1]),
+                to_json(base_event_2.projections()[1]),
+            ]
+        ],
+    ]
+
+    repository = ProviderA(redis_mock)
+    cursor = EventCursor(start=1577836800, event_id="11")
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2), limit=2, cursor=cursor)
+    result = await repository.get_all(filter_query)
+
+    assert result.projections == [base_event_1.projections()[1], base_event_2.projections()[1]]
+    assert result.next_cursor == EventCursor(start=1577840400, event_id="23")
+    redis_mock.register_script().assert_awaited_once_with(
+        keys=["event_start:2020-01", "event_end:2020-01"],
+        args=[
+            filter_query.starts_at.timestamp(),
+            filter_query.ends_at.timestamp(),
+            2,
+            1577836800,
+            "11",
+        ],
+    )
+
+
+async def test_retrieve_events_last_page(redis_mock):
+    pipeline_mock = redis_mock.pipeline()
+    redis_mock.register_script().return_value = [b"23", b"1577840400"]
+    pipeline_mock.execute.side_effect = [[b"1", {b"2"}], [[to_json(base_event_2.projections()[1])]]]
+
+    repository = ProviderA(redis_mock)
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2), limit=2)
+    result = await repository.get_all(filter_query)
+
+    assert result.projections == [base_event_2.projections()[1]]
+    assert result.next_cursor is None
+
+
+async def test_stream_events_in_batches(redis_mock, mocker):
+    pipeline_mock = redis_mock.pipeline()
+    redis_mock.register_script().side_effect = [
+        [b"11", b"1577836800", b"12", b"1577836800"],
+        [b"23", b"1577836800"],
+    ]
+    projection_11, projection_12 = base_event_1.projections()
+    projection_23 = base_event_2.projections()[1]
+    pipeline_mock.execute.side_effect = [
+        [b"1", {b"1"}, {b"1"}],
+        [[to_json(projection_11), to_json(projection_12)]],
+        [b"1", {b"2"}],
+        [[to_json(projection_23)]],
+    ]
+
+    repository = ProviderA(redis_mock, mget_chunk_size=2)
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
+    batches = [batch async for batch in repository.stream_all(filter_query)]
+
+    assert batches == [EventPage(projections=[projection_11, projection_12]), EventPage(projections=[projection_23])]
+    # Each run of the script reads a page of the window, after the last event of the previous one
+    assert redis_mock.register_script().await_args_list == [
+        mocker.call(keys=[], args=[filter_query.starts_at.timestamp(), filter_query.ends_at.timestamp(), 2, "", ""]),
+        mocker.call(
+            keys=[],
+            args=[filter_query.starts_at.timestamp(), filter_query.ends_at.timestamp(), 2, 1577836800.0, "12"],
+        ),
+    ]
+
+
+async def test_stream_events_limit(redis_mock):
+    pipeline_mock = redis_mock.pipeline()
+    redis_mock.register_script().side_effect = [
+        [b"11", b"1577836800", b"12", b"1577836800"],
+        [b"23", b"1577836800"],
+    ]
+    projection_11, projection_12 = base_event_1.projections()
+    projection_23 = base_event_2.projections()[1]
+    pipeline_mock.execute.side_effect = [
+        [b"1", {b"1"}, {b"1"}],
+        [[to_json(projection_11), to_json(projection_12)]],
+        [b"1", {b"2"}],
+        [[to_json(projection_23)]],
+    ]
+
+    repository = ProviderA(redis_mock, mget_chunk_size=2)
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2), limit=3)
+    batches = [batch async for batch in repository.stream_all(filter_query)]
+
+    # The last page has the cursor of the next one
+    assert batches == [
+        EventPage(projections=[projection_11, projection_12]),
+        EventPage(projections=[projection_23], next_cursor=EventCursor(start=1577836800, event_id="23")),
+    ]
+    assert redis_mock.register_script().await_args.kwargs["args"][2] == 1
+
+
+async def test_stream_events_error(redis_mock):
+    redis_mock.register_script().side_effect = RedisError("Generic Redis error")
+    repository = ProviderA(redis_mock)
+    filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
+    with pytest.raises(DatabaseError) as de:
+        [batch async for batch in repository.stream_all(filter_query)]
+    assert "Generic Redis error" in str(de)
+
+
+async def test_get_generation(redis_mock, mocker):
+    redis_mock.get = mocker.AsyncMock(return_value=b"3")
+    repository = ProviderA(redis_mock)
+
+    assert await repository.get_generation() == b"3"
+    redis_mock.get.assert_awaited_once_with("event_generation")
+
+
+async def test_get_generation_error(redis_mock, mocker):
+    redis_mock.get = mocker.AsyncMock(side_effect=RedisError("Generic Redis error"))
+    repository = ProviderA(redis_mock)
+
+    with pytest.raises(DatabaseError) as de:
+        await repository.get_generation()
+    assert "Generic Redis error" in str(de)
+
+
+async def test_get_feed_validators(redis_mock, mocker):
+    validators = FeedValidators(etag='"etag-1"')
+    redis_mock.get = mocker.AsyncMock(return_value=validators.model_dump_json().encode())
+    repository = ProviderA(redis_mock)
+
+    assert await repository.get_feed_validators() == validators
+    redis_mock.get.assert_awaited_once_with("feed_validators:provider_a")
+
+
+async def test_get_feed_validators_not_stored(redis_mock, mocker):
+    redis_mock.get = mocker.AsyncMock(return_value=None)
+    repository = ProviderA(redis_mock)
+
+    assert await repository.get_feed_validators() is None
+
+
+async def test_save_feed_validators(redis_mock, mocker):
+    redis_mock.set = mocker.AsyncMock()
+    validators = FeedValidators(body_hash="hash")
+    repository = ProviderA(redis_mock)
+
+    await repository.save_feed_validators(validators)
+
+    redis_mock.set.assert_awaited_once_with("feed_validators:provider_a", validators.model_dump_json())
+
+
+async def test_save_feed_validators_error(redis_mock, mocker):
+    redis_mock.set = mocker.AsyncMock(side_effect=RedisError("Generic Redis error"))
+    repository = ProviderA(redis_mock)
+
+    with pytest.raises(DatabaseError) as de:
+        await repository.save_feed_validators(FeedValidators())
+    assert "Generic Redis error" in str(de)
+
+
+def test_invalid_mget_chunk_size(redis_mock):
+    with pytest.raises(ValueError) as exc_info:
+        ProviderA(redis_mock, mget_chunk_size=0)
+    assert str(exc_info.value) == "'mget_chunk_size' must be greater than 0 in config.yml file"
+
+
+def test_invalid_retention_months(redis_mock):
+    with pytest.raises(ValueError) as exc_info:
+        ProviderA(redis_mock, retention_months=-1)
+    assert str(exc_info.value) == "'retention_months' must be 0 or greater in config.yml file"
 
 
 async def test_get_all_events_error(redis_mock):
-    redis_mock.pipeline.side_effect = RedisError("Generic Redis error")
+    redis_mock.register_script().side_effect = RedisError("Generic Redis error")
     repository = ProviderA(redis_mock)
     filter_query = FilterQuery(starts_at=datetime(2020, 1, 1), ends_at=datetime(2020, 1, 2))
     with pytest.raises(DatabaseError) as de:
@@ -115,9 +651,111 @@ async def test_get_all_events_error(redis_mock):
     assert "Generic Redis error" in str(de)
 
 
-async def test_store_events_error(redis_mock, mocker):
+async def test_store_events_error(base_events, redis_mock):
     redis_mock.pipeline.side_effect = RedisError("Generic Redis storing in error")
     repository = ProviderA(redis_mock)
     with pytest.raises(DatabaseError) as de:
-        await repository.add_or_update_events(mocker.Mock())
+        await repository.add_or_update_events(base_events)
     assert "Generic Redis storing in error" in str(de)
+
+
+@pytest.mark.benchmark
+def test_benchmark_batch_vs_per_document_decoding():
+    projections = [
+        EventProjection(
+            id=str(i),
+            event_id=str(i),
+            title=f"Event {i}",
+            start=datetime(2021, 1, 1) + timedelta(hours=i),
+            end=datetime(2021, 1, 1) + timedelta(hours=i + 1),
+            min_price=10.0,
+            max_price=20.0,
+        )
+        for i in range(10_000)
+    ]
+    documents = [to_json(projection) for projection in projections]
+
+    projection_adapter = TypeAdapter(EventProjection)
+    per_document_elapsed = min(
+        timeit.repeat(
+            lambda: [projection_adapter.validate_json(document) for document in documents],
+            number=1,
+            repeat=5,
+        ),
+    )
+    batch_elapsed = min(timeit.repeat(lambda: ProviderA._decode_projections(documents), number=1, repeat=5))
+
+    log.info(
+        f"{len(documents)} projections decoded: per document {per_document_elapsed * 1000:.1f} ms, "
+        f"batch {batch_elapsed * 1000:.1f} ms",
+    )
+    # Both decode with the validator of pydantic, the batch only saves a call per document
+    assert ProviderA._decode_projections(documents) == projections
+
+
+@pytest.mark.integration
+async def test_identical_updates_with_retention(redis_client, mocker):
+    mocker.patch("time.time", return_value=datetime(2020, 6, 15, tzinfo=timezone.utc).timestamp())
+    june = datetime(2020, 6, 1, tzinfo=timezone.utc)
+    event_4 = event_3.model_copy(update={"event_id": 34, "event_start_date": june, "event_end_date": june})
+    base_event_3 = base_event_2.model_copy(update={"base_event_id": 3, "events": [event_3, event_4]})
+    repository = ProviderA(redis_client, retention_months=2)
+    await redis_client.zadd("event_buckets", {bucket: bucket_start})  # bucket of a previous update
+
+    generations = []
+    for _ in range(3):
+        await repository.add_or_update_events([base_event_1, base_event_3])
+        await repository.finish_update()
+        generations.append(await repository.get_generation())
+
+    # The months dropped are not indexed again, identical updates do not change the events
+    assert generations[1] == generations[2] == generations[0]
+    assert await redis_client.zrange("event_buckets", 0, -1) == [b"2020-06"]
+    assert not await redis_client.exists(f"event_start:{bucket}")
+
+
+@pytest.mark.integration
+@pytest.mark.benchmark
+async def test_benchmark_redis_memory_compact_vs_json_documents(redis_client):
+    random.seed(1)
+    base_events = [
+        ProviderABaseEvent(
+            base_event_id=base_event_id,
+            sell_mode=SellModeEnum.online,
+            title=f"Event {base_event_id}",
+            events=[
+                ProviderAEvent(
+                    event_id=base_event_id,
+                    event_start_date=datetime(2021, 1, 1) + timedelta(hours=base_event_id),
+                    event_end_date=datetime(2021, 1, 1) + timedelta(hours=base_event_id + 2),
+                    sell_from=datetime(2020, 1, 1),
+                    sell_to=datetime(2021, 1, 1) + timedelta(hours=base_event_id),
+                    sold_out=False,
+                    zones=[
+                        ProviderAZone(
+                            zone_id=zone_id,
+                            capacity=random.randint(10, 500),
+                            price=round(random.uniform(10, 100), 2),
+                            name=f"Zone {zone_id}",
+                            numbered=bool(zone_id % 2),
+                        )
+                        for zone_id in range(3)
+                    ],
+                ),
+            ],
+        )
+        for base_event_id in range(100_000)
+    ]
+
+    used_memory = {}
+    for compact_documents in [False, True]:
+        await redis_client.flushdb()
+        empty_memory = (await redis_client.info("memory"))["used_memory"]
+        await ProviderA(redis_client, compact_documents=compact_documents).add_or_update_events(base_events)
+        used_memory[compact_documents] = (await redis_client.info("memory"))["used_memory"] - empty_memory
+
+    log.info(
+        f"Redis memory of {len(base_events)} events: JSON {used_memory[False] / 2**20:.1f} MiB, "
+        f"compact {used_memory[True] / 2**20:.1f} MiB",
+    )
+    assert used_memory[True] < used_memory[False]
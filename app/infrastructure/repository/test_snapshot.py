@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.infrastructure.repository.snapshot import (
+    FORMAT_VERSION,
+    HEADER,
+    MAGIC,
+    get_file_id,
+    read_snapshot,
+    write_snapshot,
+)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "events.snapshot")
+
+
+arrays = {
+    "codes": np.array([3, 1, 2], np.int32),
+    "timestamps": np.array([1.5, 2.5, 3.5]),
+    "starts": np.array(["2020-01-01T10:00:00.123456", "2020-01-02T00:00"], "datetime64[us]"),
+    "empty": np.array([], np.uint8),
+    "data": np.frombuffer("Première".encode(), np.uint8),
+}
+
+
+def test_write_and_read_snapshot(path):
+    write_snapshot(path, 7, arrays)
+
+    snapshot = read_snapshot(path)
+
+    assert snapshot.generation == 7
+    assert snapshot.file_id == get_file_id(path)
+    assert list(snapshot.arrays) == list(arrays)
+    for name, array in arrays.items():
+        assert snapshot.arrays[name].dtype == array.dtype
+        assert np.array_equal(snapshot.arrays[name], array)
+        assert not snapshot.arrays[name].flags.writeable
+
+
+def test_read_replaced_snapshot(path):
+    write_snapshot(path, 1, {"values": np.array([1, 2])})
+    previous = read_snapshot(path)
+
+    write_snapshot(path, 2, {"values": np.array([3])})
+
+    # The previous mapping is read until the new snapshot is mapped
+    assert previous.arrays["values"].tolist() == [1, 2]
+    assert read_snapshot(path).arrays["values"].tolist() == [3]
+    assert read_snapshot(path).file_id != previous.file_id
+    assert os.listdir(os.path.dirname(path)) == ["events.snapshot"]
+
+
+def test_write_snapshot_error(path, mocker):
+    mocker.patch("os.replace", side_effect=OSError("No space left on device"))
+
+    with pytest.raises(OSError):
+        write_snapshot(path, 1, arrays)
+
+    assert os.listdir(os.path.dirname(path)) == []
+
+
+def test_read_not_snapshot(path):
+    with open(path, "wb") as file:
+        file.write(b"{}" * HEADER.size)
+
+    with pytest.raises(ValueError) as exc_info:
+        read_snapshot(path)
+
+    assert str(exc_info.value) == f"File {path} is not a snapshot"
+
+
+def test_read_unknown_format(path):
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION + 1, 1, 0))
+
+    with pytest.raises(ValueError) as exc_info:
+        read_snapshot(path)
+
+    assert str(exc_info.value) == f"Unknown format {FORMAT_VERSION + 1} of snapshot {path}"
+
+
+def test_read_truncated_snapshot(path):
+    write_snapshot(path, 1, arrays)
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) - 1)
+
+    with pytest.raises(ValueError):
+        read_snapshot(path)
+
+
+def test_read_missing_snapshot(path):
+    with pytest.raises(FileNotFoundError):
+        read_snapshot(path)
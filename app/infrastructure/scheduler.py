@@ -1,3 +1,107 @@
-# Future work:
-# - In `main` Enqueue a job to update events when startup
-# - Create scheduler jobs to be triggered at specific times
+import asyncio
+import logging
+import socket
+import uuid
+from contextlib import AbstractAsyncContextManager, nullcontext
+from typing import Awaitable, Callable, Optional
+
+from app.infrastructure.database import RedisBase
+from app.infrastructure.repository.entities import UpdateScope
+
+LOCK_KEY = "scheduler_lock"
+# The lock is extended only by the process that holds it, a lock expired and taken by another process is not extended
+EXTEND_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+log = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """
+    Run jobs periodically in the event loop of the application.
+    Each run takes a Redis lock that expires after the interval, so a single process of the scope of the job runs it per
+    interval: a single replica, a single worker of each host, or every process without a lock. The lock is extended
+    while the job runs, a run longer than the interval is not started again by another process.
+    """
+
+    def __init__(self, redis: RedisBase) -> None:
+        self._redis = redis
+        self._extend_lock_script = redis.register_script(EXTEND_LOCK_SCRIPT)
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def add_job(
+        self,
+        name: str,
+        job: Callable[[], Awaitable[object]],
+        interval: float,
+        scope: UpdateScope = UpdateScope.REPLICAS,
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ) -> None:
+        """
+        :param interval: seconds between the start of two runs, the first run starts immediately
+        :param scope: processes among which a single one runs the job each interval
+        :param semaphore: shared by the jobs run at the same time by this process, taken before the lock
+        """
+        self._tasks.append(
+            asyncio.create_task(self._run_periodically(name, job, interval, scope, semaphore), name=name),
+        )
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _run_periodically(
+        self,
+        name: str,
+        job: Callable[[], Awaitable[object]],
+        interval: float,
+        scope: UpdateScope,
+        semaphore: Optional[asyncio.Semaphore],
+    ) -> None:
+        limit: AbstractAsyncContextManager[object] = semaphore if semaphore else nullcontext()
+        while True:
+            try:
+                async with limit:
+                    await self._run_once(name, job, interval, scope)
+            except Exception as e:
+                log.error(f"Error running job {name}: {e}", exc_info=True)
+            await asyncio.sleep(interval)
+
+    async def _run_once(
+        self,
+        name: str,
+        job: Callable[[], Awaitable[object]],
+        interval: float,
+        scope: UpdateScope,
+    ) -> None:
+        if scope == UpdateScope.PROCESS:
+            log.info(f"Job {name} finished: {await job()}")
+            return
+        hostname = socket.gethostname()
+        key = f"{LOCK_KEY}:{name}:{hostname}" if scope == UpdateScope.HOST else f"{LOCK_KEY}:{name}"
+        token = f"{hostname}:{uuid.uuid4().hex}"
+        if not await self._redis.set(key, token, nx=True, px=int(interval * 1000)):
+            log.info(f"Job {name} skipped, it is run by another process")
+            return
+        watchdog = asyncio.create_task(self._extend_lock(key, token, interval))
+        try:
+            log.info(f"Job {name} finished: {await job()}")
+        finally:
+            watchdog.cancel()
+            await asyncio.gather(watchdog, return_exceptions=True)
+
+    async def _extend_lock(self, key: str, token: str, interval: float) -> None:
+        """Extend the lock by the interval every third of it, while the job runs and the lock is held"""
+        while True:
+            await asyncio.sleep(interval / 3)
+            try:
+                if not await self._extend_lock_script(keys=[key], args=[token, int(interval * 1000)]):
+                    log.warning(f"Lock {key} lost, taken by another process")
+                    return
+            except Exception as e:
+                log.error(f"Error extending lock {key}: {e}", exc_info=True)
@@ -0,0 +1,79 @@
+import pytest
+
+from app.infrastructure.cache import LruTtlCache, ResponseCache
+
+
+def test_get_and_set():
+    cache: LruTtlCache[str, int] = LruTtlCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+
+def test_evict_least_recently_used():
+    cache: LruTtlCache[str, int] = LruTtlCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_expired_entries(mocker):
+    monotonic = mocker.patch("app.infrastructure.cache.time.monotonic", return_value=100)
+    cache: LruTtlCache[str, int] = LruTtlCache(max_size=2, ttl=10)
+    cache.set("a", 1)
+
+    monotonic.return_value = 110
+    assert cache.get("a") == 1
+    monotonic.return_value = 111
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_clear():
+    cache: LruTtlCache[str, int] = LruTtlCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.clear()
+
+    assert cache.get("a") is None
+
+
+def test_disabled_cache():
+    cache: LruTtlCache[str, int] = LruTtlCache(max_size=0, ttl=60)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+
+
+def test_invalid_max_size():
+    with pytest.raises(ValueError) as exc_info:
+        LruTtlCache(max_size=-1, ttl=60)
+    assert str(exc_info.value) == "'max_size' of the cache must not be negative"
+
+
+def test_response_cache_hits_and_misses():
+    cache = ResponseCache(max_size=10, ttl=60)
+
+    assert cache.get(b"1", "key") is None
+    cache.set(b"1", "key", b"content")
+
+    assert cache.get(b"1", "key") == b"content"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_response_cache_new_generation():
+    cache = ResponseCache(max_size=10, ttl=60)
+    cache.get(b"1", "key")
+    cache.set(b"1", "key", b"content")
+
+    assert cache.get(b"2", "key") is None
+    cache.set(b"1", "key", b"stale")
+
+    assert cache.get(b"2", "key") is None
+    assert cache.get(b"1", "key") is None
@@ -0,0 +1,27 @@
+from redis.asyncio.connection import BlockingConnectionPool
+
+from app.config import Settings
+from app.infrastructure.database import get_or_create_redis_pool
+
+
+async def test_get_or_create_redis_pool():
+    settings = Settings(
+        redis_host="localhost",
+        redis_port=6379,
+        redis_db=1,
+        redis_max_connections=10,
+        redis_pool_timeout=1,
+        redis_socket_timeout=2,
+        redis_socket_connect_timeout=3,
+    )
+
+    pool = get_or_create_redis_pool(settings)
+
+    assert isinstance(pool, BlockingConnectionPool)
+    assert pool is get_or_create_redis_pool(settings)
+    assert pool.max_connections == 10
+    assert pool.timeout == 1
+    assert pool.connection_kwargs["db"] == 1
+    assert pool.connection_kwargs["socket_timeout"] == 2
+    assert pool.connection_kwargs["socket_connect_timeout"] == 3
+    await pool.disconnect()
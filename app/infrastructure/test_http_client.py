@@ -0,0 +1,23 @@
+from app.config import Settings
+from app.infrastructure.http_client import DEFAULT_TIMEOUT, create_http_client
+
+
+async def test_create_http_client():
+    settings = Settings(
+        redis_host="localhost",
+        redis_port=6379,
+        redis_db=0,
+        http_client_max_connections=10,
+        http_client_max_keepalive_connections=5,
+        http_client_keepalive_expiry=30,
+        http_client_http2=True,
+    )
+
+    async with create_http_client(settings) as http_client:
+        pool = http_client._transport._pool
+        assert pool._max_connections == 10
+        assert pool._max_keepalive_connections == 5
+        assert pool._keepalive_expiry == 30
+        assert pool._http2 is True
+        assert http_client.timeout.read == DEFAULT_TIMEOUT
+        assert http_client.follow_redirects is True
@@ -0,0 +1,123 @@
+import asyncio
+
+from app.conftest import redis_mock
+from app.infrastructure.repository.entities import UpdateScope
+from app.infrastructure.scheduler import Scheduler
+
+
+async def test_run_job_periodically(redis_mock, mocker):
+    redis_mock.set = mocker.AsyncMock(return_value=True)
+    job = mocker.AsyncMock(return_value="OK")
+
+    scheduler = Scheduler(redis_mock)
+    scheduler.add_job("job", job, interval=0.01)
+    await asyncio.sleep(0.05)
+    await scheduler.stop()
+
+    assert job.await_count > 1
+    redis_mock.set.assert_awaited_with("scheduler_lock:job", mocker.ANY, nx=True, px=10)
+
+
+async def test_skip_job_locked_by_another_replica(redis_mock, mocker):
+    redis_mock.set = mocker.AsyncMock(return_value=None)
+    job = mocker.AsyncMock()
+
+    scheduler = Scheduler(redis_mock)
+    scheduler.add_job("job", job, interval=0.01)
+    await asyncio.sleep(0.03)
+    await scheduler.stop()
+
+    assert redis_mock.set.await_count > 1
+    job.assert_not_awaited()
+
+
+async def test_run_job_of_each_process_without_lock(redis_mock, mocker):
+    redis_mock.set = mocker.AsyncMock(return_value=None)
+    job = mocker.AsyncMock(return_value="OK")
+
+    scheduler = Scheduler(redis_mock)
+    scheduler.add_job("job", job, interval=0.01, scope=UpdateScope.PROCESS)
+    await asyncio.sleep(0.03)
+    await scheduler.stop()
+
+    assert job.await_count > 1
+    redis_mock.set.assert_not_awaited()
+
+
+async def test_run_job_of_each_host(redis_mock, mocker):
+    redis_mock.set = mocker.AsyncMock(return_value=True)
+    mocker.patch("socket.gethostname", return_value="host")
+    job = mocker.AsyncMock(return_value="OK")
+
+    scheduler = Scheduler(redis_mock)
+    scheduler.add_job("job", job, interval=0.01, scope=UpdateScope.HOST)
+    await asyncio.sleep(0.015)
+    await scheduler.stop()
+
+    job.assert_awaited()
+    redis_mock.set.assert_awaited_with("scheduler_lock:job:host", mocker.ANY, nx=True, px=10)
+    assert redis_mock.set.call_args.args[1].startswith("host:")
+
+
+async def test_job_error_does_not_stop_the_scheduler(redis_mock, mocker, caplog):
+    redis_mock.set = mocker.AsyncMock(return_value=True)
+    job = mocker.AsyncMock(side_effect=[ValueError("Job error"), "OK", "OK"])
+
+    scheduler = Scheduler(redis_mock)
+    scheduler.add_job("job", job, interval=0.01)
+    await asyncio.sleep(0.025)
+    await scheduler.stop()
+
+    assert job.await_count > 1
+    assert "Error running job job: Job error" in caplog.text
+
+
+async def test_lock_extended_while_job_runs(redis_mock, mocker):
+    redis_mock.set = mocker.AsyncMock(return_value=True)
+    redis_mock.register_script().return_value = 1
+
+    async def job():
+        await asyncio.sleep(0.05)
+
+    scheduler = Scheduler(redis_mock)
+    scheduler.add_job("job", job, interval=0.03)
+    await asyncio.sleep(0.04)
+    await scheduler.stop()
+
+    # Extended by the interval with the token of the lock, a run longer than the interval keeps the lock
+    token = redis_mock.set.call_args.args[1]
+    redis_mock.register_script().assert_awaited_with(keys=["scheduler_lock:job"], args=[token, 30])
+
+
+async def test_lock_lost_not_extended(redis_mock, mocker, caplog):
+    redis_mock.set = mocker.AsyncMock(return_value=True)
+    redis_mock.register_script().return_value = 0
+
+    async def job():
+        await asyncio.sleep(0.05)
+
+    scheduler = Scheduler(redis_mock)
+    scheduler.add_job("job", job, interval=0.03)
+    await asyncio.sleep(0.045)
+    await scheduler.stop()
+
+    redis_mock.register_script().assert_awaited_once()
+    assert "Lock scheduler_lock:job lost" in caplog.text
+
+
+async def test_lock_taken_after_semaphore(redis_mock, mocker):
+    redis_mock.set = mocker.AsyncMock(return_value=True)
+    job = mocker.AsyncMock(return_value="OK")
+    semaphore = asyncio.Semaphore(1)
+
+    scheduler = Scheduler(redis_mock)
+    async with semaphore:
+        scheduler.add_job("job", job, interval=1, semaphore=semaphore)
+        await asyncio.sleep(0.01)
+        # Waiting for the semaphore, the lock is not taken meanwhile
+        redis_mock.set.assert_not_awaited()
+    await asyncio.sleep(0.01)
+    await scheduler.stop()
+
+    redis_mock.set.assert_awaited_once()
+    job.assert_awaited_once()
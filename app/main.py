@@ -3,36 +3,38 @@ from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
 from fastapi import FastAPI
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
 from starlette import status
 from starlette.requests import Request
 from starlette.responses import JSONResponse, RedirectResponse
 
 from app.adapters.dependencies import get_providers_config, get_settings
 from app.adapters.http.events.router import event_router
-from app.adapters.update_events import update_events
+from app.adapters.registry import create_provider_registry
+from app.adapters.update_events import schedule_update_events
 from app.infrastructure.database import create_redis_client, get_or_create_redis_pool
+from app.infrastructure.http_client import create_http_client
+from app.infrastructure.scheduler import Scheduler
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
 
 @asynccontextmanager
-async def lifespan(_: FastAPI) -> AsyncGenerator[None, None]:
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     providers = get_providers_config()
     settings = get_settings()
     pool = get_or_create_redis_pool(settings=settings)  # Future Work shared pool with several Redis instances
-    client = await create_redis_client(pool)
-    FastAPICache.init(RedisBackend(client), prefix="fastapi-cache")
-    # Future Work create a locking job
-    # update_job = await scheduler_pool.enqueue_job('update_events', client, providers, _job_id='update_events')
-    # result = await update_job.result()
-
-    result = await update_events(client, providers)
-    await client.close()
-    log.info(f"Update events for providers: {result}")
+    client = await create_redis_client(pool)  # shared by all the requests and refreshes
+    http_client = create_http_client(settings)  # shared by all the providers and refreshes
+    registry = create_provider_registry(client, http_client, providers, settings)
+    app.state.provider_registry = registry
+    # Events are updated in background, the API is ready without waiting for the providers
+    scheduler = Scheduler(client)
+    schedule_update_events(scheduler, registry, settings)
     yield
+    await scheduler.stop()
+    await http_client.aclose()
+    await client.close()
     await pool.disconnect()
 
 
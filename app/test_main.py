@@ -1,3 +1,5 @@
+import time
+
 import pytest
 from starlette import status
 from starlette.testclient import TestClient
@@ -9,9 +11,17 @@ from app.application.dtos.events import ResponseEventDTO
 @pytest.mark.integration
 async def test_update_events_integration(docker_dependencies):
     with TestClient(main.app) as client:
-        response = client.get("/search", params={"starts_at": "2021-01-01T00:00:00Z", "ends_at": "2022-01-02T00:00:00"})
-        assert response.status_code == status.HTTP_200_OK
-        response = ResponseEventDTO.model_validate(response.json())
+        # Events are updated in background after the startup
+        for _ in range(50):
+            response = client.get(
+                "/search",
+                params={"starts_at": "2021-01-01T00:00:00Z", "ends_at": "2022-01-02T00:00:00"},
+            )
+            assert response.status_code == status.HTTP_200_OK
+            response = ResponseEventDTO.model_validate(response.json())
+            if response.data and response.data.events:
+                break
+            time.sleep(0.1)
         assert len(response.data.events) == 3
         assert response.error is None
         assert all(
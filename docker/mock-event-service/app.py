@@ -2,6 +2,7 @@ from flask import (  # type: ignore not installed in the environment
     Flask,
     Response,
     redirect,
+    request,
 )
 
 app = Flask(__name__)
@@ -88,18 +89,26 @@ def index():
     return redirect("/api/v1/events/")
 
 
+def conditional_response(xml_data):
+    # ETag of the content, 304 Not Modified when it matches If-None-Match
+    response = Response(xml_data, mimetype="text/xml")
+    response.add_etag()
+    return response.make_conditional(request)
+
+
 @app.route("/api/v1/events/", methods=["GET"])
 def get_events_1():
-    return Response(xml_data_1, mimetype="text/xml")
+    return conditional_response(xml_data_1)
 
 
 @app.route("/api/v2/events/", methods=["GET"])
 def get_events_2():
-    return Response(xml_data_2, mimetype="text/xml")
+    return conditional_response(xml_data_2)
 
 
 @app.route("/api/v3/events/", methods=["GET"])
 def get_events_3():
+    # Without validators, as providers that do not support conditional requests
     return Response(xml_data_3, mimetype="text/xml")
 
 